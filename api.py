@@ -0,0 +1,318 @@
+# --- API JSON DOS HUBS (SEM INTERFACE) ---
+# Expõe as mesmas agregações dos painéis multi-nicho (app6/app7) para
+# outras ferramentas: heatmap UF x segmento, matriz de municípios,
+# cidades pares e golden leads. A busca por CNPJ diz em quais painéis
+# ele aparece, lendo só o row group que pode contê-lo (core.keys); a
+# busca por nome usa o índice de trigramas da razão social (core.search).
+# `cnae` (repetível, principal ou secundária) filtra pelo índice de CNAE
+# da base (core.cnae). `cidade` ignora caixa e acentos (CAMPINAS, Campinas,
+# "sao paulo"); cidade que não existe na UF é erro 400, não lista vazia.
+#
+#   python api.py --port 8000
+#   GET /nichos
+#   GET /nichos/{slug}/heatmap?uf=&cidade=&tier=&cnae=
+#   GET /nichos/{slug}/municipios?uf=&cidade=&tier=&cnae=
+#   GET /nichos/{slug}/peers?uf=SP&cidade=CAMPINAS&k=6
+#   GET /nichos/{slug}/golden-leads?uf=&cidade=&tier=&cnae=&page=1&page_size=50
+#   GET /cnpj/{cnpj}
+#   GET /busca?q=clinica+sao+lucas&limite=20
+#
+# As respostas ficam em cache por (nicho, visão, parâmetros, versão da
+# base) e levam um ETag com essa chave: um If-None-Match igual recebe 304
+# sem recalcular nada. Um ETL novo muda a versão e invalida os dois.
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import unicodedata
+from functools import lru_cache
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from core.aggregations import TOTAL_CONTAS_ATTR, apply_filters, golden_leads, municipio_matrix, peer_cities, root_summary, uf_heatmap, with_contacts
+from core.datasets import data_version, dataset_path, version_of
+from core.keys import find_in_files
+from core.schema import with_cnpj_text
+from core.search import search_names
+from core.niches import niche_registry
+
+VISOES = ("heatmap", "municipios", "peers", "golden-leads")
+PAGE_SIZE_PADRAO = 50
+PAGE_SIZE_MAX = 500
+LIMITE_BUSCA_MAX = 100
+# Mesmo corte do app6 para a matriz de municípios
+MIN_TOTAL_MUNICIPIO = {"app6": 5}
+# O app7 compara cidades com os eixos normalizados
+PEERS_NORMALIZADO = {"app7"}
+# Colunas devolvidas pela busca por CNPJ, da linha achada em cada base
+COLUNAS_CNPJ = ["razao_social", "uf", "municipio"]
+
+
+class ErroConsulta(Exception):
+    def __init__(self, status: int, mensagem: str):
+        super().__init__(mensagem)
+        self.status = status
+        self.mensagem = mensagem
+
+
+def _nichos() -> dict:
+    """Entradas dos hubs (as que têm nicho), indexadas pelo slug do registro."""
+    return {
+        slug: entrada
+        for entradas in niche_registry().values()
+        for slug, entrada in entradas.items()
+        if entrada["nicho"] is not None
+    }
+
+
+def _entrada(slug: str) -> dict:
+    entrada = _nichos().get(slug)
+    if entrada is None:
+        raise ErroConsulta(404, f"Nicho desconhecido: {slug}")
+    if not os.path.exists(dataset_path(entrada["path"])):
+        raise ErroConsulta(503, f"Base do nicho ainda não gerada: {entrada['path']}")
+    return entrada
+
+
+def _carregar(entrada: dict):
+    """DataFrame e config do nicho, pelo mesmo `load_data` (em cache) do painel."""
+    modulo = importlib.import_module(entrada["modulo"])
+    return modulo.load_data(entrada["nicho"]), modulo.CONFIG_NICHOS[entrada["nicho"]]
+
+
+def _registros(frame) -> list:
+    # to_json converte tipos numpy, NaN -> null e datas num passo só
+    return json.loads(frame.to_json(orient='records', date_format='iso', force_ascii=False))
+
+
+def _paginar(frame, page: int, page_size: int, detalhar=None, total: int = None) -> dict:
+    """Página do resultado; `detalhar` completa só as linhas da página (ex.: contatos).
+
+    `total` vale quando `frame` já vem cortado na última linha da página.
+    """
+    inicio = (page - 1) * page_size
+    pagina = frame.iloc[inicio:inicio + page_size]
+    return {
+        "total": len(frame) if total is None else total,
+        "page": page,
+        "page_size": page_size,
+        "items": _registros(detalhar(pagina) if detalhar else pagina),
+    }
+
+
+def _chave_cidade(nome: str) -> str:
+    """Nome da cidade sem acentos, caixa e espaços extras: CAMPINAS == Campinas."""
+    sem_acento = unicodedata.normalize('NFKD', nome).encode('ascii', 'ignore').decode('ascii')
+    return " ".join(sem_acento.casefold().split())
+
+
+def _resolver_cidade(df, uf: str, cidade: str) -> str:
+    """A `cidade` pedida com a grafia do `municipio_visual` da base (a que os filtros comparam)."""
+    if uf == "Todos" or cidade == "Todas":
+        return cidade
+    nomes = df.loc[df['uf_norm'] == uf, 'municipio_visual'].dropna().unique()
+    encontrada = {_chave_cidade(str(nome)): str(nome) for nome in nomes}.get(cidade)
+    if encontrada is None:
+        raise ErroConsulta(400, f"Cidade não encontrada em {uf}: {cidade}")
+    return encontrada
+
+
+def _calcular(entrada: dict, visao: str, params: dict, df, cfg: dict) -> dict:
+    params["cidade"] = _resolver_cidade(df, params["uf"], params["cidade"])
+    df_filtered = apply_filters(df, params["uf"], params["cidade"], list(params["tier"]), list(params["cnae"]))
+
+    if visao == "heatmap":
+        df_heat = uf_heatmap(df_filtered, cfg["tiers"])
+        return {"tiers": list(df_heat.columns), "items": _registros(df_heat.reset_index())}
+
+    if visao == "municipios":
+        minimo = MIN_TOTAL_MUNICIPIO.get(entrada["modulo"], 0)
+        return {"items": _registros(municipio_matrix(df_filtered, min_total=minimo))}
+
+    if visao == "peers":
+        if params["uf"] == "Todos" or params["cidade"] == "Todas":
+            raise ErroConsulta(400, "Informe uf e cidade para buscar cidades pares")
+        normalizado = entrada["modulo"] in PEERS_NORMALIZADO
+        peer_cluster = peer_cities(df[df['uf_norm'] == params["uf"]], params["cidade"], k=params["k"], normalizado=normalizado)
+        return {"cidade": params["cidade"], "items": _registros(peer_cluster)}
+
+    if visao == "golden-leads":
+        if df_filtered.empty:
+            return _paginar(df_filtered.iloc[:0, :0], params["page"], params["page_size"])
+        # Só as contas até o fim da página pedida saem ordenadas
+        df_grouped = golden_leads(df_filtered, root_summary(df), top=params["page"] * params["page_size"])
+        return _paginar(df_grouped, params["page"], params["page_size"], detalhar=with_contacts, total=df_grouped.attrs[TOTAL_CONTAS_ATTR])
+
+    raise ErroConsulta(404, f"Visão desconhecida: {visao}")
+
+
+@lru_cache(maxsize=1024)
+def _resposta(slug: str, visao: str, chave_params: tuple, versao: str) -> bytes:
+    """Corpo JSON já serializado; `versao` entra só para compor a chave."""
+    entrada = _entrada(slug)
+    df, cfg = _carregar(entrada)
+    corpo = _calcular(entrada, visao, dict(chave_params), df, cfg)
+    corpo["versao"] = versao
+    return json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+
+
+def _inteiro(valor, nome: str, padrao: int, minimo: int = 1, maximo: int = None) -> int:
+    if valor is None:
+        return padrao
+    try:
+        numero = int(valor)
+    except ValueError:
+        raise ErroConsulta(400, f"Parâmetro {nome} deve ser inteiro")
+    if numero < minimo or (maximo is not None and numero > maximo):
+        raise ErroConsulta(400, f"Parâmetro {nome} fora do intervalo permitido")
+    return numero
+
+
+def _cnae(valor: str) -> int:
+    # Aceita o código com ou sem máscara: 8630-5/01 ou 8630501
+    digitos = "".join(c for c in valor if c.isdigit())
+    if not 1 <= len(digitos) <= 7:
+        raise ErroConsulta(400, f"CNAE inválido: {valor}")
+    return int(digitos)
+
+
+def _params(request, visao: str) -> tuple:
+    """Parâmetros normalizados e ordenados: mesma consulta, mesma chave de cache."""
+    query = request.query_params
+    cidade = _chave_cidade(query.get("cidade", ""))
+    params = {
+        "uf": query.get("uf", "").upper() or "Todos",
+        "cidade": cidade if cidade not in ("", "todas") else "Todas",
+        "tier": tuple(sorted(query.getlist("tier"))),
+        "cnae": tuple(sorted({_cnae(c) for c in query.getlist("cnae")})),
+    }
+    if visao == "peers":
+        params["k"] = _inteiro(query.get("k"), "k", 6, maximo=50)
+    if visao == "golden-leads":
+        params["page"] = _inteiro(query.get("page"), "page", 1)
+        params["page_size"] = _inteiro(query.get("page_size"), "page_size", PAGE_SIZE_PADRAO, maximo=PAGE_SIZE_MAX)
+    return tuple(sorted(params.items()))
+
+
+def _versao(entrada: dict) -> str:
+    # load_data é cache_resource: após a primeira carga isto é só um lookup
+    df, _ = _carregar(entrada)
+    return version_of(df) or data_version(dataset_path(entrada["path"]))
+
+
+async def listar_nichos(request):
+    itens = []
+    for slug, entrada in _nichos().items():
+        file_path = dataset_path(entrada["path"])
+        disponivel = os.path.exists(file_path)
+        itens.append({
+            "slug": slug,
+            "nicho": entrada["nicho"],
+            "hub": entrada["modulo"],
+            "disponivel": disponivel,
+            "bytes": os.path.getsize(file_path) if disponivel else None,
+        })
+    return JSONResponse({"items": itens})
+
+
+async def consultar(request):
+    slug = request.path_params["slug"]
+    visao = request.path_params["visao"]
+    try:
+        if visao not in VISOES:
+            raise ErroConsulta(404, f"Visão desconhecida: {visao}")
+        chave_params = _params(request, visao)
+        entrada = _entrada(slug)
+        versao = await run_in_threadpool(_versao, entrada)
+
+        etag = '"' + hashlib.sha1(repr((versao, slug, visao, chave_params)).encode('utf-8')).hexdigest() + '"'
+        cabecalhos = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=cabecalhos)
+
+        corpo = await run_in_threadpool(_resposta, slug, visao, chave_params, versao)
+    except ErroConsulta as e:
+        return JSONResponse({"erro": e.mensagem}, status_code=e.status)
+    return Response(corpo, media_type="application/json", headers=cabecalhos)
+
+
+def _entradas_disponiveis() -> dict:
+    """Todos os painéis (setoriais e nichos dos hubs) cuja base já foi gerada."""
+    return {
+        slug: entrada
+        for entradas in niche_registry().values()
+        for slug, entrada in entradas.items()
+        if os.path.exists(dataset_path(entrada["path"]))
+    }
+
+
+def _buscar_cnpj(cnpj: str) -> list:
+    """Painéis (setoriais e nichos dos hubs) cuja base contém o CNPJ."""
+    entradas = _entradas_disponiveis()
+    # Vários painéis leem o mesmo arquivo: cada um é consultado uma vez
+    achados = find_in_files({dataset_path(e["path"]) for e in entradas.values()}, cnpj, COLUNAS_CNPJ)
+    itens = []
+    for slug, entrada in entradas.items():
+        linha = achados[dataset_path(entrada["path"])]
+        if linha is not None:
+            itens.append({"slug": slug, "nicho": entrada["nicho"], "modulo": entrada["modulo"], "arquivo": entrada["path"], **linha})
+    return itens
+
+
+async def buscar_cnpj(request):
+    digitos = "".join(c for c in request.path_params["cnpj"] if c.isdigit())
+    if not 1 <= len(digitos) <= 14:
+        return JSONResponse({"erro": "CNPJ inválido"}, status_code=400)
+    itens = await run_in_threadpool(_buscar_cnpj, digitos)
+    return JSONResponse({"cnpj": digitos.zfill(14), "items": itens})
+
+
+def _buscar_nomes(consulta: str, limite: int) -> list:
+    """Empresas ranqueadas pelo nome em todas as bases, com os painéis de cada uma."""
+    slugs = {}
+    for slug, entrada in _entradas_disponiveis().items():
+        slugs.setdefault(dataset_path(entrada["path"]), []).append(slug)
+    achados = search_names(consulta, list(slugs), limite=limite)
+    achados = with_cnpj_text(achados).assign(
+        arquivo=achados["arquivo"].map(os.path.basename),
+        paineis=achados["arquivo"].map(slugs),
+    )
+    return _registros(achados)
+
+
+async def buscar_nomes(request):
+    consulta = request.query_params.get("q", "").strip()
+    try:
+        if not consulta:
+            raise ErroConsulta(400, "Informe o nome a buscar em q")
+        limite = _inteiro(request.query_params.get("limite"), "limite", 20, maximo=LIMITE_BUSCA_MAX)
+    except ErroConsulta as e:
+        return JSONResponse({"erro": e.mensagem}, status_code=e.status)
+    itens = await run_in_threadpool(_buscar_nomes, consulta, limite)
+    return JSONResponse({"q": consulta, "items": itens})
+
+
+app = Starlette(routes=[
+    Route("/nichos", listar_nichos),
+    Route("/cnpj/{cnpj:path}", buscar_cnpj),
+    Route("/busca", buscar_nomes),
+    Route("/nichos/{slug}/{visao}", consultar),
+])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
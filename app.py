@@ -2,13 +2,23 @@
 import os
 import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-import matplotlib.pyplot as plt
-import seaborn as sns
 import streamlit as st
-from fpdf import FPDF
 from datetime import datetime
+from core.aggregations import heatmap_rows, sum_tiers, tier_counts, uf_tier_counts
+from core.charts import age_histogram_png
+from core.cnae import cnae_multiselect
+from core.datasets import dataset_path, read_dataset, version_of, with_details
+from core.figures import cached_figure
+from core.filters import city_options, filter_key, slice_partial, territory_slice, uf_options
+from core.footprint import track_dataset
+from core.lazy import lazy_import
+from core.metrics import timed_export
+from core.navigation import lazy_tabs
+from core.ranking import top_k
+from core.schema import with_cnpj_text
+from core.tracing import cache_miss, span, trace_rerun, traced
+
+px = lazy_import("plotly.express")
 
 # Configuração da Página (War Room Theme)
 st.set_page_config(
@@ -24,16 +34,17 @@ ORDER_TIER = ['Micro Corretor', 'PME (Concorrente Direto)', 'Assessoria/Consolid
 COLOR_MAP = {k: v for k, v in zip(ORDER_TIER, WAR_PALETTE)}
 
 # --- BLOCO 2: CARGA DE DADOS ---
-@st.cache_data(ttl=3600)
+# Compartilhado entre sessões: o DataFrame não é alterado após a carga
+@st.cache_resource(ttl=3600)
 def load_data() -> pd.DataFrame:
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(base_dir, 'competitors_processed.parquet')
+    cache_miss("load_data")
+    file_path = dataset_path('competitors_processed.parquet')
 
     if not os.path.exists(file_path):
         st.error(f"Base de dados não encontrada em: {file_path}. Rode o script de ETL primeiro.")
         st.stop()
 
-    df = pd.read_parquet(file_path)
+    df = read_dataset(file_path)
     
     # Tratamentos de segurança caso as colunas não tenham sido criadas no ETL base
     if 'is_shark' not in df.columns:
@@ -46,40 +57,40 @@ def load_data() -> pd.DataFrame:
     return df
 
 # --- BLOCO 3: SIDEBAR (FILTROS) ---
+@traced()
 def sidebar_filters(df: pd.DataFrame):
     st.sidebar.markdown("## 🎯 Radar Tático")
     st.sidebar.markdown("Filtre sua área de atuação:")
     
     # Filtro de Estado
-    lista_ufs = [str(x) for x in df['uf_norm'].dropna().unique().tolist()]
-    opts_uf = ["Todos"] + sorted(lista_ufs)
-    sel_uf = st.sidebar.selectbox("Estado (UF)", opts_uf, index=0)
+    opts_uf = ["Todos"] + uf_options(df)
+    sel_uf = st.sidebar.selectbox("Estado (UF)", opts_uf, index=0, key="filtro_uf")
     
-    df_filtered = df.copy()
     sel_cidade = "Todas"
     
     if sel_uf != "Todos":
-        df_filtered = df_filtered[df_filtered['uf_norm'] == sel_uf]
-        
         # Filtro de Cidade
-        lista_cidades = [str(x) for x in df_filtered['municipio_norm'].dropna().unique().tolist()]
-        opts_cidade = ["Todas"] + sorted(lista_cidades)
-        sel_cidade = st.sidebar.selectbox("Cidade", opts_cidade, index=0)
-        
-        if sel_cidade != "Todas":
-            df_filtered = df_filtered[df_filtered['municipio_norm'] == sel_cidade]
+        opts_cidade = ["Todas"] + city_options(df, sel_uf, 'municipio_norm')
+        sel_cidade = st.sidebar.selectbox("Cidade", opts_cidade, index=0, key="filtro_cidade")
+
+    # Filtro de Atividade (CNAE principal ou secundária, pelo índice gravado no ETL)
+    sel_cnae = cnae_multiselect(df)
 
     # Filtro de Porte (Tier)
     opts_tier = ORDER_TIER
-    sel_tier = st.sidebar.multiselect("Porte do Concorrente", opts_tier, default=opts_tier)
-    
-    if sel_tier:
-        df_filtered = df_filtered[df_filtered['tier_concorrente'].isin(sel_tier)]
-        
-    return df_filtered, sel_uf, sel_cidade
+    sel_tier = st.sidebar.multiselect("Porte do Concorrente", opts_tier, default=opts_tier, key="filtro_tier")
+
+    # Território (UF, cidade e CNAE) guardado na sessão como bitmap: trocar só o tier não o refaz,
+    # e só as linhas do território nos tiers marcados são materializadas
+    df_filtered = territory_slice(df, sel_uf, sel_cidade, 'municipio_norm', sel_cnae, 'tier_concorrente', sel_tier)
+
+    return df_filtered, sel_uf, sel_cidade, sel_tier
 
 # --- BLOCO 4: GERAÇÃO DE PDF (REPORTE EXECUTIVO) ---
+@traced()
 def generate_pdf(df_city: pd.DataFrame, cidade: str, estado: str):
+    from fpdf import FPDF
+
     pdf = FPDF()
     pdf.add_page()
     pdf.set_auto_page_break(auto=True, margin=15)
@@ -113,8 +124,8 @@ def generate_pdf(df_city: pd.DataFrame, cidade: str, estado: str):
     
     pdf.set_font("Arial", "", 8)
     # Filtra as PMEs da cidade
-    df_pmes = df_city[df_city['tier_concorrente'].str.contains('PME', na=False)]
-    df_pmes = df_pmes.sort_values('capital_social', ascending=False).head(15)
+    df_pmes = df_city[df_city['tier_concorrente'].str.contains('PME', na=False, regex=False)]
+    df_pmes = top_k(df_pmes, 'capital_social', 15)
     
     if df_pmes.empty:
         pdf.cell(0, 10, "Nenhuma Corretora PME relevante encontrada neste filtro.", 1, align='C', ln=1)
@@ -133,6 +144,7 @@ def generate_pdf(df_city: pd.DataFrame, cidade: str, estado: str):
     return bytes(pdf.output())
 
 # --- BLOCO 5: APP MAIN ---
+@trace_rerun
 def main():
     st.markdown("<h1 style='text-align: center; color: #c0392b;'>🎯 Dossiê de Inteligência Competitiva</h1>", unsafe_allow_html=True)
     
@@ -145,8 +157,12 @@ def main():
     </div>
     """, unsafe_allow_html=True)
 
-    df = load_data()
-    df_filtered, sel_uf, sel_cidade = sidebar_filters(df)
+    with span("load_data", cache="load_data") as etapa:
+        df = load_data()
+        etapa.linhas = len(df)
+    track_dataset("app", df)
+    versao = version_of(df)
+    df_filtered, sel_uf, sel_cidade, sel_tier = sidebar_filters(df)
     
     if df_filtered.empty:
         st.warning("Sem dados para os filtros aplicados. Tente ampliar a busca.")
@@ -154,7 +170,9 @@ def main():
 
     # --- KPIs RÁPIDOS ---
     total = len(df_filtered)
-    sharks = df_filtered['is_shark'].sum()
+    # Contagens por tier do território (da sessão): trocar só o tier re-soma, sem varrer linhas
+    por_tier = slice_partial(df_filtered, "kpis", lambda r: tier_counts(r, 'tier_concorrente', ['is_shark']))
+    sharks = int(sum_tiers(por_tier, sel_tier)['is_shark'])
     mediana_cap = df_filtered['capital_social'].median()
     
     col1, col2, col3, col4 = st.columns(4)
@@ -166,7 +184,7 @@ def main():
     st.markdown("---")
     
     # --- ORGANIZAÇÃO EM ABAS (STORYTELLING) ---
-    tab1, tab2, tab3, tab4 = st.tabs([
+    tab1, tab2, tab3, tab4 = lazy_tabs([
         "🌍 Matriz de Competitividade", 
         "🏙️ Visão Micro (Bairros)", 
         "📊 Perfil de Mercado", 
@@ -177,225 +195,225 @@ def main():
     # ABA 1: VISÃO MACRO E LÓGICA CONDICIONAL DE VISUALIZAÇÃO
     # ==========================================
     with tab1:
-        # LÓGICA 1: VISÃO NACIONAL TOTAL (MAPA DE CALOR)
-        if sel_uf == "Todos" and sel_cidade == "Todas":
-            st.markdown("### 🔥 Densidade Estrutural do Mercado Nacional")
-            st.markdown("*Matriz cruzando Volume Geográfico e Estrutura de Porte Organizacional.*")
+        if tab1.open:
+            # LÓGICA 1: VISÃO NACIONAL TOTAL (MAPA DE CALOR)
+            if sel_uf == "Todos" and sel_cidade == "Todas":
+                st.markdown("### 🔥 Densidade Estrutural do Mercado Nacional")
+                st.markdown("*Matriz cruzando Volume Geográfico e Estrutura de Porte Organizacional.*")
             
-            # Prepara dados para o Heatmap Pivotado
-            df_heat = df_filtered.groupby(['uf_norm', 'tier_concorrente']).size().unstack(fill_value=0)
+                # Prepara dados para o Heatmap Pivotado
+                # Contagem UF x tier do território (da sessão), re-somada nos tiers marcados; top 15 estados por volume
+                contagem = slice_partial(df_filtered, "heatmap", lambda r: uf_tier_counts(r, 'tier_concorrente'))
+                df_heat = heatmap_rows(contagem, ORDER_TIER, 15, sel_tier)
             
-            # Ordenação de colunas pela semântica de risco
-            cols_avail = [c for c in ORDER_TIER if c in df_heat.columns]
-            df_heat = df_heat[cols_avail]
-            
-            # Seleciona os top 15 estados por volume total para evitar poluição visual
-            df_heat['Total_Volume'] = df_heat.sum(axis=1)
-            df_heat = df_heat.sort_values('Total_Volume', ascending=True).tail(15).drop(columns=['Total_Volume'])
-            
-            fig_heat = px.imshow(
-                df_heat,
-                labels=dict(x="Hierarquia de Porte", y="Estado (UF)", color="Volume Absoluto"),
-                x=df_heat.columns,
-                y=df_heat.index,
-                text_auto=True,
-                color_continuous_scale="Reds",
-                aspect="auto",
-                title="Heatmap de Saturação Institucional: Top 15 Estados"
-            )
-            fig_heat.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=500)
-            st.plotly_chart(fig_heat, use_container_width=True)
+                def _fig_heat():
+                    fig_heat = px.imshow(
+                        df_heat,
+                        labels=dict(x="Hierarquia de Porte", y="Estado (UF)", color="Volume Absoluto"),
+                        x=df_heat.columns,
+                        y=df_heat.index,
+                        text_auto=True,
+                        color_continuous_scale="Reds",
+                        aspect="auto",
+                        title="Heatmap de Saturação Institucional: Top 15 Estados"
+                    )
+                    fig_heat.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=500)
+                    return fig_heat
+                st.plotly_chart(cached_figure("heat", filter_key(__file__, versao), _fig_heat), use_container_width=True)
 
-        # LÓGICA 2: VISÃO ESTADUAL (DISPERSÃO DE MUNICÍPIOS)
-        elif sel_uf != "Todos" and sel_cidade == "Todas":
-            st.markdown(f"### 📍 Matriz Geográfica: Oceanos Azuis vs Vermelhos em {sel_uf}")
-            st.markdown("*Dispersão de municípios avaliando Volume Bruto vs Ameaça de Tubarões.*")
+            # LÓGICA 2: VISÃO ESTADUAL (DISPERSÃO DE MUNICÍPIOS)
+            elif sel_uf != "Todos" and sel_cidade == "Todas":
+                st.markdown(f"### 📍 Matriz Geográfica: Oceanos Azuis vs Vermelhos em {sel_uf}")
+                st.markdown("*Dispersão de municípios avaliando Volume Bruto vs Ameaça de Tubarões.*")
             
-            city_matrix = df_filtered.groupby('municipio_norm').agg(
-                total=('cnpj_completo', 'count'),
-                sharks=('is_shark', 'sum'),
-                ticket=('capital_social', 'median')
-            ).reset_index()
+                city_matrix = df_filtered.groupby('municipio_norm').agg(
+                    total=('cnpj_completo', 'count'),
+                    sharks=('is_shark', 'sum'),
+                    ticket=('capital_social', 'median')
+                ).reset_index()
             
-            city_matrix = city_matrix[city_matrix['total'] > 5].sort_values('total', ascending=False).head(20)
+                city_matrix = city_matrix[city_matrix['total'] > 5].sort_values('total', ascending=False).head(20)
             
-            if not city_matrix.empty:
-                fig_scatter = px.scatter(
-                    city_matrix, x='total', y='sharks', size='sharks', color='ticket',
-                    hover_name='municipio_norm', size_max=40, text='municipio_norm',
-                    title=f'Saturação Local vs Concentração de Big Players',
-                    labels={'total': 'Total de Corretores (Pulverização)', 'sharks': 'Qtd Big Players (Consolidação)', 'ticket': 'Capital Mediano Estrutural'},
-                    color_continuous_scale='Reds'
-                )
-                fig_scatter.update_traces(textposition='top center')
-                fig_scatter.add_hline(y=city_matrix['sharks'].mean(), line_dash="dot", annotation_text="Média de Tubarões")
-                fig_scatter.add_vline(x=city_matrix['total'].mean(), line_dash="dot", annotation_text="Média de Pulverização")
-                fig_scatter.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=550)
-                st.plotly_chart(fig_scatter, use_container_width=True)
-            else:
-                st.info("Municípios insuficientes no filtro para gerar a matriz de dispersão robusta.")
+                if not city_matrix.empty:
+                    def _fig_scatter():
+                        fig_scatter = px.scatter(
+                            city_matrix, x='total', y='sharks', size='sharks', color='ticket',
+                            hover_name='municipio_norm', size_max=40, text='municipio_norm',
+                            title=f'Saturação Local vs Concentração de Big Players',
+                            labels={'total': 'Total de Corretores (Pulverização)', 'sharks': 'Qtd Big Players (Consolidação)', 'ticket': 'Capital Mediano Estrutural'},
+                            color_continuous_scale='Reds'
+                        )
+                        fig_scatter.update_traces(textposition='top center')
+                        fig_scatter.add_hline(y=city_matrix['sharks'].mean(), line_dash="dot", annotation_text="Média de Tubarões")
+                        fig_scatter.add_vline(x=city_matrix['total'].mean(), line_dash="dot", annotation_text="Média de Pulverização")
+                        fig_scatter.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=550)
+                        return fig_scatter
+                    st.plotly_chart(cached_figure("scatter", filter_key(__file__, versao), _fig_scatter), use_container_width=True)
+                else:
+                    st.info("Municípios insuficientes no filtro para gerar a matriz de dispersão robusta.")
 
-        # LÓGICA 3: VISÃO MUNICIPAL (KNN CLUSTERING E BENCHMARKING DE PEERS)
-        elif sel_cidade != "Todas":
-            st.markdown(f"### 🧬 Benchmarking Dinâmico de Similaridade: {sel_cidade}")
-            st.markdown(f"*Identificamos 5 municípios dentro de {sel_uf} com assinatura mercadológica matematicamente semelhante para mapeamento de estratégias.*")
+            # LÓGICA 3: VISÃO MUNICIPAL (KNN CLUSTERING E BENCHMARKING DE PEERS)
+            elif sel_cidade != "Todas":
+                st.markdown(f"### 🧬 Benchmarking Dinâmico de Similaridade: {sel_cidade}")
+                st.markdown(f"*Identificamos 5 municípios dentro de {sel_uf} com assinatura mercadológica matematicamente semelhante para mapeamento de estratégias.*")
             
-            # Puxa o dataset inteiro do Estado alvo (sem o filtro local) para avaliar distâncias
-            df_state_baseline = df[df['uf_norm'] == sel_uf]
-            city_matrix_full = df_state_baseline.groupby('municipio_norm').agg(
-                total=('cnpj_completo', 'count'),
-                sharks=('is_shark', 'sum'),
-                ticket=('capital_social', 'median')
-            ).reset_index()
+                # Puxa o dataset inteiro do Estado alvo (sem o filtro local) para avaliar distâncias
+                df_state_baseline = df[df['uf_norm'] == sel_uf]
+                city_matrix_full = df_state_baseline.groupby('municipio_norm').agg(
+                    total=('cnpj_completo', 'count'),
+                    sharks=('is_shark', 'sum'),
+                    ticket=('capital_social', 'median')
+                ).reset_index()
             
-            # Isola os indicadores do alvo para o cálculo euclidiano
-            sel_stats = city_matrix_full[city_matrix_full['municipio_norm'] == sel_cidade]
+                # Isola os indicadores do alvo para o cálculo euclidiano
+                sel_stats = city_matrix_full[city_matrix_full['municipio_norm'] == sel_cidade]
             
-            if not sel_stats.empty:
-                val_total = sel_stats['total'].values[0]
-                val_sharks = sel_stats['sharks'].values[0]
+                if not sel_stats.empty:
+                    val_total = sel_stats['total'].values[0]
+                    val_sharks = sel_stats['sharks'].values[0]
                 
-                # Cálculo de Distância Euclidiana Simplificada 
-                # Pondera-se as anomalias numéricas entre volume bruto e tubarões raros
-                city_matrix_full['dist_euclidiana'] = np.sqrt(
-                    ((city_matrix_full['total'] - val_total) ** 2) + 
-                    (((city_matrix_full['sharks'] - val_sharks) * 5) ** 2) 
-                )
+                    # Cálculo de Distância Euclidiana Simplificada 
+                    # Pondera-se as anomalias numéricas entre volume bruto e tubarões raros
+                    city_matrix_full['dist_euclidiana'] = np.sqrt(
+                        ((city_matrix_full['total'] - val_total) ** 2) + 
+                        (((city_matrix_full['sharks'] - val_sharks) * 5) ** 2) 
+                    )
                 
-                # Isola a cidade alvo e seus 5 vizinhos estatísticos mais próximos
-                peer_cluster = city_matrix_full.sort_values('dist_euclidiana').head(6).copy()
-                peer_cluster['Classificação de Peer'] = peer_cluster['municipio_norm'].apply(
-                    lambda x: 'Alvo Estratégico' if x == sel_cidade else 'Peer Regional (Similar)'
-                )
+                    # Isola a cidade alvo e seus 5 vizinhos estatísticos mais próximos
+                    peer_cluster = city_matrix_full.sort_values('dist_euclidiana').head(6).copy()
+                    peer_cluster['Classificação de Peer'] = peer_cluster['municipio_norm'].apply(
+                        lambda x: 'Alvo Estratégico' if x == sel_cidade else 'Peer Regional (Similar)'
+                    )
                 
-                fig_peers = px.scatter(
-                    peer_cluster, x='total', y='sharks', size='ticket', color='Classificação de Peer',
-                    hover_name='municipio_norm', size_max=45, text='municipio_norm',
-                    title=f'Comportamento do Ecossistema: {sel_cidade} vs Peers Competitivos',
-                    labels={'total': 'Volume de Players', 'sharks': 'Presença de Big Players', 'ticket': 'Capitalização Mediana'},
-                    color_discrete_map={'Alvo Estratégico': '#c0392b', 'Peer Regional (Similar)': '#f39c12'}
-                )
-                fig_peers.update_traces(textposition='top center', textfont=dict(size=14, color='white'))
-                fig_peers.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=500)
-                st.plotly_chart(fig_peers, use_container_width=True)
-            else:
-                st.info("Volume amostral subcrítico para cálculo de vizinhança geomercadológica.")
+                    def _fig_peers():
+                        fig_peers = px.scatter(
+                            peer_cluster, x='total', y='sharks', size='ticket', color='Classificação de Peer',
+                            hover_name='municipio_norm', size_max=45, text='municipio_norm',
+                            title=f'Comportamento do Ecossistema: {sel_cidade} vs Peers Competitivos',
+                            labels={'total': 'Volume de Players', 'sharks': 'Presença de Big Players', 'ticket': 'Capitalização Mediana'},
+                            color_discrete_map={'Alvo Estratégico': '#c0392b', 'Peer Regional (Similar)': '#f39c12'}
+                        )
+                        fig_peers.update_traces(textposition='top center', textfont=dict(size=14, color='white'))
+                        fig_peers.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=500)
+                        return fig_peers
+                    st.plotly_chart(cached_figure("peers", filter_key(__file__, versao), _fig_peers), use_container_width=True)
+                else:
+                    st.info("Volume amostral subcrítico para cálculo de vizinhança geomercadológica.")
 
     # ==========================================
     # ABA 2: VISÃO MICRO (Bairros e Território)
     # ==========================================
     with tab2:
-        st.markdown("### 🏘️ Ecossistema de Bairros (Stacked Bar)")
-        st.markdown("Descubra a predominância estrutural: Identifique zonas de alta concentração PME versus clusters de multinacionais.")
+        if tab2.open:
+            st.markdown("### 🏘️ Ecossistema de Bairros (Stacked Bar)")
+            st.markdown("Descubra a predominância estrutural: Identifique zonas de alta concentração PME versus clusters de multinacionais.")
         
-        if sel_cidade != "Todas":
-            bairros_data = df_filtered[df_filtered['bairro_norm'] != 'nao_informado']
-            top_bairros = bairros_data['bairro_norm'].value_counts().head(15).index.tolist()
-            bairros_top = bairros_data[bairros_data['bairro_norm'].isin(top_bairros)]
+            if sel_cidade != "Todas":
+                bairros_data = df_filtered[df_filtered['bairro_norm'] != 'nao_informado']
+                top_bairros = bairros_data['bairro_norm'].value_counts().head(15).index.tolist()
+                bairros_top = bairros_data[bairros_data['bairro_norm'].isin(top_bairros)]
             
-            if not bairros_top.empty:
-                bairros_tier = bairros_top.groupby(['bairro_norm', 'tier_concorrente']).size().reset_index(name='count')
+                if not bairros_top.empty:
+                    bairros_tier = bairros_top.groupby(['bairro_norm', 'tier_concorrente']).size().reset_index(name='count')
                 
-                fig_bairros = px.bar(
-                    bairros_tier, x='count', y='bairro_norm', color='tier_concorrente',
-                    title=f'Perfil de Ocupação da Concorrência por Bairro em {sel_cidade}',
-                    orientation='h', color_discrete_map=COLOR_MAP,
-                    category_orders={"bairro_norm": top_bairros}
-                )
-                fig_bairros.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=600)
-                st.plotly_chart(fig_bairros, use_container_width=True)
+                    def _fig_bairros():
+                        fig_bairros = px.bar(
+                            bairros_tier, x='count', y='bairro_norm', color='tier_concorrente',
+                            title=f'Perfil de Ocupação da Concorrência por Bairro em {sel_cidade}',
+                            orientation='h', color_discrete_map=COLOR_MAP,
+                            category_orders={"bairro_norm": top_bairros}
+                        )
+                        fig_bairros.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=600)
+                        return fig_bairros
+                    st.plotly_chart(cached_figure("bairros", filter_key(__file__, versao), _fig_bairros), use_container_width=True)
+                else:
+                    st.info("Resolução geográfica de bairros insuficiente na base de dados desta cidade.")
             else:
-                st.info("Resolução geográfica de bairros insuficiente na base de dados desta cidade.")
-        else:
-            st.warning("⚠️ O Raio-X de Bairros exige a seleção de uma cidade específica no menu lateral de comando.")
+                st.warning("⚠️ O Raio-X de Bairros exige a seleção de uma cidade específica no menu lateral de comando.")
 
     # ==========================================
     # ABA 3: PERFIL DE MERCADO (Donut e Sobrevivência)
     # ==========================================
     with tab3:
-        c1, c2 = st.columns(2)
+        if tab3.open:
+            c1, c2 = st.columns(2)
         
-        with c1:
-            st.markdown("### 🍩 Proporção Hierárquica (Market Share)")
-            df_tier = df_filtered['tier_concorrente'].value_counts().reset_index()
-            df_tier.columns = ['tier', 'count']
+            with c1:
+                st.markdown("### 🍩 Proporção Hierárquica (Market Share)")
+                df_tier = df_filtered['tier_concorrente'].value_counts().reset_index()
+                df_tier.columns = ['tier', 'count']
             
-            fig_donut = px.pie(
-                df_tier, values='count', names='tier',
-                hole=0.5, color='tier', color_discrete_map=COLOR_MAP,
-                category_orders={'tier': ORDER_TIER}
-            )
-            fig_donut.update_traces(textposition='inside', textinfo='percent+label')
-            fig_donut.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", showlegend=False)
-            st.plotly_chart(fig_donut, use_container_width=True)
+                def _fig_donut():
+                    fig_donut = px.pie(
+                        df_tier, values='count', names='tier',
+                        hole=0.5, color='tier', color_discrete_map=COLOR_MAP,
+                        category_orders={'tier': ORDER_TIER}
+                    )
+                    fig_donut.update_traces(textposition='inside', textinfo='percent+label')
+                    fig_donut.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", showlegend=False)
+                    return fig_donut
+                st.plotly_chart(cached_figure("donut", filter_key(__file__, versao), _fig_donut), use_container_width=True)
 
-        with c2:
-            st.markdown("### ⏳ Modelo de Sobrevivência Curva de Maturidade")
-            data_plot = df_filtered[df_filtered['idade_empresa_anos'] <= 50]
-            
-            if not data_plot.empty:
-                fig_hist, ax = plt.subplots(figsize=(8, 5))
-                fig_hist.patch.set_facecolor('#1E1E1E')
-                ax.set_facecolor('#1E1E1E')
-                
-                sns.histplot(data=data_plot, x='idade_empresa_anos', bins=30, kde=True, color='#c0392b', ax=ax)
-                ax.axvline(5, color='orange', linestyle='--', linewidth=2, label="Early Stage (Novos)")
-                ax.axvline(20, color='green', linestyle='--', linewidth=2, label="Legacy (Tradicionais)")
-                
-                ax.tick_params(colors='white')
-                ax.xaxis.label.set_color('white')
-                ax.yaxis.label.set_color('white')
-                ax.title.set_color('white')
-                ax.legend()
-                
-                st.pyplot(fig_hist)
-            else:
-                st.info("Dispersão temporal insuficiente para compilação do histograma de maturidade.")
+            with c2:
+                st.markdown("### ⏳ Modelo de Sobrevivência Curva de Maturidade")
+                png_hist = age_histogram_png(
+                    df_filtered['idade_empresa_anos'], limite=50, bins=30,
+                    estilo={
+                        'fundo': '#1E1E1E', 'cor_texto': 'white', 'cor': '#c0392b', 'xlabel': 'idade_empresa_anos',
+                        'linhas': [(5, 'orange', "Early Stage (Novos)"), (20, 'green', "Legacy (Tradicionais)")],
+                    },
+                )
+                if png_hist is not None:
+                    st.image(png_hist, use_container_width=True)
+                else:
+                    st.info("Dispersão temporal insuficiente para compilação do histograma de maturidade.")
 
     # ==========================================
     # ABA 4: EXPORTAÇÃO E RIVAIS DIRETOS
     # ==========================================
     with tab4:
-        st.markdown("### 🎯 Lista Ouro: Rivais Diretos (PME Target Filter)")
-        st.markdown("Ruído operacional removido. Listagem focada no segmento de Corretoras Estabelecidas que disputam a mesma base clientelar corporativa PME.")
+        if tab4.open:
+            st.markdown("### 🎯 Lista Ouro: Rivais Diretos (PME Target Filter)")
+            st.markdown("Ruído operacional removido. Listagem focada no segmento de Corretoras Estabelecidas que disputam a mesma base clientelar corporativa PME.")
         
-        df_rivals = df_filtered[df_filtered['tier_concorrente'].str.contains('PME', na=False)]
-        df_rivals = df_rivals.sort_values(by=['capital_social', 'idade_empresa_anos'], ascending=[False, False])
+            df_rivals = df_filtered[df_filtered['tier_concorrente'].str.contains('PME', na=False, regex=False)]
+            df_rivals = top_k(df_rivals, ['capital_social', 'idade_empresa_anos'], 50)
         
-        cols_to_show = ['razao_social', 'municipio_norm', 'bairro_norm', 'perfil_ameaca', 'idade_empresa_anos', 'capital_social']
-        cols_available = [c for c in cols_to_show if c in df_rivals.columns]
+            cols_to_show = ['razao_social', 'municipio_norm', 'bairro_norm', 'perfil_ameaca', 'idade_empresa_anos', 'capital_social']
+            cols_available = [c for c in cols_to_show if c in df_rivals.columns]
         
-        st.dataframe(df_rivals[cols_available].head(50), use_container_width=True)
+            st.dataframe(df_rivals[cols_available], use_container_width=True)
         
-        st.markdown("---")
-        st.markdown("### 📥 Datalake & Output Executivo")
+            st.markdown("---")
+            st.markdown("### 📥 Datalake & Output Executivo")
         
-        c_dl1, c_dl2 = st.columns(2)
+            c_dl1, c_dl2 = st.columns(2)
         
-        with c_dl1:
-            st.download_button(
-                "💾 Extração Raw Data (CSV Filtrado)", 
-                df_filtered.to_csv(index=False).encode('utf-8'), 
-                f"base_concorrencia_{sel_uf}.csv", 
-                "text/csv", 
-                use_container_width=True
-            )
+            with c_dl1:
+                # CSV gerado só no clique, já com os contatos (buscados no arquivo)
+                st.download_button(
+                    "💾 Extração Raw Data (CSV Filtrado)", 
+                    lambda: timed_export("csv", lambda: with_cnpj_text(with_details(df_filtered)).to_csv(index=False).encode('utf-8'), painel="app"), 
+                    f"base_concorrencia_{sel_uf}.csv", 
+                    "text/csv", 
+                    use_container_width=True
+                )
             
-        with c_dl2:
-            if sel_cidade != "Todas":
-                try:
-                    pdf_bytes = generate_pdf(df_filtered, sel_cidade, sel_uf)
-                    st.download_button(
-                        "📄 Emissão de Dossiê Tático PME (PDF)", 
-                        data=pdf_bytes, 
-                        file_name=f"dossie_concorrencia_{sel_cidade}.pdf", 
-                        mime="application/pdf", 
-                        use_container_width=True
-                    )
-                except Exception as e:
-                    st.error(f"Erro ao compilar o engine de renderização PDF: {e}")
-            else:
-                st.button("🔒 Requisito: Fixe um Município no Radar para desbloquear emissão de Dossiê PDF", disabled=True, use_container_width=True)
+            with c_dl2:
+                if sel_cidade != "Todas":
+                    try:
+                        pdf_bytes = generate_pdf(df_filtered, sel_cidade, sel_uf)
+                        st.download_button(
+                            "📄 Emissão de Dossiê Tático PME (PDF)", 
+                            data=pdf_bytes, 
+                            file_name=f"dossie_concorrencia_{sel_cidade}.pdf", 
+                            mime="application/pdf", 
+                            use_container_width=True
+                        )
+                    except Exception as e:
+                        st.error(f"Erro ao compilar o engine de renderização PDF: {e}")
+                else:
+                    st.button("🔒 Requisito: Fixe um Município no Radar para desbloquear emissão de Dossiê PDF", disabled=True, use_container_width=True)
 
 if __name__ == "__main__":
 
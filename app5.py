@@ -2,13 +2,23 @@
 import os
 import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-import matplotlib.pyplot as plt
-import seaborn as sns
 import streamlit as st
-from fpdf import FPDF
 from datetime import datetime
+from core.bitmaps import count_where
+from core.charts import age_histogram_png
+from core.cnae import cnae_multiselect
+from core.datasets import dataset_path, read_dataset, version_of, with_details
+from core.figures import cached_figure
+from core.filters import city_options, filter_key, territory_slice, uf_options
+from core.footprint import track_dataset
+from core.lazy import lazy_import
+from core.metrics import timed_export
+from core.navigation import lazy_tabs
+from core.ranking import top_k
+from core.schema import CONTATO_FORMATADO, EMAIL_PRINCIPAL, with_cnpj_text, with_contact_fields
+from core.tracing import cache_miss, span, trace_rerun, traced
+
+px = lazy_import("plotly.express")
 
 # Configuração da Página (Construction Theme)
 st.set_page_config(
@@ -33,53 +43,56 @@ TIER_COLORS = {
 }
 
 # --- BLOCO 2: CARGA DE DADOS ---
-@st.cache_data(ttl=3600)
+# Compartilhado entre sessões: o DataFrame não é alterado após a carga
+@st.cache_resource(ttl=3600)
 def load_data() -> pd.DataFrame:
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(base_dir, 'construction_market_processed.parquet')
+    cache_miss("load_data")
+    file_path = dataset_path('construction_market_processed.parquet')
 
     if not os.path.exists(file_path):
         st.error(f"Base de dados não encontrada em: {file_path}. Rode o script ETL primeiro.")
         st.stop()
 
-    df = pd.read_parquet(file_path)
+    df = read_dataset(file_path)
     return df
 
 # --- BLOCO 3: SIDEBAR (FILTROS) ---
+@traced()
 def sidebar_filters(df: pd.DataFrame):
     st.sidebar.markdown("## 🧭 Radar de Obras")
     st.sidebar.markdown("Filtre o mercado:")
     
-    lista_ufs = [str(x) for x in df['uf_norm'].dropna().unique().tolist()]
-    opts_uf = ["Todos"] + sorted(lista_ufs)
+    opts_uf = ["Todos"] + uf_options(df)
     
     default_uf_idx = opts_uf.index('sp') if 'sp' in opts_uf else 0
-    sel_uf = st.sidebar.selectbox("Estado (UF)", opts_uf, index=default_uf_idx)
+    sel_uf = st.sidebar.selectbox("Estado (UF)", opts_uf, index=default_uf_idx, key="filtro_uf")
     
-    df_filtered = df.copy()
     sel_cidade = "Todas"
     
     if sel_uf != "Todos":
-        df_filtered = df_filtered[df_filtered['uf_norm'] == sel_uf]
-        
-        lista_cidades = [str(x) for x in df_filtered['municipio_norm'].dropna().unique().tolist()]
-        opts_cidade = ["Todas"] + sorted(lista_cidades)
-        sel_cidade = st.sidebar.selectbox("Cidade", opts_cidade, index=0)
-        
-        if sel_cidade != "Todas":
-            df_filtered = df_filtered[df_filtered['municipio_norm'] == sel_cidade]
+        opts_cidade = ["Todas"] + city_options(df, sel_uf, 'municipio_norm')
+        sel_cidade = st.sidebar.selectbox("Cidade", opts_cidade, index=0, key="filtro_cidade")
+
+    # Filtro de Atividade (CNAE principal ou secundária, pelo índice gravado no ETL)
+    sel_cnae = cnae_multiselect(df)
 
     # Filtro de Segmento/Cadeia Produtiva
+    sel_seg = []
     if 'segmento_construcao' in df.columns:
         lista_seg = [str(x) for x in df['segmento_construcao'].dropna().unique().tolist()]
-        sel_seg = st.sidebar.multiselect("Cadeia Produtiva", lista_seg, default=lista_seg)
-        if sel_seg:
-            df_filtered = df_filtered[df_filtered['segmento_construcao'].isin(sel_seg)]
+        sel_seg = st.sidebar.multiselect("Cadeia Produtiva", lista_seg, default=lista_seg, key="filtro_segmento")
+
+    # Território (UF, cidade e CNAE) guardado na sessão como bitmap: trocar só os filtros não o refaz,
+    # e só as linhas do território nos segmentos marcados são materializadas
+    df_filtered = territory_slice(df, sel_uf, sel_cidade, 'municipio_norm', sel_cnae, 'segmento_construcao', sel_seg)
             
     return df_filtered, sel_uf, sel_cidade
 
 # --- BLOCO 4: GERAÇÃO DE PDF (REPORTE EXECUTIVO) ---
+@traced()
 def generate_pdf(df_city: pd.DataFrame, cidade: str, estado: str):
+    from fpdf import FPDF
+
     pdf = FPDF()
     pdf.add_page()
     pdf.set_auto_page_break(auto=True, margin=15)
@@ -114,9 +127,11 @@ def generate_pdf(df_city: pd.DataFrame, cidade: str, estado: str):
     pdf.set_font("Arial", "", 7)
     # Ordenação Inteligente: Capital Social -> Contatabilidade -> Idade
     if 'score_contato' in df_city.columns:
-        df_leads = df_city.sort_values(by=['capital_social', 'score_contato', 'idade_empresa_anos'], ascending=[False, False, False]).head(15)
+        df_leads = top_k(df_city, ['capital_social', 'score_contato', 'idade_empresa_anos'], 15)
     else:
-        df_leads = df_city.sort_values(by=['capital_social', 'idade_empresa_anos'], ascending=[False, False]).head(15)
+        df_leads = top_k(df_city, ['capital_social', 'idade_empresa_anos'], 15)
+    # Contatos só das 15 linhas do relatório, lidos do arquivo (já formatados pelo ETL)
+    df_leads = with_cnpj_text(with_contact_fields(with_details(df_leads)))
     
     if df_leads.empty:
         pdf.cell(0, 10, "Nenhuma construtora encontrada neste filtro.", 1, align='C', ln=1)
@@ -129,10 +144,8 @@ def generate_pdf(df_city: pd.DataFrame, cidade: str, estado: str):
             idade = f"{r.get('idade_empresa_anos', 0):.0f}"
             
             # Formatação de Contato
-            ddd = str(int(r['ddd_1'])) if pd.notnull(r.get('ddd_1')) else ""
-            tel = str(int(r['telefone_1'])) if pd.notnull(r.get('telefone_1')) else ""
-            telefone = f"({ddd}){tel}" if ddd and tel else ""
-            email = str(r.get('email_contato', '')).split(',')[0][:20] if pd.notnull(r.get('email_contato')) else ""
+            telefone = r.get(CONTATO_FORMATADO) if pd.notnull(r.get(CONTATO_FORMATADO)) else ""
+            email = r.get(EMAIL_PRINCIPAL)[:20] if pd.notnull(r.get(EMAIL_PRINCIPAL)) else ""
             contato = f"{telefone} {email}".strip()
             if len(contato) < 2: contato = "N/D"
             
@@ -150,6 +163,7 @@ def generate_pdf(df_city: pd.DataFrame, cidade: str, estado: str):
     return bytes(pdf_out)
 
 # --- BLOCO 5: APP MAIN ---
+@trace_rerun
 def main():
     st.markdown(f"<h1 style='text-align: center; color: {CONST_PRIMARY};'>🏗️ Inteligência de Mercado: Engenharia & Construção</h1>", unsafe_allow_html=True)
     
@@ -162,7 +176,11 @@ def main():
     </div>
     """, unsafe_allow_html=True)
 
-    df = load_data()
+    with span("load_data", cache="load_data") as etapa:
+        df = load_data()
+        etapa.linhas = len(df)
+    track_dataset("app5", df)
+    versao = version_of(df)
     df_filtered, sel_uf, sel_cidade = sidebar_filters(df)
     
     if df_filtered.empty:
@@ -176,14 +194,14 @@ def main():
     
     # % de Alto Risco (Canteiro)
     if 'risco_operacional' in df_filtered.columns:
-        alto_risco_vol = df_filtered[df_filtered['risco_operacional'].str.contains('Alto Risco', na=False)].shape[0]
+        alto_risco_vol = df_filtered[df_filtered['risco_operacional'].str.contains('Alto Risco', na=False, regex=False)].shape[0]
         alto_risco_perc = (alto_risco_vol / total * 100) if total > 0 else 0
     else:
         alto_risco_perc = 0
         
     # % de High Ticket
     if 'is_high_ticket' in df_filtered.columns:
-        high_ticket_vol = df_filtered['is_high_ticket'].sum()
+        high_ticket_vol = count_where(df_filtered, df, 'is_high_ticket')
         high_ticket_perc = (high_ticket_vol / total * 100) if total > 0 else 0
     else:
         high_ticket_perc = 0
@@ -204,7 +222,7 @@ def main():
     st.markdown("<br>", unsafe_allow_html=True)
     
     # --- ORGANIZAÇÃO EM ABAS ---
-    tab1, tab2, tab3, tab4 = st.tabs([
+    tab1, tab2, tab3, tab4 = lazy_tabs([
         "🌍 Matriz Geográfica (Hubs)", 
         "🏙️ Vocação dos Bairros", 
         "📊 Perfil de Risco e Porte", 
@@ -215,226 +233,238 @@ def main():
     # ABA 1: VISÃO MACRO (MATRIZES)
     # ==========================================
     with tab1:
-        if sel_uf == "Todos" and sel_cidade == "Todas":
-            st.markdown("### 🗺️ Estratégia de Expansão (Mapeamento Nacional)")
-            st.markdown("*Localize estados fora do eixo principal que possuem forte concentração financeira (Baleias da Engenharia).*")
+        if tab1.open:
+            if sel_uf == "Todos" and sel_cidade == "Todas":
+                st.markdown("### 🗺️ Estratégia de Expansão (Mapeamento Nacional)")
+                st.markdown("*Localize estados fora do eixo principal que possuem forte concentração financeira (Baleias da Engenharia).*")
             
-            df_expansion = df[df['uf_norm'] != 'sp'].copy() if 'sp' in df['uf_norm'].values else df.copy()
-            if 'is_high_ticket' not in df_expansion.columns:
-                df_expansion['is_high_ticket'] = df_expansion.get('tier_cliente', '').isin(['Grande Porte (Incorporadora)', 'Infraestrutura / Obras Públicas (>10M)']).astype(int)
+                df_expansion = df[df['uf_norm'] != 'sp'].copy() if 'sp' in df['uf_norm'].values else df.copy()
+                if 'is_high_ticket' not in df_expansion.columns:
+                    df_expansion['is_high_ticket'] = df_expansion.get('tier_cliente', '').isin(['Grande Porte (Incorporadora)', 'Infraestrutura / Obras Públicas (>10M)']).astype(int)
 
-            expansion_data = df_expansion.groupby('uf_norm').agg(
-                total_empresas=('cnpj_completo', 'count'),
-                leads_high_ticket=('is_high_ticket', 'sum')
-            ).reset_index().sort_values(by='total_empresas', ascending=False).head(10)
+                expansion_data = df_expansion.groupby('uf_norm').agg(
+                    total_empresas=('cnpj_completo', 'count'),
+                    leads_high_ticket=('is_high_ticket', 'sum')
+                ).reset_index().sort_values(by='total_empresas', ascending=False).head(10)
             
-            fig_exp = px.bar(
-                expansion_data, x='uf_norm', y='total_empresas', color='leads_high_ticket',
-                title='Volume Total vs Densidade de Grandes Incorporadoras (Cor Escura)',
-                labels={'uf_norm': 'Estado', 'total_empresas': 'Volume de Empresas', 'leads_high_ticket': 'Qtd. Grandes Obras'},
-                color_continuous_scale='Oranges', text_auto='.2s'
-            )
-            fig_exp.update_layout(template="plotly_white", height=500)
-            st.plotly_chart(fig_exp, use_container_width=True)
+                def _fig_exp():
+                    fig_exp = px.bar(
+                        expansion_data, x='uf_norm', y='total_empresas', color='leads_high_ticket',
+                        title='Volume Total vs Densidade de Grandes Incorporadoras (Cor Escura)',
+                        labels={'uf_norm': 'Estado', 'total_empresas': 'Volume de Empresas', 'leads_high_ticket': 'Qtd. Grandes Obras'},
+                        color_continuous_scale='Oranges', text_auto='.2s'
+                    )
+                    fig_exp.update_layout(template="plotly_white", height=500)
+                    return fig_exp
+                st.plotly_chart(cached_figure("exp", filter_key(__file__, versao), _fig_exp), use_container_width=True)
 
-        elif sel_uf != "Todos" and sel_cidade == "Todas":
-            st.markdown(f"### 📍 Matriz de Oportunidades em {sel_uf.upper()}")
-            st.markdown("*Identifique Polos Industriais: Cidades isoladas no canto superior direito são Oásis para corretagem B2B.*")
+            elif sel_uf != "Todos" and sel_cidade == "Todas":
+                st.markdown(f"### 📍 Matriz de Oportunidades em {sel_uf.upper()}")
+                st.markdown("*Identifique Polos Industriais: Cidades isoladas no canto superior direito são Oásis para corretagem B2B.*")
             
-            city_matrix = df_filtered.groupby('municipio_norm').agg(
-                total_empresas=('cnpj_completo', 'count'),
-                leads_high_ticket=('is_high_ticket', 'sum'),
-                idade_media_anos=('idade_empresa_anos', 'mean')
-            ).reset_index()
+                city_matrix = df_filtered.groupby('municipio_norm').agg(
+                    total_empresas=('cnpj_completo', 'count'),
+                    leads_high_ticket=('is_high_ticket', 'sum'),
+                    idade_media_anos=('idade_empresa_anos', 'mean')
+                ).reset_index()
             
-            city_matrix = city_matrix.sort_values(by='total_empresas', ascending=False).head(20)
+                city_matrix = city_matrix.sort_values(by='total_empresas', ascending=False).head(20)
             
-            if not city_matrix.empty:
-                fig_scatter = px.scatter(
-                    city_matrix, x='total_empresas', y='leads_high_ticket', size='leads_high_ticket', 
-                    color='idade_media_anos', hover_name='municipio_norm', size_max=45, text='municipio_norm',
-                    title=f'Batalha de Hubs Regionais: Volume vs Ticket Médio ({sel_uf.upper()})',
-                    labels={'leads_high_ticket': 'Grandes Incorporadoras (>1M)', 'total_empresas': 'Pequenas/Médias (Volume)', 'idade_media_anos': 'Maturidade (Anos)'},
-                    color_continuous_scale='Oranges'
-                )
-                fig_scatter.update_traces(textposition='top center')
-                fig_scatter.add_vline(x=city_matrix['total_empresas'].mean(), line_dash="dash", line_color="grey")
-                fig_scatter.add_hline(y=city_matrix['leads_high_ticket'].mean(), line_dash="dash", line_color="grey")
-                fig_scatter.update_layout(template="plotly_white", showlegend=False, height=550)
-                st.plotly_chart(fig_scatter, use_container_width=True)
+                if not city_matrix.empty:
+                    def _fig_scatter():
+                        fig_scatter = px.scatter(
+                            city_matrix, x='total_empresas', y='leads_high_ticket', size='leads_high_ticket', 
+                            color='idade_media_anos', hover_name='municipio_norm', size_max=45, text='municipio_norm',
+                            title=f'Batalha de Hubs Regionais: Volume vs Ticket Médio ({sel_uf.upper()})',
+                            labels={'leads_high_ticket': 'Grandes Incorporadoras (>1M)', 'total_empresas': 'Pequenas/Médias (Volume)', 'idade_media_anos': 'Maturidade (Anos)'},
+                            color_continuous_scale='Oranges'
+                        )
+                        fig_scatter.update_traces(textposition='top center')
+                        fig_scatter.add_vline(x=city_matrix['total_empresas'].mean(), line_dash="dash", line_color="grey")
+                        fig_scatter.add_hline(y=city_matrix['leads_high_ticket'].mean(), line_dash="dash", line_color="grey")
+                        fig_scatter.update_layout(template="plotly_white", showlegend=False, height=550)
+                        return fig_scatter
+                    st.plotly_chart(cached_figure("scatter", filter_key(__file__, versao), _fig_scatter), use_container_width=True)
 
-        elif sel_cidade != "Todas":
-            st.markdown(f"### 🧬 Expansão Tática via Clustering K-NN: {sel_cidade.title()}")
-            st.markdown(f"*O algoritmo identifica quais as 5 cidades em {sel_uf.upper()} têm exatamente o mesmo perfil econômico e de densidade para você clonar sua estratégia comercial.*")
+            elif sel_cidade != "Todas":
+                st.markdown(f"### 🧬 Expansão Tática via Clustering K-NN: {sel_cidade.title()}")
+                st.markdown(f"*O algoritmo identifica quais as 5 cidades em {sel_uf.upper()} têm exatamente o mesmo perfil econômico e de densidade para você clonar sua estratégia comercial.*")
             
-            df_state_baseline = df[df['uf_norm'] == sel_uf]
-            city_matrix_full = df_state_baseline.groupby('municipio_norm').agg(
-                total=('cnpj_completo', 'count'),
-                high_ticket=('is_high_ticket', 'sum')
-            ).reset_index()
+                df_state_baseline = df[df['uf_norm'] == sel_uf]
+                city_matrix_full = df_state_baseline.groupby('municipio_norm').agg(
+                    total=('cnpj_completo', 'count'),
+                    high_ticket=('is_high_ticket', 'sum')
+                ).reset_index()
             
-            sel_stats = city_matrix_full[city_matrix_full['municipio_norm'] == sel_cidade]
+                sel_stats = city_matrix_full[city_matrix_full['municipio_norm'] == sel_cidade]
             
-            if not sel_stats.empty:
-                val_total = sel_stats['total'].values[0]
-                val_ht = sel_stats['high_ticket'].values[0]
+                if not sel_stats.empty:
+                    val_total = sel_stats['total'].values[0]
+                    val_ht = sel_stats['high_ticket'].values[0]
                 
-                max_total = city_matrix_full['total'].max() if city_matrix_full['total'].max() > 0 else 1
-                max_ht = city_matrix_full['high_ticket'].max() if city_matrix_full['high_ticket'].max() > 0 else 1
+                    max_total = city_matrix_full['total'].max() if city_matrix_full['total'].max() > 0 else 1
+                    max_ht = city_matrix_full['high_ticket'].max() if city_matrix_full['high_ticket'].max() > 0 else 1
                 
-                # Distância Euclidiana Bivariada
-                city_matrix_full['dist_euclidiana'] = np.sqrt(
-                    (((city_matrix_full['total'] - val_total)/max_total) ** 2) + 
-                    (((city_matrix_full['high_ticket'] - val_ht)/max_ht) ** 2) 
-                )
+                    # Distância Euclidiana Bivariada
+                    city_matrix_full['dist_euclidiana'] = np.sqrt(
+                        (((city_matrix_full['total'] - val_total)/max_total) ** 2) + 
+                        (((city_matrix_full['high_ticket'] - val_ht)/max_ht) ** 2) 
+                    )
                 
-                peer_cluster = city_matrix_full.sort_values('dist_euclidiana').head(6).copy()
-                peer_cluster['Cluster'] = peer_cluster['municipio_norm'].apply(
-                    lambda x: 'Alvo Atual' if x == sel_cidade else 'Clone Comercial'
-                )
+                    peer_cluster = city_matrix_full.sort_values('dist_euclidiana').head(6).copy()
+                    peer_cluster['Cluster'] = peer_cluster['municipio_norm'].apply(
+                        lambda x: 'Alvo Atual' if x == sel_cidade else 'Clone Comercial'
+                    )
                 
-                fig_peers = px.scatter(
-                    peer_cluster, x='total', y='high_ticket', size='total', color='Cluster',
-                    hover_name='municipio_norm', size_max=45, text='municipio_norm',
-                    title=f'Gêmeos Mercadológicos de {sel_cidade.title()}',
-                    labels={'total': 'Volume Total', 'high_ticket': 'Qtd. Incorporadoras/Obras Públicas'},
-                    color_discrete_map={'Alvo Atual': CONST_PRIMARY, 'Clone Comercial': CONST_DARK}
-                )
-                fig_peers.update_traces(textposition='top center')
-                fig_peers.update_layout(template="plotly_white", height=500)
-                st.plotly_chart(fig_peers, use_container_width=True)
+                    def _fig_peers():
+                        fig_peers = px.scatter(
+                            peer_cluster, x='total', y='high_ticket', size='total', color='Cluster',
+                            hover_name='municipio_norm', size_max=45, text='municipio_norm',
+                            title=f'Gêmeos Mercadológicos de {sel_cidade.title()}',
+                            labels={'total': 'Volume Total', 'high_ticket': 'Qtd. Incorporadoras/Obras Públicas'},
+                            color_discrete_map={'Alvo Atual': CONST_PRIMARY, 'Clone Comercial': CONST_DARK}
+                        )
+                        fig_peers.update_traces(textposition='top center')
+                        fig_peers.update_layout(template="plotly_white", height=500)
+                        return fig_peers
+                    st.plotly_chart(cached_figure("peers", filter_key(__file__, versao), _fig_peers), use_container_width=True)
 
     # ==========================================
     # ABA 2: VISÃO MICRO (Bairros por Segmento)
     # ==========================================
     with tab2:
-        st.markdown("### 🏘️ Vocação Geográfica (Sede Administrativa vs Canteiro de Obras)")
-        st.markdown("Bairros com alta concentração de 'Instalações/Terraplenagem' indicam bases operacionais. Áreas de 'Construtora/Administração' indicam sedes financeiras.")
+        if tab2.open:
+            st.markdown("### 🏘️ Vocação Geográfica (Sede Administrativa vs Canteiro de Obras)")
+            st.markdown("Bairros com alta concentração de 'Instalações/Terraplenagem' indicam bases operacionais. Áreas de 'Construtora/Administração' indicam sedes financeiras.")
         
-        if sel_cidade != "Todas":
-            bairros_data = df_filtered[df_filtered['bairro_norm'] != 'nao_informado']
-            if not bairros_data.empty and 'segmento_construcao' in bairros_data.columns:
+            if sel_cidade != "Todas":
+                bairros_data = df_filtered[df_filtered['bairro_norm'] != 'nao_informado']
+                if not bairros_data.empty and 'segmento_construcao' in bairros_data.columns:
                 
-                top_bairros_list = bairros_data['bairro_norm'].value_counts().head(15).index.tolist()
-                df_bairros_top = bairros_data[bairros_data['bairro_norm'].isin(top_bairros_list)]
+                    top_bairros_list = bairros_data['bairro_norm'].value_counts().head(15).index.tolist()
+                    df_bairros_top = bairros_data[bairros_data['bairro_norm'].isin(top_bairros_list)]
                 
-                bairros_segmento = df_bairros_top.groupby(['bairro_norm', 'segmento_construcao']).size().reset_index(name='count')
+                    bairros_segmento = df_bairros_top.groupby(['bairro_norm', 'segmento_construcao']).size().reset_index(name='count')
                 
-                fig_bairros = px.bar(
-                    bairros_segmento, x='count', y='bairro_norm', color='segmento_construcao',
-                    orientation='h', title=f'Perfil Produtivo dos Bairros em {sel_cidade.title()}',
-                    labels={'count': 'Qtd. CNPJs', 'bairro_norm': 'Bairro', 'segmento_construcao': 'Atividade'},
-                    category_orders={"bairro_norm": top_bairros_list},
-                    color_discrete_sequence=px.colors.qualitative.Prism
-                )
+                    def _fig_bairros():
+                        fig_bairros = px.bar(
+                            bairros_segmento, x='count', y='bairro_norm', color='segmento_construcao',
+                            orientation='h', title=f'Perfil Produtivo dos Bairros em {sel_cidade.title()}',
+                            labels={'count': 'Qtd. CNPJs', 'bairro_norm': 'Bairro', 'segmento_construcao': 'Atividade'},
+                            category_orders={"bairro_norm": top_bairros_list},
+                            color_discrete_sequence=px.colors.qualitative.Prism
+                        )
                 
-                # --- CORREÇÃO APLICADA AQUI: Espaço no topo (margin) e ancoragem centralizada da legenda ---
-                fig_bairros.update_layout(
-                    template="plotly_white", 
-                    height=650, 
-                    margin=dict(t=120), # Aumenta a margem superior
-                    legend=dict(
-                        orientation="h", 
-                        yanchor="bottom", 
-                        y=1.02, 
-                        xanchor="center", 
-                        x=0.5
-                    )
-                )
+                        # --- CORREÇÃO APLICADA AQUI: Espaço no topo (margin) e ancoragem centralizada da legenda ---
+                        fig_bairros.update_layout(
+                            template="plotly_white", 
+                            height=650, 
+                            margin=dict(t=120), # Aumenta a margem superior
+                            legend=dict(
+                                orientation="h", 
+                                yanchor="bottom", 
+                                y=1.02, 
+                                xanchor="center", 
+                                x=0.5
+                            )
+                        )
                 
-                st.plotly_chart(fig_bairros, use_container_width=True)
+                        return fig_bairros
+                    st.plotly_chart(cached_figure("bairros", filter_key(__file__, versao), _fig_bairros), use_container_width=True)
+                else:
+                    st.info("Dados insuficientes de Bairro ou Segmento para esta localidade.")
             else:
-                st.info("Dados insuficientes de Bairro ou Segmento para esta localidade.")
-        else:
-            st.warning("⚠️ Selecione uma Cidade ESPECÍFICA no menu lateral para visualizar o raio-x de bairros.")
+                st.warning("⚠️ Selecione uma Cidade ESPECÍFICA no menu lateral para visualizar o raio-x de bairros.")
     # ==========================================
     # ABA 3: PERFIL DE RISCO E PORTE
     # ==========================================
     with tab3:
-        c1, c2 = st.columns(2)
+        if tab3.open:
+            c1, c2 = st.columns(2)
         
-        with c1:
-            st.markdown("### 🍩 O Tamanho da Obra (Tier)")
-            st.markdown("Mais de 50% são Empreiteiras Pequenas. Para estas, utilize processos digitais de Venda PME.")
+            with c1:
+                st.markdown("### 🍩 O Tamanho da Obra (Tier)")
+                st.markdown("Mais de 50% são Empreiteiras Pequenas. Para estas, utilize processos digitais de Venda PME.")
             
-            if 'tier_cliente' in df_filtered.columns:
-                tier_counts = df_filtered['tier_cliente'].value_counts().reset_index()
-                tier_counts.columns = ['Tier', 'Quantidade']
+                if 'tier_cliente' in df_filtered.columns:
+                    tier_counts = df_filtered['tier_cliente'].value_counts().reset_index()
+                    tier_counts.columns = ['Tier', 'Quantidade']
                 
-                fig_tier = px.pie(
-                    tier_counts, values='Quantidade', names='Tier', hole=0.5,
-                    color='Tier', color_discrete_map=TIER_COLORS
-                )
-                fig_tier.update_traces(textposition='inside', textinfo='percent+label')
-                fig_tier.update_layout(template="plotly_white", showlegend=False)
-                st.plotly_chart(fig_tier, use_container_width=True)
+                    def _fig_tier():
+                        fig_tier = px.pie(
+                            tier_counts, values='Quantidade', names='Tier', hole=0.5,
+                            color='Tier', color_discrete_map=TIER_COLORS
+                        )
+                        fig_tier.update_traces(textposition='inside', textinfo='percent+label')
+                        fig_tier.update_layout(template="plotly_white", showlegend=False)
+                        return fig_tier
+                    st.plotly_chart(cached_figure("tier", filter_key(__file__, versao), _fig_tier), use_container_width=True)
 
-        with c2:
-            st.markdown("### ⏳ Estabilidade Financeira e Risco (Idade)")
-            st.markdown("SPEs (Sociedade de Propósito Específico) morrem em 3 anos. Foco em Seguros de prazo determinado (Zona Vermelha).")
+            with c2:
+                st.markdown("### ⏳ Estabilidade Financeira e Risco (Idade)")
+                st.markdown("SPEs (Sociedade de Propósito Específico) morrem em 3 anos. Foco em Seguros de prazo determinado (Zona Vermelha).")
             
-            data_plot = df_filtered[df_filtered['idade_empresa_anos'] <= 50]
-            if not data_plot.empty:
-                fig_hist, ax = plt.subplots(figsize=(8, 5))
-                sns.histplot(data=data_plot, x='idade_empresa_anos', bins=35, kde=True, color=CONST_SECONDARY, ax=ax)
-                
-                ax.axvline(3, color='red', linestyle='--', linewidth=2, label="Risco Operacional/SPE (<3 anos)")
-                ax.axvline(10, color='green', linestyle='--', linewidth=2, label="Sólido/Sede Própria (>10 anos)")
-                ax.set_xlabel('Anos de Atividade')
-                ax.set_ylabel('Frequência')
-                
-                sns.despine()
-                ax.legend()
-                st.pyplot(fig_hist)
-            else:
-                st.info("Dispersão insuficiente para compilar o histograma.")
+                png_hist = age_histogram_png(
+                    df_filtered['idade_empresa_anos'], limite=50, bins=35,
+                    estilo={
+                        'cor': CONST_SECONDARY, 'xlabel': 'Anos de Atividade', 'ylabel': 'Frequência', 'despine': True,
+                        'linhas': [(3, 'red', "Risco Operacional/SPE (<3 anos)"), (10, 'green', "Sólido/Sede Própria (>10 anos)")],
+                    },
+                )
+                if png_hist is not None:
+                    st.image(png_hist, use_container_width=True)
+                else:
+                    st.info("Dispersão insuficiente para compilar o histograma.")
 
     # ==========================================
     # ABA 4: EXPORTAÇÃO E GOLDEN LEADS
     # ==========================================
     with tab4:
-        st.markdown("### 🎯 Lista de Atacado (Golden Leads)")
-        st.markdown("Contas priorizadas via Inteligência de Máquina: **Capital Financeiro > Acessibilidade de Contato > Maturidade**.")
+        if tab4.open:
+            st.markdown("### 🎯 Lista de Atacado (Golden Leads)")
+            st.markdown("Contas priorizadas via Inteligência de Máquina: **Capital Financeiro > Acessibilidade de Contato > Maturidade**.")
         
-        if 'score_contato' in df_filtered.columns:
-            df_leads = df_filtered.sort_values(by=['capital_social', 'score_contato', 'idade_empresa_anos'], ascending=[False, False, False])
-        else:
-            df_leads = df_filtered.sort_values(by=['capital_social', 'idade_empresa_anos'], ascending=[False, False])
+            if 'score_contato' in df_filtered.columns:
+                df_leads = top_k(df_filtered, ['capital_social', 'score_contato', 'idade_empresa_anos'], 50)
+            else:
+                df_leads = top_k(df_filtered, ['capital_social', 'idade_empresa_anos'], 50)
             
-        cols_to_show = ['cnpj_completo', 'nome_fantasia_final', 'segmento_construcao', 'tier_cliente', 'idade_empresa_anos', 'capital_social']
-        cols_available = [c for c in cols_to_show if c in df_leads.columns]
+            cols_to_show = ['cnpj_completo', 'nome_fantasia_final', 'segmento_construcao', 'tier_cliente', 'idade_empresa_anos', 'capital_social']
+            df_show = with_cnpj_text(with_details(df_leads, ['nome_fantasia_final']))
+            cols_available = [c for c in cols_to_show if c in df_show.columns]
         
-        st.dataframe(df_leads[cols_available].head(50), use_container_width=True)
+            st.dataframe(df_show[cols_available], use_container_width=True)
         
-        st.markdown("---")
-        st.markdown("### 📥 Dossiê de Engenharia (PDF) e CSV")
+            st.markdown("---")
+            st.markdown("### 📥 Dossiê de Engenharia (PDF) e CSV")
         
-        c_dl1, c_dl2 = st.columns(2)
+            c_dl1, c_dl2 = st.columns(2)
         
-        with c_dl1:
-            st.download_button(
-                "💾 Exportar Base Raw (PMEs + Varejo)", 
-                df_filtered.to_csv(index=False).encode('utf-8'), 
-                f"obras_{sel_uf}_{sel_cidade}.csv", 
-                "text/csv", 
-                use_container_width=True
-            )
+            with c_dl1:
+                # CSV gerado só no clique, já com os contatos (buscados no arquivo)
+                st.download_button(
+                    "💾 Exportar Base Raw (PMEs + Varejo)", 
+                    lambda: timed_export("csv", lambda: with_cnpj_text(with_details(df_filtered)).to_csv(index=False).encode('utf-8'), painel="app5"), 
+                    f"obras_{sel_uf}_{sel_cidade}.csv", 
+                    "text/csv", 
+                    use_container_width=True
+                )
             
-        with c_dl2:
-            if sel_cidade != "Todas":
-                try:
-                    pdf_bytes = generate_pdf(df_filtered, sel_cidade, sel_uf)
-                    st.download_button(
-                        "📄 Dossiê de Prospecção Corporativo (PDF)", 
-                        data=pdf_bytes, 
-                        file_name=f"dossie_engenharia_{sel_cidade}.pdf", 
-                        mime="application/pdf", 
-                        use_container_width=True
-                    )
-                except Exception as e:
-                    st.error(f"Erro ao processar o arquivo PDF: {e}")
-            else:
-                st.button("🔒 Selecione uma Cidade Específica na Lateral para baixar o PDF", disabled=True, use_container_width=True)
+            with c_dl2:
+                if sel_cidade != "Todas":
+                    try:
+                        pdf_bytes = generate_pdf(df_filtered, sel_cidade, sel_uf)
+                        st.download_button(
+                            "📄 Dossiê de Prospecção Corporativo (PDF)", 
+                            data=pdf_bytes, 
+                            file_name=f"dossie_engenharia_{sel_cidade}.pdf", 
+                            mime="application/pdf", 
+                            use_container_width=True
+                        )
+                    except Exception as e:
+                        st.error(f"Erro ao processar o arquivo PDF: {e}")
+                else:
+                    st.button("🔒 Selecione uma Cidade Específica na Lateral para baixar o PDF", disabled=True, use_container_width=True)
 
 if __name__ == "__main__":
     main()
@@ -2,15 +2,24 @@
 import os
 import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-import matplotlib.pyplot as plt
-import seaborn as sns
 import streamlit as st
-from fpdf import FPDF
 from datetime import datetime
 import unicodedata
-import re
+from core.aggregations import golden_leads, heatmap_rows, municipio_matrix, peer_cities, root_summary, sum_tiers, tier_counts, uf_tier_counts, with_contacts
+from core.charts import age_histogram_png
+from core.cnae import cnae_multiselect
+from core.datasets import dataset_path, read_dataset, version_of, with_details
+from core.figures import cached_figure
+from core.filters import city_options, filter_key, slice_partial, territory_slice, uf_options
+from core.footprint import track_dataset
+from core.lazy import lazy_import
+from core.metrics import timed_export
+from core.navigation import lazy_tabs
+from core.ranking import top_k
+from core.schema import CNPJ_RAIZ, IS_MATRIZ, with_cnpj_text
+from core.tracing import cache_miss, span, trace_rerun, traced
+
+px = lazy_import("plotly.express")
 
 # Configuração da Página (Deve ser o primeiro comando Streamlit)
 st.set_page_config(
@@ -75,16 +84,18 @@ CONFIG_NICHOS = {
 }
 
 # --- BLOCO 3: CARGA DE DADOS UNIFICADA ---
-@st.cache_data(ttl=3600)
+# Compartilhado entre sessões: o DataFrame não é alterado após a carga
+@st.cache_resource(ttl=3600)
 def load_data(nicho: str) -> pd.DataFrame:
+    cache_miss("load_data")
     cfg = CONFIG_NICHOS[nicho]
-    file_path = cfg["path"]
+    file_path = dataset_path(cfg["path"])
 
     if not os.path.exists(file_path):
         st.error(f"Arquivo não encontrado: {file_path}. Rode o script de ETL deste nicho primeiro.")
         st.stop()
 
-    df = pd.read_parquet(file_path)
+    df = read_dataset(file_path)
     
     # 1. Padroniza a coluna de Segmento (Lida com o nome da coluna de cada projeto)
     col_orig = cfg["col_segmento_original"]
@@ -111,44 +122,40 @@ def load_data(nicho: str) -> pd.DataFrame:
     elif 'municipio_visual' not in df.columns and 'municipio' in df.columns:
         df['municipio_visual'] = df['municipio'].astype(str).str.title()
         
-    # 4. Padroniza Coluna de Idade
-    if 'idade_empresa_anos' not in df.columns and 'idade' in df.columns:
-        df['idade_empresa_anos'] = df['idade']
-        
     return df
 
 # --- BLOCO 4: SIDEBAR (FILTROS) ---
-def sidebar_filters(df: pd.DataFrame, cfg: dict):
+@traced()
+def sidebar_filters(df: pd.DataFrame, cfg: dict, nicho: str):
     st.sidebar.markdown("## 🎯 Radar de Prospecção")
     st.sidebar.markdown("Filtre o território de atuação:")
     
-    lista_ufs = [str(x) for x in df['uf_norm'].dropna().unique().tolist()]
-    opts_uf = ["Todos"] + sorted(lista_ufs)
-    sel_uf = st.sidebar.selectbox("Estado (UF)", opts_uf, index=0)
+    # Keys com o nicho: ao trocar de base, os filtros voltam ao padrão dela em vez de herdar seleções inválidas
+    opts_uf = ["Todos"] + uf_options(df)
+    sel_uf = st.sidebar.selectbox("Estado (UF)", opts_uf, index=0, key=f"filtro_uf_{nicho}")
     
-    df_filtered = df.copy()
     sel_cidade = "Todas"
     
     if sel_uf != "Todos":
-        df_filtered = df_filtered[df_filtered['uf_norm'] == sel_uf]
-        
-        lista_cidades = [str(x) for x in df_filtered['municipio_visual'].dropna().unique().tolist()]
-        opts_cidade = ["Todas"] + sorted(lista_cidades)
-        sel_cidade = st.sidebar.selectbox("Cidade", opts_cidade, index=0)
+        opts_cidade = ["Todas"] + city_options(df, sel_uf, 'municipio_visual')
+        sel_cidade = st.sidebar.selectbox("Cidade", opts_cidade, index=0, key=f"filtro_cidade_{nicho}")
         
-        if sel_cidade != "Todas":
-            df_filtered = df_filtered[df_filtered['municipio_visual'] == sel_cidade]
 
     opts_tier = cfg["tiers"]
-    sel_tier = st.sidebar.multiselect("Segmento Alvo", opts_tier, default=opts_tier)
-    
-    if sel_tier:
-        df_filtered = df_filtered[df_filtered['Segmento_Alvo'].isin(sel_tier)]
+    sel_tier = st.sidebar.multiselect("Segmento Alvo", opts_tier, default=opts_tier, key=f"filtro_tier_{nicho}")
+    sel_cnae = cnae_multiselect(df, key=f"filtro_cnae_{nicho}")
+
+    # Mesmo recorte do apply_filters, com o território guardado na sessão como bitmap: trocar só
+    # o tier não o refaz, e só as linhas do território nos tiers marcados são materializadas
+    df_filtered = territory_slice(df, sel_uf, sel_cidade, 'municipio_visual', sel_cnae, 'Segmento_Alvo', sel_tier)
         
-    return df_filtered, sel_uf, sel_cidade
+    return df_filtered, sel_uf, sel_cidade, sel_tier
 
 # --- BLOCO 5: GERAÇÃO DE PDF ---
+@traced()
 def generate_pdf(df_city: pd.DataFrame, cidade: str, estado: str, cfg: dict):
+    from fpdf import FPDF
+
     pdf = FPDF()
     pdf.add_page()
     pdf.set_auto_page_break(auto=True, margin=15)
@@ -188,7 +195,7 @@ def generate_pdf(df_city: pd.DataFrame, cidade: str, estado: str, cfg: dict):
         pdf.cell(col_w[i], 8, fix_text(h), 1, align='C', fill=True, ln=(1 if i == 3 else 0))
     
     pdf.set_font("Arial", "", 7)
-    df_top = df_city.sort_values(by=['capital_social', 'idade_empresa_anos'], ascending=[False, False]).head(20)
+    df_top = top_k(df_city, ['capital_social', 'idade_empresa_anos'], 20)
     
     if df_top.empty:
         pdf.cell(0, 10, "Nenhum lead relevante encontrado neste filtro.", 1, align='C', ln=1)
@@ -213,6 +220,46 @@ def generate_pdf(df_city: pd.DataFrame, cidade: str, estado: str, cfg: dict):
         return bytes(pdf.output())
 
 # --- BLOCO 6: ENGINE DE TELAS ---
+@st.fragment
+def render_explorador_unidades(df_unidades: pd.DataFrame, empresas: dict):
+    """Drill-down de filiais (empresas: raiz do CNPJ -> nome): trocar a empresa reexecuta apenas este fragmento."""
+    st.markdown("### 🏢 Explorador de Unidades")
+    with st.expander("👉 Clique aqui para detalhar as filiais de uma rede ou corretora específica"):
+        selected_rede = st.selectbox("Selecione a Empresa:", list(empresas), format_func=empresas.get)
+        if selected_rede:
+            filiais = with_cnpj_text(with_contacts(df_unidades[df_unidades[CNPJ_RAIZ] == selected_rede]))
+            cols_filiais = ['razao_social', 'cnpj_completo', IS_MATRIZ, 'municipio_visual', 'bairro_norm', 'Contato', 'Email']
+            cols_avail = [c for c in cols_filiais if c in filiais.columns]
+            st.dataframe(filiais[cols_avail], use_container_width=True)
+
+@st.fragment
+def render_area_exportacao(df_filtered: pd.DataFrame, nicho_selecionado: str, sel_uf: str, sel_cidade: str, cfg: dict):
+    """Área de downloads: o CSV só é gerado no clique e os botões não disparam rerun do painel."""
+    st.markdown("### 📥 Output Executivo")
+    c_dl1, c_dl2 = st.columns(2)
+    
+    with c_dl1:
+        st.download_button(
+            f"💾 Exportar Base {nicho_selecionado} (CSV)", 
+            lambda: timed_export("csv", lambda: with_cnpj_text(with_details(df_filtered)).to_csv(index=False).encode('utf-8-sig'), painel="app6", nicho=nicho_selecionado), 
+            f"leads_{nicho_selecionado.lower().replace(' ', '_')}_{sel_uf}.csv", 
+            "text/csv", on_click="ignore", use_container_width=True
+        )
+        
+    with c_dl2:
+        if sel_cidade != "Todas":
+            try:
+                pdf_bytes = generate_pdf(df_filtered, sel_cidade, sel_uf, cfg)
+                st.download_button(
+                    "📄 Emissão de Dossiê Local (PDF)", 
+                    data=pdf_bytes, file_name=f"dossie_{sel_cidade}.pdf", 
+                    mime="application/pdf", on_click="ignore", use_container_width=True
+                )
+            except Exception as e:
+                st.error(f"Erro no PDF: {e}")
+        else:
+            st.button("🔒 Fixe uma Cidade para liberar o PDF", disabled=True, use_container_width=True)
+
 def render_landing_page():
     """Renderiza a página inicial antes do usuário escolher o painel."""
     st.markdown("<h1 style='text-align: center; color: #2f4b7c;'>🏢 Bem-vindo ao Hub de Inteligência B2B</h1>", unsafe_allow_html=True)
@@ -231,6 +278,7 @@ def render_landing_page():
         st.warning(f"**{CONFIG_NICHOS['Turismo & Hospitalidade']['icon']} Turismo & Hospitalidade**\n\n{CONFIG_NICHOS['Turismo & Hospitalidade']['desc']}")
         st.success(f"**{CONFIG_NICHOS['Seguros & Financeiro']['icon']} Seguros & Financeiro**\n\n{CONFIG_NICHOS['Seguros & Financeiro']['desc']}")
 
+@trace_rerun
 def render_dashboard(nicho_selecionado):
     """Renderiza o Painel Analítico após a seleção."""
     cfg = CONFIG_NICHOS[nicho_selecionado]
@@ -245,8 +293,12 @@ def render_dashboard(nicho_selecionado):
     </div>
     """, unsafe_allow_html=True)
 
-    df = load_data(nicho_selecionado)
-    df_filtered, sel_uf, sel_cidade = sidebar_filters(df, cfg)
+    with span("load_data", cache="load_data") as etapa:
+        df = load_data(nicho_selecionado)
+        etapa.linhas = len(df)
+    track_dataset(f"app6: {nicho_selecionado}", df)
+    versao = version_of(df)
+    df_filtered, sel_uf, sel_cidade, sel_tier = sidebar_filters(df, cfg, nicho_selecionado)
     
     if df_filtered.empty:
         st.warning("Sem dados para os filtros aplicados. Tente ampliar a busca.")
@@ -254,7 +306,9 @@ def render_dashboard(nicho_selecionado):
 
     # --- KPIs RÁPIDOS ---
     total = len(df_filtered)
-    sharks = df_filtered['is_key_account'].sum()
+    # Key accounts por tier do território (da sessão): trocar só o tier re-soma, sem varrer linhas
+    por_tier = slice_partial(df_filtered, "kpis", lambda r: tier_counts(r, 'Segmento_Alvo', ['is_key_account']))
+    sharks = int(sum_tiers(por_tier, sel_tier)['is_key_account'])
     mediana_cap = df_filtered['capital_social'].median()
     
     col1, col2, col3, col4 = st.columns(4)
@@ -266,7 +320,7 @@ def render_dashboard(nicho_selecionado):
     st.markdown("---")
     st.info("💡 **Dica de Navegação:** Você pode **dar zoom** clicando e arrastando o mouse sobre a área desejada nos gráficos. Duplo clique para resetar.")
     
-    tab1, tab2, tab3, tab4 = st.tabs([
+    tab1, tab2, tab3, tab4 = lazy_tabs([
         "🌍 Matriz de Expansão e Saturação", 
         "🏙️ Micro-Targeting (Bairros)", 
         "📊 Perfil de Mercado", 
@@ -275,211 +329,148 @@ def render_dashboard(nicho_selecionado):
 
     # ================= ABA 1 =================
     with tab1:
-        if sel_uf == "Todos" and sel_cidade == "Todas":
-            st.markdown("### 🔥 Densidade Nacional Estrutural")
-            
-            df_heat = df_filtered.groupby(['uf_norm', 'Segmento_Alvo']).size().unstack(fill_value=0)
-            cols_avail = [c for c in cfg['tiers'] if c in df_heat.columns]
-            df_heat = df_heat[cols_avail]
+        if tab1.open:
+            if sel_uf == "Todos" and sel_cidade == "Todas":
+                st.markdown("### 🔥 Densidade Nacional Estrutural")
             
-            df_heat['Total_Volume'] = df_heat.sum(axis=1)
-            df_heat = df_heat.sort_values('Total_Volume', ascending=True).tail(15).drop(columns=['Total_Volume'])
+                contagem = slice_partial(df_filtered, "heatmap", lambda r: uf_tier_counts(r, 'Segmento_Alvo'))
+                df_heat = heatmap_rows(contagem, cfg['tiers'], 15, sel_tier)
             
-            escala = "Reds" if nicho_selecionado == "Concorrência (Seguros)" else ("Oranges" if nicho_selecionado == "Turismo & Hospitalidade" else "Blues")
+                escala = "Reds" if nicho_selecionado == "Concorrência (Seguros)" else ("Oranges" if nicho_selecionado == "Turismo & Hospitalidade" else "Blues")
             
-            fig_heat = px.imshow(
-                df_heat,
-                labels=dict(x="Segmento de Atuação", y="Estado (UF)", color="Qtd de Entidades"),
-                x=df_heat.columns, y=df_heat.index,
-                text_auto=True, color_continuous_scale=escala, aspect="auto"
-            )
-            fig_heat.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=500)
-            st.plotly_chart(fig_heat, use_container_width=True)
+                def _fig_heat():
+                    fig_heat = px.imshow(
+                        df_heat,
+                        labels=dict(x="Segmento de Atuação", y="Estado (UF)", color="Qtd de Entidades"),
+                        x=df_heat.columns, y=df_heat.index,
+                        text_auto=True, color_continuous_scale=escala, aspect="auto"
+                    )
+                    fig_heat.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=500)
+                    return fig_heat
+                st.plotly_chart(cached_figure("heat", filter_key(__file__, nicho_selecionado, versao), _fig_heat), use_container_width=True)
 
-        elif sel_uf != "Todos" and sel_cidade == "Todas":
-            st.markdown(f"### 📍 Matriz Tática Geográfica: {sel_uf}")
-            
-            city_matrix = df_filtered.groupby('municipio_visual').agg(
-                total=('cnpj_completo', 'count'),
-                idade_med=('idade_empresa_anos', 'mean'),
-                key_accounts=('is_key_account', 'sum')
-            ).reset_index()
+            elif sel_uf != "Todos" and sel_cidade == "Todas":
+                st.markdown(f"### 📍 Matriz Tática Geográfica: {sel_uf}")
             
-            city_matrix = city_matrix[city_matrix['total'] > 5].sort_values('total', ascending=False).head(20)
+                city_matrix = municipio_matrix(df_filtered, min_total=5)
             
-            if not city_matrix.empty:
-                escala = "Reds" if nicho_selecionado == "Concorrência (Seguros)" else ("Oranges" if nicho_selecionado == "Turismo & Hospitalidade" else "Blues")
+                if not city_matrix.empty:
+                    escala = "Reds" if nicho_selecionado == "Concorrência (Seguros)" else ("Oranges" if nicho_selecionado == "Turismo & Hospitalidade" else "Blues")
                 
-                fig_scatter = px.scatter(
-                    city_matrix, x='idade_med', y='total', size='total', color='key_accounts',
-                    hover_name='municipio_visual', size_max=45, text='municipio_visual',
-                    labels={'total': 'Quantidade Total', 'idade_med': 'Maturidade Média (Anos)', 'key_accounts': 'Qtd. Tubarões/Key Accounts'},
-                    color_continuous_scale=escala
-                )
-                fig_scatter.update_traces(textposition='top center')
-                fig_scatter.add_hline(y=city_matrix['total'].mean(), line_dash="dot", annotation_text="Média Volume")
-                fig_scatter.add_vline(x=city_matrix['idade_med'].mean(), line_dash="dot", annotation_text="Maturidade Média")
-                fig_scatter.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=600)
-                st.plotly_chart(fig_scatter, use_container_width=True)
-            else:
-                st.info("Municípios insuficientes no filtro.")
+                    def _fig_scatter():
+                        fig_scatter = px.scatter(
+                            city_matrix, x='idade_med', y='total', size='total', color='key_accounts',
+                            hover_name='municipio_visual', size_max=45, text='municipio_visual',
+                            labels={'total': 'Quantidade Total', 'idade_med': 'Maturidade Média (Anos)', 'key_accounts': 'Qtd. Tubarões/Key Accounts'},
+                            color_continuous_scale=escala
+                        )
+                        fig_scatter.update_traces(textposition='top center')
+                        fig_scatter.add_hline(y=city_matrix['total'].mean(), line_dash="dot", annotation_text="Média Volume")
+                        fig_scatter.add_vline(x=city_matrix['idade_med'].mean(), line_dash="dot", annotation_text="Maturidade Média")
+                        fig_scatter.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=600)
+                        return fig_scatter
+                    st.plotly_chart(cached_figure("scatter", filter_key(__file__, nicho_selecionado, versao), _fig_scatter), use_container_width=True)
+                else:
+                    st.info("Municípios insuficientes no filtro.")
 
-        elif sel_cidade != "Todas":
-            st.markdown(f"### 🧬 Benchmarking Dinâmico: {sel_cidade}")
-            
-            df_state_baseline = df[df['uf_norm'] == sel_uf]
-            city_matrix_full = df_state_baseline.groupby('municipio_visual').agg(
-                total=('cnpj_completo', 'count'),
-                key_accounts=('is_key_account', 'sum'),
-                ticket=('capital_social', 'median')
-            ).reset_index()
-            
-            sel_stats = city_matrix_full[city_matrix_full['municipio_visual'] == sel_cidade]
+            elif sel_cidade != "Todas":
+                st.markdown(f"### 🧬 Benchmarking Dinâmico: {sel_cidade}")
             
-            if not sel_stats.empty:
-                val_total = sel_stats['total'].values[0]
-                val_ka = sel_stats['key_accounts'].values[0]
+                peer_cluster = peer_cities(df[df['uf_norm'] == sel_uf], sel_cidade)
+                if not peer_cluster.empty:
+                    peer_cluster['Classificação'] = peer_cluster['municipio_visual'].apply(lambda x: 'Alvo Principal' if x == sel_cidade else 'Comparativo Regional')
                 
-                city_matrix_full['dist_euclidiana'] = np.sqrt(((city_matrix_full['total'] - val_total) ** 2) + (((city_matrix_full['key_accounts'] - val_ka) * 5) ** 2))
-                peer_cluster = city_matrix_full.sort_values('dist_euclidiana').head(6).copy()
-                peer_cluster['Classificação'] = peer_cluster['municipio_visual'].apply(lambda x: 'Alvo Principal' if x == sel_cidade else 'Comparativo Regional')
-                
-                fig_peers = px.scatter(
-                    peer_cluster, x='total', y='key_accounts', size='ticket', color='Classificação',
-                    hover_name='municipio_visual', size_max=45, text='municipio_visual',
-                    labels={'total': 'Volume Total', 'key_accounts': 'Qtd. Tubarões', 'ticket': 'Capital Mediano'},
-                    color_discrete_map={'Alvo Principal': cfg['theme_color'], 'Comparativo Regional': '#95A5A6'}
-                )
-                fig_peers.update_traces(textposition='top center', textfont=dict(size=14, color='white'))
-                fig_peers.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=500)
-                st.plotly_chart(fig_peers, use_container_width=True)
+                    def _fig_peers():
+                        fig_peers = px.scatter(
+                            peer_cluster, x='total', y='key_accounts', size='ticket', color='Classificação',
+                            hover_name='municipio_visual', size_max=45, text='municipio_visual',
+                            labels={'total': 'Volume Total', 'key_accounts': 'Qtd. Tubarões', 'ticket': 'Capital Mediano'},
+                            color_discrete_map={'Alvo Principal': cfg['theme_color'], 'Comparativo Regional': '#95A5A6'}
+                        )
+                        fig_peers.update_traces(textposition='top center', textfont=dict(size=14, color='white'))
+                        fig_peers.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=500)
+                        return fig_peers
+                    st.plotly_chart(cached_figure("peers", filter_key(__file__, nicho_selecionado, versao), _fig_peers), use_container_width=True)
 
     # ================= ABA 2 =================
     with tab2:
-        st.markdown("### 🏘️ Micro-Targeting de Bairros")
-        if sel_cidade != "Todas":
-            bairros_data = df_filtered[df_filtered['bairro_norm'] != 'nao_informado']
-            top_bairros = bairros_data['bairro_norm'].value_counts().head(15).index.tolist()
-            bairros_top = bairros_data[bairros_data['bairro_norm'].isin(top_bairros)]
+        if tab2.open:
+            st.markdown("### 🏘️ Micro-Targeting de Bairros")
+            if sel_cidade != "Todas":
+                bairros_data = df_filtered[df_filtered['bairro_norm'] != 'nao_informado']
+                top_bairros = bairros_data['bairro_norm'].value_counts().head(15).index.tolist()
+                bairros_top = bairros_data[bairros_data['bairro_norm'].isin(top_bairros)]
             
-            if not bairros_top.empty:
-                bairros_tier = bairros_top.groupby(['bairro_norm', 'Segmento_Alvo']).size().reset_index(name='count')
+                if not bairros_top.empty:
+                    bairros_tier = bairros_top.groupby(['bairro_norm', 'Segmento_Alvo']).size().reset_index(name='count')
                 
-                fig_bairros = px.bar(
-                    bairros_tier, x='count', y='bairro_norm', color='Segmento_Alvo',
-                    orientation='h', color_discrete_map=cfg['color_map'],
-                    labels={'count': 'Quantidade', 'bairro_norm': 'Bairro', 'Segmento_Alvo': 'Segmento'},
-                    category_orders={"bairro_norm": top_bairros}
-                )
-                fig_bairros.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=600)
-                st.plotly_chart(fig_bairros, use_container_width=True)
+                    def _fig_bairros():
+                        fig_bairros = px.bar(
+                            bairros_tier, x='count', y='bairro_norm', color='Segmento_Alvo',
+                            orientation='h', color_discrete_map=cfg['color_map'],
+                            labels={'count': 'Quantidade', 'bairro_norm': 'Bairro', 'Segmento_Alvo': 'Segmento'},
+                            category_orders={"bairro_norm": top_bairros}
+                        )
+                        fig_bairros.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=600)
+                        return fig_bairros
+                    st.plotly_chart(cached_figure("bairros", filter_key(__file__, nicho_selecionado, versao), _fig_bairros), use_container_width=True)
+                else:
+                    st.info("Resolução geográfica de bairros insuficiente para esta cidade.")
             else:
-                st.info("Resolução geográfica de bairros insuficiente para esta cidade.")
-        else:
-            st.warning("⚠️ Selecione uma cidade específica no menu lateral para visualizar a densidade dos bairros.")
+                st.warning("⚠️ Selecione uma cidade específica no menu lateral para visualizar a densidade dos bairros.")
 
     # ================= ABA 3 =================
     with tab3:
-        c1, c2 = st.columns(2)
-        with c1:
-            st.markdown("### 🍩 Estrutura do Mercado")
-            df_tier = df_filtered['Segmento_Alvo'].value_counts().reset_index()
-            df_tier.columns = ['Segmento_Alvo', 'count']
+        if tab3.open:
+            c1, c2 = st.columns(2)
+            with c1:
+                st.markdown("### 🍩 Estrutura do Mercado")
+                df_tier = df_filtered['Segmento_Alvo'].value_counts().reset_index()
+                df_tier.columns = ['Segmento_Alvo', 'count']
             
-            fig_donut = px.pie(
-                df_tier, values='count', names='Segmento_Alvo', hole=0.5,
-                color='Segmento_Alvo', color_discrete_map=cfg['color_map']
-            )
-            fig_donut.update_traces(textposition='inside', textinfo='percent+label')
-            fig_donut.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", showlegend=False)
-            st.plotly_chart(fig_donut, use_container_width=True)
+                def _fig_donut():
+                    fig_donut = px.pie(
+                        df_tier, values='count', names='Segmento_Alvo', hole=0.5,
+                        color='Segmento_Alvo', color_discrete_map=cfg['color_map']
+                    )
+                    fig_donut.update_traces(textposition='inside', textinfo='percent+label')
+                    fig_donut.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", showlegend=False)
+                    return fig_donut
+                st.plotly_chart(cached_figure("donut", filter_key(__file__, nicho_selecionado, versao), _fig_donut), use_container_width=True)
 
-        with c2:
-            st.markdown("### ⏳ Curva de Sobrevivência")
-            data_plot = df_filtered[df_filtered['idade_empresa_anos'] <= 50]
-            if not data_plot.empty:
-                fig_hist, ax = plt.subplots(figsize=(8, 5))
-                fig_hist.patch.set_facecolor('#1E1E1E')
-                ax.set_facecolor('#1E1E1E')
-                
-                sns.histplot(data=data_plot, x='idade_empresa_anos', bins=30, kde=True, color=cfg['theme_color'], ax=ax)
-                ax.axvline(5, color='orange', linestyle='--', linewidth=2, label="Recentes (<5 anos)")
-                ax.axvline(20, color='green', linestyle='--', linewidth=2, label="Tradicionais (>20 anos)")
-                
-                ax.tick_params(colors='white')
-                ax.set_xlabel("Tempo de Atividade (Anos)", color='white')
-                ax.set_ylabel("Qtd. de Empresas", color='white')
-                ax.legend()
-                st.pyplot(fig_hist)
-            else:
-                st.info("Dispersão temporal insuficiente.")
+            with c2:
+                st.markdown("### ⏳ Curva de Sobrevivência")
+                png_hist = age_histogram_png(
+                    df_filtered['idade_empresa_anos'], limite=50, bins=30,
+                    estilo={
+                        'fundo': '#1E1E1E', 'cor_texto': 'white', 'cor': cfg['theme_color'],
+                        'xlabel': "Tempo de Atividade (Anos)", 'ylabel': "Qtd. de Empresas",
+                        'linhas': [(5, 'orange', "Recentes (<5 anos)"), (20, 'green', "Tradicionais (>20 anos)")],
+                    },
+                )
+                if png_hist is not None:
+                    st.image(png_hist, use_container_width=True)
+                else:
+                    st.info("Dispersão temporal insuficiente.")
 
     # ================= ABA 4 =================
     with tab4:
-        st.markdown("### 🎯 Contas Estratégicas (Agrupadas por Matriz)")
+        if tab4.open:
+            st.markdown("### 🎯 Contas Estratégicas (Agrupadas por Matriz)")
         
-        def safe_format_phone(row):
-            ddd = str(row.get('ddd_1', '')).replace('.0', '').replace('nan', '').strip()
-            tel = str(row.get('telefone_1', '')).replace('.0', '').replace('nan', '').strip()
-            if ddd and tel:
-                digits = re.sub(r'\D', '', tel)
-                if len(digits) == 8: return f"({ddd}) {digits[:4]}-{digits[4:]}"
-                elif len(digits) == 9: return f"({ddd}) {digits[:5]}-{digits[5:]}"
-                return f"({ddd}) {tel}"
-            elif tel: return tel
-            return "-"
-
-        df_leads = df_filtered.copy()
-        df_leads['Contato'] = df_leads.apply(safe_format_phone, axis=1)
-        df_leads['Email'] = df_leads.get('email_contato', pd.Series(["-"]*len(df_leads))).astype(str).str.lower().replace('nan', '-')
-            
-        df_leads['Empresa_Raiz'] = df_leads['razao_social']
-        df_grouped = df_leads.groupby('Empresa_Raiz').agg(
-            Qtd_Unidades=('Empresa_Raiz', 'count'),
-            Segmento=('Segmento_Alvo', 'first'),
-            Capital_Social=('capital_social', 'first'),
-            Cidade_Principal=('municipio_visual', 'first'),
-            Contato=('Contato', 'first'),
-            Email=('Email', 'first')
-        ).reset_index().sort_values('Capital_Social', ascending=False)
+            df_grouped = golden_leads(df_filtered, root_summary(df), top=100)
         
-        st.dataframe(df_grouped.head(100), use_container_width=True)
+            st.dataframe(with_contacts(df_grouped), use_container_width=True)
         
-        st.markdown("---")
-        st.markdown("### 🏢 Explorador de Unidades")
-        with st.expander("👉 Clique aqui para detalhar as filiais de uma rede ou corretora específica"):
-            selected_rede = st.selectbox("Selecione a Empresa:", df_grouped['Empresa_Raiz'].head(100).tolist())
-            if selected_rede:
-                filiais = df_leads[df_leads['Empresa_Raiz'] == selected_rede]
-                cols_filiais = ['razao_social', 'cnpj_completo', 'municipio_visual', 'bairro_norm', 'Contato', 'Email']
-                cols_avail = [c for c in cols_filiais if c in filiais.columns]
-                st.dataframe(filiais[cols_avail], use_container_width=True)
+            # Só as unidades das 100 empresas listadas seguem para o fragmento do explorador
+            empresas_top = dict(zip(df_grouped[CNPJ_RAIZ], df_grouped['Empresa_Raiz']))
+            df_unidades = df_filtered[df_filtered[CNPJ_RAIZ].isin(list(empresas_top))]
         
-        st.markdown("---")
-        st.markdown("### 📥 Output Executivo")
-        c_dl1, c_dl2 = st.columns(2)
+            st.markdown("---")
+            render_explorador_unidades(df_unidades, empresas_top)
         
-        with c_dl1:
-            st.download_button(
-                f"💾 Exportar Base {nicho_selecionado} (CSV)", 
-                df_filtered.to_csv(index=False).encode('utf-8-sig'), 
-                f"leads_{nicho_selecionado.lower().replace(' ', '_')}_{sel_uf}.csv", 
-                "text/csv", use_container_width=True
-            )
-            
-        with c_dl2:
-            if sel_cidade != "Todas":
-                try:
-                    pdf_bytes = generate_pdf(df_filtered, sel_cidade, sel_uf, cfg)
-                    st.download_button(
-                        "📄 Emissão de Dossiê Local (PDF)", 
-                        data=pdf_bytes, file_name=f"dossie_{sel_cidade}.pdf", 
-                        mime="application/pdf", use_container_width=True
-                    )
-                except Exception as e:
-                    st.error(f"Erro no PDF: {e}")
-            else:
-                st.button("🔒 Fixe uma Cidade para liberar o PDF", disabled=True, use_container_width=True)
+            st.markdown("---")
+            render_area_exportacao(df_filtered, nicho_selecionado, sel_uf, sel_cidade, cfg)
 
 # --- INICIALIZAÇÃO E NAVEGAÇÃO ---
 def main():
@@ -2,15 +2,25 @@
 import os
 import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-import matplotlib.pyplot as plt
-import seaborn as sns
 import streamlit as st
-from fpdf import FPDF
 from datetime import datetime
 import unicodedata
-import re
+from core.aggregations import golden_leads, heatmap_rows, municipio_matrix, peer_cities, root_summary, sum_tiers, tier_counts, uf_tier_counts, with_contacts
+from core.bitmaps import count_where
+from core.charts import age_histogram_png
+from core.cnae import cnae_multiselect
+from core.datasets import dataset_path, read_dataset, version_of, with_details
+from core.figures import cached_figure
+from core.filters import city_options, filter_key, slice_partial, territory_slice, uf_options
+from core.footprint import track_dataset
+from core.lazy import lazy_import
+from core.metrics import timed_export
+from core.navigation import lazy_tabs
+from core.ranking import top_k
+from core.schema import CNPJ_RAIZ, IS_MATRIZ, with_cnpj_text
+from core.tracing import cache_miss, span, trace_rerun, traced
+
+px = lazy_import("plotly.express")
 
 st.set_page_config(
     page_title="Hub B2B - Engenharia, TI & Varejo",
@@ -71,16 +81,18 @@ CONFIG_NICHOS = {
     }
 }
 # --- BLOCO 3: CARGA DE DADOS UNIFICADA ---
-@st.cache_data(ttl=3600)
+# Compartilhado entre sessões: o DataFrame não é alterado após a carga
+@st.cache_resource(ttl=3600)
 def load_data(nicho: str) -> pd.DataFrame:
+    cache_miss("load_data")
     cfg = CONFIG_NICHOS[nicho]
-    file_path = cfg["path"]
+    file_path = dataset_path(cfg["path"])
 
     if not os.path.exists(file_path):
         st.error(f"Arquivo não encontrado: {file_path}. Rode o script de ETL deste nicho primeiro.")
         st.stop()
 
-    df = pd.read_parquet(file_path)
+    df = read_dataset(file_path)
     
     # 1. Ajuste Maiúsculo para as UFs
     if 'uf_norm' in df.columns:
@@ -120,39 +132,38 @@ def load_data(nicho: str) -> pd.DataFrame:
     elif 'municipio_visual' not in df.columns and 'municipio' in df.columns:
         df['municipio_visual'] = df['municipio'].astype(str).str.title()
         
-    if 'idade_empresa_anos' not in df.columns and 'idade' in df.columns:
-        df['idade_empresa_anos'] = df['idade']
-        
     return df
 
 # --- BLOCO 4: SIDEBAR E PDF (Mantidos Padrões) ---
-def sidebar_filters(df: pd.DataFrame, cfg: dict):
+@traced()
+def sidebar_filters(df: pd.DataFrame, cfg: dict, nicho: str):
     st.sidebar.markdown("## 🧭 Navegação Tática")
-    lista_ufs = [str(x) for x in df['uf_norm'].dropna().unique().tolist()]
-    opts_uf = ["Todos"] + sorted(lista_ufs)
+    # Keys com o nicho: ao trocar de base, os filtros voltam ao padrão dela em vez de herdar seleções inválidas
+    opts_uf = ["Todos"] + uf_options(df)
     
     default_uf_idx = opts_uf.index('SP') if 'SP' in opts_uf else 0
-    sel_uf = st.sidebar.selectbox("Estado (UF)", opts_uf, index=default_uf_idx)
+    sel_uf = st.sidebar.selectbox("Estado (UF)", opts_uf, index=default_uf_idx, key=f"filtro_uf_{nicho}")
     
-    df_filtered = df.copy()
     sel_cidade = "Todas"
     
     if sel_uf != "Todos":
-        df_filtered = df_filtered[df_filtered['uf_norm'] == sel_uf]
-        lista_cidades = [str(x) for x in df_filtered['municipio_visual'].dropna().unique().tolist()]
-        opts_cidade = ["Todas"] + sorted(lista_cidades)
-        sel_cidade = st.sidebar.selectbox("Cidade", opts_cidade, index=0)
-        if sel_cidade != "Todas":
-            df_filtered = df_filtered[df_filtered['municipio_visual'] == sel_cidade]
+        opts_cidade = ["Todas"] + city_options(df, sel_uf, 'municipio_visual')
+        sel_cidade = st.sidebar.selectbox("Cidade", opts_cidade, index=0, key=f"filtro_cidade_{nicho}")
 
     opts_tier = cfg["tiers"]
-    sel_tier = st.sidebar.multiselect("Segmento Alvo (Tier)", opts_tier, default=opts_tier)
-    if sel_tier:
-        df_filtered = df_filtered[df_filtered['Segmento_Alvo'].isin(sel_tier)]
+    sel_tier = st.sidebar.multiselect("Segmento Alvo (Tier)", opts_tier, default=opts_tier, key=f"filtro_tier_{nicho}")
+    sel_cnae = cnae_multiselect(df, key=f"filtro_cnae_{nicho}")
+
+    # Mesmo recorte do apply_filters, com o território guardado na sessão como bitmap: trocar só
+    # o tier não o refaz, e só as linhas do território nos tiers marcados são materializadas
+    df_filtered = territory_slice(df, sel_uf, sel_cidade, 'municipio_visual', sel_cnae, 'Segmento_Alvo', sel_tier)
         
-    return df_filtered, sel_uf, sel_cidade
+    return df_filtered, sel_uf, sel_cidade, sel_tier
 
+@traced()
 def generate_pdf(df_city: pd.DataFrame, cidade: str, estado: str, cfg: dict):
+    from fpdf import FPDF
+
     pdf = FPDF()
     pdf.add_page()
     pdf.set_auto_page_break(auto=True, margin=15)
@@ -182,7 +193,7 @@ def generate_pdf(df_city: pd.DataFrame, cidade: str, estado: str, cfg: dict):
         pdf.cell(col_w[i], 8, fix_text(h), 1, align='C', fill=True, ln=(1 if i == 3 else 0))
     
     pdf.set_font("Arial", "", 7)
-    df_top = df_city.sort_values(by=['capital_social', 'idade_empresa_anos'], ascending=[False, False]).head(20)
+    df_top = top_k(df_city, ['capital_social', 'idade_empresa_anos'], 20)
     
     if df_top.empty:
         pdf.cell(0, 10, "Nenhum lead encontrado.", 1, align='C', ln=1)
@@ -206,6 +217,42 @@ def generate_pdf(df_city: pd.DataFrame, cidade: str, estado: str, cfg: dict):
         return bytes(pdf.output())
 
 # --- BLOCO 5: ENGINE DE TELAS E STORYTELLING CUSTOMIZADO ---
+@st.fragment
+def render_explorador_unidades(df_unidades: pd.DataFrame, grupos: dict):
+    """Drill-down de filiais (grupos: raiz do CNPJ -> nome): trocar o grupo reexecuta apenas este fragmento."""
+    st.markdown("### 🏢 Explorador de Unidades de Negócio")
+    with st.expander("👉 Expanda as filiais e contatos específicos de um grupo"):
+        selected_rede = st.selectbox("Selecione o Grupo Empresarial:", list(grupos), format_func=grupos.get)
+        if selected_rede:
+            filiais = with_cnpj_text(with_contacts(df_unidades[df_unidades[CNPJ_RAIZ] == selected_rede]))
+            cols_f = ['razao_social', 'cnpj_completo', IS_MATRIZ, 'municipio_visual', 'bairro_norm', 'Contato', 'Email']
+            st.dataframe(filiais[[c for c in cols_f if c in filiais.columns]], use_container_width=True)
+
+@st.fragment
+def render_area_exportacao(df_filtered: pd.DataFrame, nicho: str, sel_uf: str, sel_cidade: str, cfg: dict):
+    """Área de downloads: o CSV só é gerado no clique e os botões não disparam rerun do painel."""
+    st.markdown("### 📥 Motor de Relatórios Executivos")
+    c_dl1, c_dl2 = st.columns(2)
+    with c_dl1:
+        st.download_button(
+            f"💾 Exportar Base Tratada {nicho} (CSV)", 
+            lambda: timed_export("csv", lambda: with_cnpj_text(with_details(df_filtered)).to_csv(index=False).encode('utf-8-sig'), painel="app7", nicho=nicho), 
+            f"leads_{nicho.lower()}_{sel_uf}.csv", "text/csv", on_click="ignore", use_container_width=True
+        )
+    with c_dl2:
+        if sel_cidade != "Todas":
+            try:
+                pdf_bytes = generate_pdf(df_filtered, sel_cidade, sel_uf, cfg)
+                st.download_button(
+                    "📄 Emitir Dossiê B2B Local (PDF)", 
+                    data=pdf_bytes, file_name=f"dossie_{nicho.lower()}_{sel_cidade}.pdf", 
+                    mime="application/pdf", on_click="ignore", use_container_width=True
+                )
+            except Exception as e:
+                st.error(f"Erro no PDF: {e}")
+        else:
+            st.button("🔒 Fixe uma Cidade para liberar a impressão do Dossiê", disabled=True, use_container_width=True)
+
 def render_landing_page():
     st.markdown("<h1 style='text-align: center; color: #2f4b7c;'>🏢 Hub B2B: Módulo Corporativo</h1>", unsafe_allow_html=True)
     st.markdown("<p style='text-align: center; font-size: 18px; color: #666;'>Modelos de inteligência aplicados aos setores de Engenharia, Educação, Tecnologia e Varejo.</p>", unsafe_allow_html=True)
@@ -218,10 +265,15 @@ def render_landing_page():
         st.success(f"**{CONFIG_NICHOS['Educação & Ensino']['icon']} Educação & Ensino**\n\n{CONFIG_NICHOS['Educação & Ensino']['desc']}")
         st.error(f"**{CONFIG_NICHOS['Varejo Nacional']['icon']} Varejo**\n\n{CONFIG_NICHOS['Varejo Nacional']['desc']}")
 
+@trace_rerun
 def render_dashboard(nicho):
     cfg = CONFIG_NICHOS[nicho]
-    df = load_data(nicho)
-    df_filtered, sel_uf, sel_cidade = sidebar_filters(df, cfg)
+    with span("load_data", cache="load_data") as etapa:
+        df = load_data(nicho)
+        etapa.linhas = len(df)
+    track_dataset(f"app7: {nicho}", df)
+    versao = version_of(df)
+    df_filtered, sel_uf, sel_cidade, sel_tier = sidebar_filters(df, cfg, nicho)
     
     st.markdown(f"<h1 style='text-align: center; color: {cfg['theme_color']};'>{cfg['icon']} {cfg['title']}</h1>", unsafe_allow_html=True)
     st.markdown(f"""
@@ -237,13 +289,15 @@ def render_dashboard(nicho):
     # --- KPIs CUSTOMIZADOS POR NICHO ---
     total = len(df_filtered)
     mediana_cap = df_filtered['capital_social'].median()
-    sharks = df_filtered['is_key_account'].sum()
+    # Key accounts por tier do território (da sessão): trocar só o tier re-soma, sem varrer linhas
+    por_tier = slice_partial(df_filtered, "kpis", lambda r: tier_counts(r, 'Segmento_Alvo', ['is_key_account']))
+    sharks = int(sum_tiers(por_tier, sel_tier)['is_key_account'])
     
     col1, col2, col3, col4 = st.columns(4)
     kpi_style = f"<div style='background-color: #fff; padding: 15px; border-radius: 8px; border: 1px solid #e0e0e0; border-left: 5px solid {cfg['theme_color']};'><p style='color: #888; font-size: 13px; margin:0;'>{{}}</p><h3 style='color: #2c3e50; font-size: 22px; margin:0;'>{{}}</h3></div>"
     
     if nicho == "Construção Civil":
-        alto_risco = df_filtered[df_filtered.get('risco_operacional', pd.Series([''])).str.contains('Alto Risco', na=False)].shape[0] if 'risco_operacional' in df_filtered.columns else 0
+        alto_risco = df_filtered[df_filtered.get('risco_operacional', pd.Series([''])).str.contains('Alto Risco', na=False, regex=False)].shape[0] if 'risco_operacional' in df_filtered.columns else 0
         perc_risco = (alto_risco / total * 100) if total > 0 else 0
         col1.markdown(kpi_style.format("CNPJs Mapeados (Obras)", f"{total:,}"), unsafe_allow_html=True)
         col2.markdown(kpi_style.format("Grandes Incorporadoras", f"{sharks:,}"), unsafe_allow_html=True)
@@ -251,7 +305,7 @@ def render_dashboard(nicho):
         col4.markdown(kpi_style.format("Canteiro Pesado (Alto Risco)", f"{perc_risco:.1f}%"), unsafe_allow_html=True)
         
     elif nicho == "Educação & Ensino":
-        ouro = df_filtered[df_filtered.get('qualidade_contato', '') == 'Ouro (Tel+Email)'].shape[0] if 'qualidade_contato' in df_filtered.columns else 0
+        ouro = count_where(df_filtered, df, 'qualidade_contato', 'Ouro (Tel+Email)')
         perc_ouro = (ouro / total * 100) if total > 0 else 0
         col1.markdown(kpi_style.format("Total de Instituições", f"{total:,}"), unsafe_allow_html=True)
         col2.markdown(kpi_style.format("Contas 'High Ticket'", f"{sharks:,}"), unsafe_allow_html=True)
@@ -275,7 +329,7 @@ def render_dashboard(nicho):
     st.markdown("---")
     st.info("💡 **Dica de Navegação:** Você pode **dar zoom** clicando e arrastando o mouse sobre a área desejada nos gráficos. Duplo clique para resetar.")
     
-    tab1, tab2, tab3, tab4 = st.tabs([
+    tab1, tab2, tab3, tab4 = lazy_tabs([
         "🌍 Matriz Geográfica e Expansão", 
         "🏙️ Vocação Geográfica (Bairros)", 
         "📊 Curva de Risco e Perfil", 
@@ -284,263 +338,210 @@ def render_dashboard(nicho):
 
     # ================= ABA 1: GEO E MATRIZ =================
     with tab1:
-        if sel_uf == "Todos" and sel_cidade == "Todas":
-            if nicho == "Construção Civil":
-                st.markdown("### 🗺️ Onde estão as Grandes Obras? (Expansão Nacional)")
-                st.markdown("Volume não é sinônimo de valor na construção. O gráfico destaca os estados com a maior densidade de **Incorporadoras e Infraestrutura Pesada** (Cor Escura). Foco nestas regiões para Seguro Garantia e Saúde Ocupacional (SST).")
-            elif nicho == "Educação & Ensino":
-                st.markdown("### 🗺️ Onde estão as 'Baleias' da Educação?")
-                st.markdown("Embora SP lidere em volume de escolas de bairro, observe pela cor do gráfico estados com densidade desproporcional de **Grandes Contas (High Ticket)**, ideais para venda de Seguro Saúde com Reembolso.")
-            elif nicho == "Setor de TI (Tecnologia)":
-                st.markdown("### 🗺️ Estratégia de Expansão Nacional (TI)")
-                st.markdown("Identificamos estados que combinam alto volume de empresas de tecnologia com uma maturidade elevada (menos risco de churn financeiro).")
-            else:
-                st.markdown("### 🔥 Densidade Nacional (Mass Market)")
+        if tab1.open:
+            if sel_uf == "Todos" and sel_cidade == "Todas":
+                if nicho == "Construção Civil":
+                    st.markdown("### 🗺️ Onde estão as Grandes Obras? (Expansão Nacional)")
+                    st.markdown("Volume não é sinônimo de valor na construção. O gráfico destaca os estados com a maior densidade de **Incorporadoras e Infraestrutura Pesada** (Cor Escura). Foco nestas regiões para Seguro Garantia e Saúde Ocupacional (SST).")
+                elif nicho == "Educação & Ensino":
+                    st.markdown("### 🗺️ Onde estão as 'Baleias' da Educação?")
+                    st.markdown("Embora SP lidere em volume de escolas de bairro, observe pela cor do gráfico estados com densidade desproporcional de **Grandes Contas (High Ticket)**, ideais para venda de Seguro Saúde com Reembolso.")
+                elif nicho == "Setor de TI (Tecnologia)":
+                    st.markdown("### 🗺️ Estratégia de Expansão Nacional (TI)")
+                    st.markdown("Identificamos estados que combinam alto volume de empresas de tecnologia com uma maturidade elevada (menos risco de churn financeiro).")
+                else:
+                    st.markdown("### 🔥 Densidade Nacional (Mass Market)")
             
-            df_heat = df_filtered.groupby(['uf_norm', 'Segmento_Alvo']).size().unstack(fill_value=0)
-            cols_avail = [c for c in cfg['tiers'] if c in df_heat.columns]
-            df_heat = df_heat[cols_avail]
-            df_heat['Total_Volume'] = df_heat.sum(axis=1)
-            df_heat = df_heat.sort_values('Total_Volume', ascending=True).tail(15).drop(columns=['Total_Volume'])
+                contagem = slice_partial(df_filtered, "heatmap", lambda r: uf_tier_counts(r, 'Segmento_Alvo'))
+                df_heat = heatmap_rows(contagem, cfg['tiers'], 15, sel_tier)
             
-            fig_heat = px.imshow(
-                df_heat, labels=dict(x="Tier", y="Estado (UF)", color="Qtd"), x=df_heat.columns, y=df_heat.index,
-                text_auto=True, color_continuous_scale=cfg['heatmap_scale'], aspect="auto"
-            )
-            fig_heat.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=500)
-            st.plotly_chart(fig_heat, use_container_width=True)
-
-        elif sel_uf != "Todos" and sel_cidade == "Todas":
-            st.markdown(f"### 📍 Batalha de Hubs Regionais: {sel_uf}")
-            if nicho == "Construção Civil":
-                st.markdown("Comparativo entre Sedes Corporativas e o Interior. Cidades no quadrante superior direito concentram alto poder econômico (Baleias da Engenharia).")
-            elif nicho == "Educação & Ensino":
-                st.markdown("Buscamos Cidades-Oásis: Cidades altas no eixo (High Ticket) mas moderadas em volume representam oceanos azuis com menor concorrência.")
-            elif nicho == "Setor de TI (Tecnologia)":
-                st.markdown("Buscamos o quadrante Superior Direito: Cidades com Alto Volume de prospecção e empresas de TI mais velhas (menor risco de quebrar).")
+                def _fig_heat():
+                    fig_heat = px.imshow(
+                        df_heat, labels=dict(x="Tier", y="Estado (UF)", color="Qtd"), x=df_heat.columns, y=df_heat.index,
+                        text_auto=True, color_continuous_scale=cfg['heatmap_scale'], aspect="auto"
+                    )
+                    fig_heat.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=500)
+                    return fig_heat
+                st.plotly_chart(cached_figure("heat", filter_key(__file__, nicho, versao), _fig_heat), use_container_width=True)
+
+            elif sel_uf != "Todos" and sel_cidade == "Todas":
+                st.markdown(f"### 📍 Batalha de Hubs Regionais: {sel_uf}")
+                if nicho == "Construção Civil":
+                    st.markdown("Comparativo entre Sedes Corporativas e o Interior. Cidades no quadrante superior direito concentram alto poder econômico (Baleias da Engenharia).")
+                elif nicho == "Educação & Ensino":
+                    st.markdown("Buscamos Cidades-Oásis: Cidades altas no eixo (High Ticket) mas moderadas em volume representam oceanos azuis com menor concorrência.")
+                elif nicho == "Setor de TI (Tecnologia)":
+                    st.markdown("Buscamos o quadrante Superior Direito: Cidades com Alto Volume de prospecção e empresas de TI mais velhas (menor risco de quebrar).")
                 
-            city_matrix = df_filtered.groupby('municipio_visual').agg(
-                total=('cnpj_completo', 'count'),
-                idade_med=('idade_empresa_anos', 'mean'),
-                key_accounts=('is_key_account', 'sum')
-            ).reset_index().sort_values('total', ascending=False).head(20)
+                city_matrix = municipio_matrix(df_filtered)
             
-            if not city_matrix.empty:
-                fig_scatter = px.scatter(
-                    city_matrix, x='idade_med' if nicho != "Educação & Ensino" else 'total', 
-                    y='total' if nicho != "Educação & Ensino" else 'key_accounts', 
-                    size='key_accounts' if nicho != "Educação & Ensino" else 'key_accounts', 
-                    color='key_accounts' if nicho != "Construção Civil" else 'idade_med', 
-                    hover_name='municipio_visual', size_max=45, text='municipio_visual',
-                    color_continuous_scale=cfg['heatmap_scale']
-                )
-                fig_scatter.update_traces(textposition='top center', textfont=dict(color='white', size=14))
-                fig_scatter.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=600)
-                st.plotly_chart(fig_scatter, use_container_width=True)
+                if not city_matrix.empty:
+                    def _fig_scatter():
+                        fig_scatter = px.scatter(
+                            city_matrix, x='idade_med' if nicho != "Educação & Ensino" else 'total', 
+                            y='total' if nicho != "Educação & Ensino" else 'key_accounts', 
+                            size='key_accounts' if nicho != "Educação & Ensino" else 'key_accounts', 
+                            color='key_accounts' if nicho != "Construção Civil" else 'idade_med', 
+                            hover_name='municipio_visual', size_max=45, text='municipio_visual',
+                            color_continuous_scale=cfg['heatmap_scale']
+                        )
+                        fig_scatter.update_traces(textposition='top center', textfont=dict(color='white', size=14))
+                        fig_scatter.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=600)
+                        return fig_scatter
+                    st.plotly_chart(cached_figure("scatter", filter_key(__file__, nicho, versao), _fig_scatter), use_container_width=True)
 
-        elif sel_cidade != "Todas":
-            st.markdown(f"### 🧬 Cidades Gêmeas (KNN Clustering): {sel_cidade}")
-            st.markdown(f"Encontramos cidades em {sel_uf} com proporção mercadológica semelhante ao seu alvo para clonagem de estratégias.")
-            
-            df_state_baseline = df[df['uf_norm'] == sel_uf]
-            city_matrix_full = df_state_baseline.groupby('municipio_visual').agg(
-                total=('cnpj_completo', 'count'),
-                key_accounts=('is_key_account', 'sum'),
-                ticket=('capital_social', 'median')
-            ).reset_index()
+            elif sel_cidade != "Todas":
+                st.markdown(f"### 🧬 Cidades Gêmeas (KNN Clustering): {sel_cidade}")
+                st.markdown(f"Encontramos cidades em {sel_uf} com proporção mercadológica semelhante ao seu alvo para clonagem de estratégias.")
             
-            sel_stats = city_matrix_full[city_matrix_full['municipio_visual'] == sel_cidade]
-            if not sel_stats.empty:
-                val_t, val_ka = sel_stats['total'].values[0], sel_stats['key_accounts'].values[0]
-                m_t, m_ka = city_matrix_full['total'].max() or 1, city_matrix_full['key_accounts'].max() or 1
+                peer_cluster = peer_cities(df[df['uf_norm'] == sel_uf], sel_cidade, normalizado=True)
+                if not peer_cluster.empty:
+                    peer_cluster['Classificação'] = peer_cluster['municipio_visual'].apply(lambda x: 'Alvo Principal' if x == sel_cidade else 'Clone Regional')
                 
-                city_matrix_full['dist'] = np.sqrt((((city_matrix_full['total'] - val_t)/m_t)**2) + (((city_matrix_full['key_accounts'] - val_ka)/m_ka)**2))
-                peer_cluster = city_matrix_full.sort_values('dist').head(6).copy()
-                peer_cluster['Classificação'] = peer_cluster['municipio_visual'].apply(lambda x: 'Alvo Principal' if x == sel_cidade else 'Clone Regional')
-                
-                fig_peers = px.scatter(
-                    peer_cluster, x='total', y='key_accounts', size='total', color='Classificação',
-                    hover_name='municipio_visual', size_max=45, text='municipio_visual',
-                    color_discrete_map={'Alvo Principal': cfg['theme_color'], 'Clone Regional': '#95A5A6'}
-                )
-                fig_peers.update_traces(textposition='top center', textfont=dict(color='white', size=14))
-                fig_peers.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=500)
-                st.plotly_chart(fig_peers, use_container_width=True)
+                    def _fig_peers():
+                        fig_peers = px.scatter(
+                            peer_cluster, x='total', y='key_accounts', size='total', color='Classificação',
+                            hover_name='municipio_visual', size_max=45, text='municipio_visual',
+                            color_discrete_map={'Alvo Principal': cfg['theme_color'], 'Clone Regional': '#95A5A6'}
+                        )
+                        fig_peers.update_traces(textposition='top center', textfont=dict(color='white', size=14))
+                        fig_peers.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=500)
+                        return fig_peers
+                    st.plotly_chart(cached_figure("peers", filter_key(__file__, nicho, versao), _fig_peers), use_container_width=True)
 
     # ================= ABA 2: BAIRROS (CORRIGIDA) =================
     with tab2:
-        if nicho == "Construção Civil":
-            st.markdown("### 🏘️ Sedes vs Canteiros de Obras")
-            st.markdown("Bairros com alta concentração de 'Instalações' indicam bases operacionais (Seguro Acidentes). Áreas de 'Construtora' indicam sedes financeiras (Seguro Vida/Garantia).")
-            col_agg = "segmento_construcao"
-        elif nicho == "Educação & Ensino":
-            st.markdown("### 🏘️ Raio-X dos Bairros: Dominância de Nicho")
-            st.markdown("Vila Mariana pode concentrar Ensino Infantil (foco em pediatria), enquanto áreas centrais concentram Faculdades (foco em alunos/professores). Setorize a venda.")
-            col_agg = "segmento_educacional"
-        else:
-            st.markdown("### 🏘️ Prospecção de Precisão: Top Bairros")
-            st.markdown("Direcione campanhas de marketing digital ou equipes de rua estritamente para os hotspots abaixo.")
-            col_agg = "Segmento_Alvo"
+        if tab2.open:
+            if nicho == "Construção Civil":
+                st.markdown("### 🏘️ Sedes vs Canteiros de Obras")
+                st.markdown("Bairros com alta concentração de 'Instalações' indicam bases operacionais (Seguro Acidentes). Áreas de 'Construtora' indicam sedes financeiras (Seguro Vida/Garantia).")
+                col_agg = "segmento_construcao"
+            elif nicho == "Educação & Ensino":
+                st.markdown("### 🏘️ Raio-X dos Bairros: Dominância de Nicho")
+                st.markdown("Vila Mariana pode concentrar Ensino Infantil (foco em pediatria), enquanto áreas centrais concentram Faculdades (foco em alunos/professores). Setorize a venda.")
+                col_agg = "segmento_educacional"
+            else:
+                st.markdown("### 🏘️ Prospecção de Precisão: Top Bairros")
+                st.markdown("Direcione campanhas de marketing digital ou equipes de rua estritamente para os hotspots abaixo.")
+                col_agg = "Segmento_Alvo"
 
-        if sel_cidade != "Todas":
-            bairros_data = df_filtered[df_filtered['bairro_norm'] != 'nao_informado'].copy()
-            col_uso = col_agg if col_agg in bairros_data.columns else 'Segmento_Alvo'
+            if sel_cidade != "Todas":
+                bairros_data = df_filtered[df_filtered['bairro_norm'] != 'nao_informado'].copy()
+                col_uso = col_agg if col_agg in bairros_data.columns else 'Segmento_Alvo'
             
-            top_bairros = bairros_data['bairro_norm'].value_counts().head(15).index.tolist()
-            bairros_top = bairros_data[bairros_data['bairro_norm'].isin(top_bairros)]
+                top_bairros = bairros_data['bairro_norm'].value_counts().head(15).index.tolist()
+                bairros_top = bairros_data[bairros_data['bairro_norm'].isin(top_bairros)]
             
-            if not bairros_top.empty:
-                bairros_tier = bairros_top.groupby(['bairro_norm', col_uso]).size().reset_index(name='count')
+                if not bairros_top.empty:
+                    bairros_tier = bairros_top.groupby(['bairro_norm', col_uso]).size().reset_index(name='count')
                 
-                # --- MODIFICAÇÕES APLICADAS AQUI ---
-                # 1. Transformar os nomes dos bairros em maiúsculo (como na imagem)
-                bairros_tier['bairro_norm'] = bairros_tier['bairro_norm'].str.upper()
-                top_bairros_upper = [b.upper() for b in top_bairros]
+                    # --- MODIFICAÇÕES APLICADAS AQUI ---
+                    # 1. Transformar os nomes dos bairros em maiúsculo (como na imagem)
+                    bairros_tier['bairro_norm'] = bairros_tier['bairro_norm'].str.upper()
+                    top_bairros_upper = [b.upper() for b in top_bairros]
                 
-                fig_bairros = px.bar(
-                    bairros_tier, x='count', y='bairro_norm', color=col_uso,
-                    orientation='h', color_discrete_sequence=px.colors.qualitative.Safe,
-                    category_orders={"bairro_norm": top_bairros_upper}
-                )
+                    def _fig_bairros():
+                        fig_bairros = px.bar(
+                            bairros_tier, x='count', y='bairro_norm', color=col_uso,
+                            orientation='h', color_discrete_sequence=px.colors.qualitative.Safe,
+                            category_orders={"bairro_norm": top_bairros_upper}
+                        )
                 
-                # 2. Layout ajustado: Fundo escuro transparente e Legenda vertical à direita
-                fig_bairros.update_layout(
-                    template="plotly_dark", 
-                    paper_bgcolor="rgba(0,0,0,0)", 
-                    plot_bgcolor="rgba(0,0,0,0)",
-                    height=600, 
-                    margin=dict(l=150, t=50, r=50), # Margem 'l=150' dá espaço para os nomes dos bairros
-                    yaxis_title="Bairro",
-                    xaxis_title="Quantidade",
-                    legend=dict(
-                        orientation="v",     # Legenda na vertical
-                        yanchor="top", 
-                        y=1, 
-                        xanchor="left", 
-                        x=1.02,              # Posicionada no lado direito, fora do gráfico
-                        title="Segmento"
-                    )
-                )
-                # -----------------------------------
+                        # 2. Layout ajustado: Fundo escuro transparente e Legenda vertical à direita
+                        fig_bairros.update_layout(
+                            template="plotly_dark", 
+                            paper_bgcolor="rgba(0,0,0,0)", 
+                            plot_bgcolor="rgba(0,0,0,0)",
+                            height=600, 
+                            margin=dict(l=150, t=50, r=50), # Margem 'l=150' dá espaço para os nomes dos bairros
+                            yaxis_title="Bairro",
+                            xaxis_title="Quantidade",
+                            legend=dict(
+                                orientation="v",     # Legenda na vertical
+                                yanchor="top", 
+                                y=1, 
+                                xanchor="left", 
+                                x=1.02,              # Posicionada no lado direito, fora do gráfico
+                                title="Segmento"
+                            )
+                        )
+                        # -----------------------------------
                 
-                st.plotly_chart(fig_bairros, use_container_width=True)
+                        return fig_bairros
+                    st.plotly_chart(cached_figure("bairros", filter_key(__file__, nicho, versao), _fig_bairros), use_container_width=True)
+                else:
+                    st.info("Resolução geográfica insuficiente.")
             else:
-                st.info("Resolução geográfica insuficiente.")
-        else:
-            st.warning("⚠️ Selecione uma cidade específica para visualizar o mapeamento de bairros.")
+                st.warning("⚠️ Selecione uma cidade específica para visualizar o mapeamento de bairros.")
 
     # ================= ABA 3: PERFIL E RISCO =================
     with tab3:
-        c1, c2 = st.columns(2)
-        with c1:
-            st.markdown("### 🍩 Share de Carteira (Potencial)")
-            if nicho == "Educação & Ensino" or nicho == "Construção Civil":
-                st.markdown("As fatias mais escuras representam as 'Baleias' (High Ticket). Embora menores em volume, possuem potencial de receita superior a milhares de contratos de varejo.")
-            elif nicho == "Setor de TI (Tecnologia)":
-                st.markdown("A grande fatia dita a abordagem: Micro (Adesão Digital Automática) vs Enterprise (Venda Consultiva Presencial).")
+        if tab3.open:
+            c1, c2 = st.columns(2)
+            with c1:
+                st.markdown("### 🍩 Share de Carteira (Potencial)")
+                if nicho == "Educação & Ensino" or nicho == "Construção Civil":
+                    st.markdown("As fatias mais escuras representam as 'Baleias' (High Ticket). Embora menores em volume, possuem potencial de receita superior a milhares de contratos de varejo.")
+                elif nicho == "Setor de TI (Tecnologia)":
+                    st.markdown("A grande fatia dita a abordagem: Micro (Adesão Digital Automática) vs Enterprise (Venda Consultiva Presencial).")
                 
-            df_tier = df_filtered['Segmento_Alvo'].value_counts().reset_index()
-            df_tier.columns = ['Segmento_Alvo', 'count']
+                df_tier = df_filtered['Segmento_Alvo'].value_counts().reset_index()
+                df_tier.columns = ['Segmento_Alvo', 'count']
             
-            fig_donut = px.pie(df_tier, values='count', names='Segmento_Alvo', hole=0.5, color='Segmento_Alvo', color_discrete_map=cfg['color_map'])
-            fig_donut.update_traces(textposition='inside', textinfo='percent+label')
-            fig_donut.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", showlegend=False)
-            st.plotly_chart(fig_donut, use_container_width=True)
-
-        with c2:
-            st.markdown("### ⏳ Curva de Mortalidade e Retenção")
-            data_plot = df_filtered[df_filtered['idade_empresa_anos'] <= 50]
-            if not data_plot.empty:
-                fig_hist, ax = plt.subplots(figsize=(8, 5))
-                fig_hist.patch.set_facecolor('#1E1E1E')
-                ax.set_facecolor('#1E1E1E')
-                
-                sns.histplot(data=data_plot, x='idade_empresa_anos', bins=30, kde=True, color=cfg['theme_color'], ax=ax)
-                
+                def _fig_donut():
+                    fig_donut = px.pie(df_tier, values='count', names='Segmento_Alvo', hole=0.5, color='Segmento_Alvo', color_discrete_map=cfg['color_map'])
+                    fig_donut.update_traces(textposition='inside', textinfo='percent+label')
+                    fig_donut.update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", showlegend=False)
+                    return fig_donut
+                st.plotly_chart(cached_figure("donut", filter_key(__file__, nicho, versao), _fig_donut), use_container_width=True)
+
+            with c2:
+                st.markdown("### ⏳ Curva de Mortalidade e Retenção")
                 # Regras de Negócio Customizadas para as Linhas de Risco
                 if nicho == "Construção Civil":
-                    st.markdown("O pico nos primeiros 3 anos revela as SPEs (Sociedades de Propósito Específico). Foco em **Seguro de Obra e Prazo Determinado**.")
-                    ax.axvline(3, color='red', linestyle='--', linewidth=2, label="Risco SPE (<3 anos)")
-                    ax.axvline(10, color='green', linestyle='--', linewidth=2, label="Sólido (>10 anos)")
+                    texto_risco = "O pico nos primeiros 3 anos revela as SPEs (Sociedades de Propósito Específico). Foco em **Seguro de Obra e Prazo Determinado**."
+                    linhas_risco = [(3, 'red', "Risco SPE (<3 anos)"), (10, 'green', "Sólido (>10 anos)")]
                 elif nicho == "Educação & Ensino":
-                    st.markdown("Instituições novas (<3 anos) exigem planos de **Coparticipação** devido ao turnover. Escolas >15 anos buscam **Seguro Premium** para professores antigos.")
-                    ax.axvline(3, color='red', linestyle='--', linewidth=2, label="Tração (<3 anos)")
-                    ax.axvline(15, color='green', linestyle='--', linewidth=2, label="Tradição (>15 anos)")
+                    texto_risco = "Instituições novas (<3 anos) exigem planos de **Coparticipação** devido ao turnover. Escolas >15 anos buscam **Seguro Premium** para professores antigos."
+                    linhas_risco = [(3, 'red', "Tração (<3 anos)"), (15, 'green', "Tradição (>15 anos)")]
                 else: # TI e Varejo
-                    st.markdown("Empresas na Zona Vermelha possuem alto risco de quebra/churn. Planos pré-pagos recomendados.")
-                    ax.axvline(2, color='red', linestyle='--', linewidth=2, label="Risco Crítico (<2 anos)")
-                    ax.axvline(5, color='orange', linestyle='--', linewidth=2, label="Consolidação")
-                    ax.axvline(10, color='green', linestyle='--', linewidth=2, label="Vitalícios (>10 anos)")
+                    texto_risco = "Empresas na Zona Vermelha possuem alto risco de quebra/churn. Planos pré-pagos recomendados."
+                    linhas_risco = [(2, 'red', "Risco Crítico (<2 anos)"), (5, 'orange', "Consolidação"), (10, 'green', "Vitalícios (>10 anos)")]
                 
-                ax.tick_params(colors='white')
-                ax.set_xlabel("Anos de Atividade", color='white')
-                ax.set_ylabel("Volume de Empresas", color='white')
-                sns.despine()
-                ax.legend()
-                st.pyplot(fig_hist)
+                png_hist = age_histogram_png(
+                    df_filtered['idade_empresa_anos'], limite=50, bins=30,
+                    estilo={
+                        'fundo': '#1E1E1E', 'cor_texto': 'white', 'cor': cfg['theme_color'],
+                        'xlabel': "Anos de Atividade", 'ylabel': "Volume de Empresas", 'despine': True,
+                        'linhas': linhas_risco,
+                    },
+                )
+                if png_hist is not None:
+                    st.markdown(texto_risco)
+                    st.image(png_hist, use_container_width=True)
 
     # ================= ABA 4: CRM =================
     with tab4:
-        st.markdown("### 🎯 Lista de Atacado (Golden Leads)")
-        if nicho in ["Educação & Ensino", "Construção Civil"]:
-            st.markdown("Contas priorizadas via Inteligência de Máquina: **Capital Financeiro > Acessibilidade de Contato > Maturidade**.")
-        else:
-            st.markdown("Contas priorizadas rigorosamente por **Maior Capital Social** e estabilidade corporativa na região.")
-            
-        def safe_format_phone(row):
-            ddd = str(row.get('ddd_1', '')).replace('.0', '').replace('nan', '').strip()
-            tel = str(row.get('telefone_1', '')).replace('.0', '').replace('nan', '').strip()
-            if ddd and tel:
-                digits = re.sub(r'\D', '', tel)
-                if len(digits) == 8: return f"({ddd}) {digits[:4]}-{digits[4:]}"
-                elif len(digits) == 9: return f"({ddd}) {digits[:5]}-{digits[5:]}"
-                return f"({ddd}) {tel}"
-            return tel if tel else "-"
-
-        df_leads = df_filtered.copy()
-        df_leads['Contato'] = df_leads.apply(safe_format_phone, axis=1)
-        df_leads['Email'] = df_leads.get('email_contato', pd.Series(["-"]*len(df_leads))).astype(str).str.lower().replace('nan', '-')
+        if tab4.open:
+            st.markdown("### 🎯 Lista de Atacado (Golden Leads)")
+            if nicho in ["Educação & Ensino", "Construção Civil"]:
+                st.markdown("Contas priorizadas via Inteligência de Máquina: **Capital Financeiro > Acessibilidade de Contato > Maturidade**.")
+            else:
+                st.markdown("Contas priorizadas rigorosamente por **Maior Capital Social** e estabilidade corporativa na região.")
             
-        df_leads['Empresa_Raiz'] = df_leads['razao_social']
-        df_grouped = df_leads.groupby('Empresa_Raiz').agg(
-            Qtd_Unidades=('Empresa_Raiz', 'count'), Segmento=('Segmento_Alvo', 'first'),
-            Capital_Social=('capital_social', 'first'), Cidade_Principal=('municipio_visual', 'first'),
-            Contato=('Contato', 'first'), Email=('Email', 'first')
-        ).reset_index().sort_values('Capital_Social', ascending=False)
+            df_grouped = golden_leads(df_filtered, root_summary(df), top=100)
         
-        st.dataframe(df_grouped.head(100), use_container_width=True)
+            st.dataframe(with_contacts(df_grouped), use_container_width=True)
         
-        st.markdown("---")
-        st.markdown("### 🏢 Explorador de Unidades de Negócio")
-        with st.expander("👉 Expanda as filiais e contatos específicos de um grupo"):
-            selected_rede = st.selectbox("Selecione o Grupo Empresarial:", df_grouped['Empresa_Raiz'].head(100).tolist())
-            if selected_rede:
-                filiais = df_leads[df_leads['Empresa_Raiz'] == selected_rede]
-                cols_f = ['razao_social', 'cnpj_completo', 'municipio_visual', 'bairro_norm', 'Contato', 'Email']
-                st.dataframe(filiais[[c for c in cols_f if c in filiais.columns]], use_container_width=True)
+            # Só as unidades dos 100 grupos listados seguem para o fragmento do explorador
+            grupos_top = dict(zip(df_grouped[CNPJ_RAIZ], df_grouped['Empresa_Raiz']))
+            df_unidades = df_filtered[df_filtered[CNPJ_RAIZ].isin(list(grupos_top))]
         
-        st.markdown("---")
-        st.markdown("### 📥 Motor de Relatórios Executivos")
-        c_dl1, c_dl2 = st.columns(2)
-        with c_dl1:
-            st.download_button(
-                f"💾 Exportar Base Tratada {nicho} (CSV)", 
-                df_filtered.to_csv(index=False).encode('utf-8-sig'), 
-                f"leads_{nicho.lower()}_{sel_uf}.csv", "text/csv", use_container_width=True
-            )
-        with c_dl2:
-            if sel_cidade != "Todas":
-                try:
-                    pdf_bytes = generate_pdf(df_filtered, sel_cidade, sel_uf, cfg)
-                    st.download_button(
-                        "📄 Emitir Dossiê B2B Local (PDF)", 
-                        data=pdf_bytes, file_name=f"dossie_{nicho.lower()}_{sel_cidade}.pdf", 
-                        mime="application/pdf", use_container_width=True
-                    )
-                except Exception as e:
-                    st.error(f"Erro no PDF: {e}")
-            else:
-                st.button("🔒 Fixe uma Cidade para liberar a impressão do Dossiê", disabled=True, use_container_width=True)
+            st.markdown("---")
+            render_explorador_unidades(df_unidades, grupos_top)
+        
+            st.markdown("---")
+            render_area_exportacao(df_filtered, nicho, sel_uf, sel_cidade, cfg)
 
 def main():
     st.sidebar.markdown("### 🌐 Menu Estratégico")
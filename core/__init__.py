@@ -0,0 +1 @@
+"""Componentes compartilhados entre os dashboards da Fábrica de Dashboards."""
@@ -0,0 +1,183 @@
+# --- AGREGAÇÕES DOS HUBS (PAINEL E API USAM AS MESMAS CONTAS) ---
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from core.bitmaps import filter_by_values
+from core.cnae import filter_by_cnae
+from core.datasets import ARQUIVO_ATTR, COLUNAS_ATTR, ROW_ID, version_of, with_details
+from core.ranking import top_k
+from core.schema import CNPJ_RAIZ, CONTATO_FORMATADO, EMAIL_PRINCIPAL, IS_MATRIZ, with_contact_fields
+from core.tracing import cache_miss, span, traced
+
+# Contato pronto (ETL) lido do arquivo para as linhas exibidas (core.datasets.with_details);
+# bases antigas não o têm e ele sai dos contatos crus
+CAMPOS_CONTATO = [CONTATO_FORMATADO, EMAIL_PRINCIPAL]
+COLUNAS_CONTATO = ['ddd_1', 'telefone_1', 'email_contato']
+# Atributo do golden_leads com o número de contas antes do corte `top`
+TOTAL_CONTAS_ATTR = "total_contas"
+
+
+@traced()
+def apply_filters(df: pd.DataFrame, uf: str = "Todos", cidade: str = "Todas", tiers=None, cnaes=None) -> pd.DataFrame:
+    """Recorte do território + atividade (CNAE) + segmento, igual ao da sidebar dos hubs."""
+    df_filtered = df
+    if uf != "Todos":
+        df_filtered = df_filtered[df_filtered['uf_norm'] == uf]
+        if cidade != "Todas":
+            df_filtered = df_filtered[df_filtered['municipio_visual'] == cidade]
+    if cnaes:
+        df_filtered = filter_by_cnae(df_filtered, df, cnaes)
+    if tiers:
+        df_filtered = filter_by_values(df_filtered, df, 'Segmento_Alvo', tiers)
+    return df_filtered
+
+
+@traced()
+def tier_counts(df_filtered: pd.DataFrame, coluna: str, flags: list) -> pd.DataFrame:
+    """Soma das `flags` (0/1) por valor de `coluna`, nulos inclusive: o parcial dos KPIs por tier."""
+    return df_filtered.groupby(coluna, dropna=False, observed=True, sort=False)[flags].sum()
+
+
+def sum_tiers(parciais: pd.DataFrame, selecionados) -> pd.Series:
+    """Totais de um parcial por tier nos `selecionados` (vazio: todos, como o multiselect)."""
+    if len(selecionados):
+        parciais = parciais[parciais.index.isin(list(selecionados))]
+    return parciais.sum()
+
+
+@traced()
+def uf_tier_counts(df_filtered: pd.DataFrame, coluna: str) -> pd.DataFrame:
+    """Contagem UF x `coluna` do recorte, com todos os valores (o parcial do heatmap)."""
+    return df_filtered.groupby(['uf_norm', coluna]).size().unstack(fill_value=0)
+
+
+def heatmap_rows(contagem: pd.DataFrame, tiers: list, top: int = 15, selecionados=None) -> pd.DataFrame:
+    """Os `top` estados de maior volume (ordem crescente) de uma contagem UF x tier.
+
+    Com `selecionados`, só as colunas deles e as UFs com alguma linha
+    neles: o mesmo heatmap de contar o recorte já filtrado pelo tier.
+    """
+    if selecionados is not None and len(selecionados):
+        contagem = contagem[[c for c in contagem.columns if c in selecionados]]
+        contagem = contagem[contagem.sum(axis=1) > 0]
+    df_heat = contagem[[c for c in tiers if c in contagem.columns]].copy()
+    df_heat['Total_Volume'] = df_heat.sum(axis=1)
+    return df_heat.sort_values('Total_Volume', ascending=True).tail(top).drop(columns=['Total_Volume'])
+
+
+@traced()
+def uf_heatmap(df_filtered: pd.DataFrame, tiers: list, top: int = 15) -> pd.DataFrame:
+    """Contagem UF x segmento dos `top` estados de maior volume (ordem crescente)."""
+    return heatmap_rows(uf_tier_counts(df_filtered, 'Segmento_Alvo'), tiers, top)
+
+
+@traced()
+def municipio_matrix(df_filtered: pd.DataFrame, min_total: int = 0, top: int = 20) -> pd.DataFrame:
+    """Volume, maturidade média e key accounts por município."""
+    city_matrix = df_filtered.groupby('municipio_visual').agg(
+        total=('cnpj_completo', 'count'),
+        idade_med=('idade_empresa_anos', 'mean'),
+        key_accounts=('is_key_account', 'sum')
+    ).reset_index()
+    city_matrix = city_matrix[city_matrix['total'] > min_total]
+    return city_matrix.sort_values('total', ascending=False).head(top)
+
+
+@traced()
+def peer_cities(df_estado: pd.DataFrame, cidade: str, k: int = 6, normalizado: bool = False) -> pd.DataFrame:
+    """Cidades do estado mais próximas da `cidade` em volume e key accounts.
+
+    `normalizado=False` pesa key accounts 5x sobre o volume bruto;
+    `normalizado=True` escala os dois eixos pelo máximo do estado.
+    Retorna vazio se a cidade não estiver na base do estado.
+    """
+    city_matrix_full = df_estado.groupby('municipio_visual').agg(
+        total=('cnpj_completo', 'count'),
+        key_accounts=('is_key_account', 'sum'),
+        ticket=('capital_social', 'median')
+    ).reset_index()
+
+    sel_stats = city_matrix_full[city_matrix_full['municipio_visual'] == cidade]
+    if sel_stats.empty:
+        return sel_stats
+
+    val_t, val_ka = sel_stats['total'].values[0], sel_stats['key_accounts'].values[0]
+    if normalizado:
+        m_t, m_ka = city_matrix_full['total'].max() or 1, city_matrix_full['key_accounts'].max() or 1
+        city_matrix_full['dist'] = np.sqrt((((city_matrix_full['total'] - val_t) / m_t) ** 2) + (((city_matrix_full['key_accounts'] - val_ka) / m_ka) ** 2))
+    else:
+        city_matrix_full['dist'] = np.sqrt(((city_matrix_full['total'] - val_t) ** 2) + (((city_matrix_full['key_accounts'] - val_ka) * 5) ** 2))
+    return city_matrix_full.sort_values('dist').head(k).copy()
+
+
+@traced()
+def with_contacts(df: pd.DataFrame) -> pd.DataFrame:
+    """Contato formatado e e-mail principal das linhas, buscados no arquivo só para elas."""
+    colunas_originais = list(df.columns)
+    prontos = set(CAMPOS_CONTATO) <= set(df.attrs.get(COLUNAS_ATTR) or df.columns)
+    df = with_contact_fields(with_details(df, CAMPOS_CONTATO if prontos else COLUNAS_CONTATO))
+    sem_contato = pd.Series("-", index=df.index)
+    df = df.assign(
+        Contato=df[CONTATO_FORMATADO].fillna('-') if CONTATO_FORMATADO in df.columns else sem_contato,
+        Email=df[EMAIL_PRINCIPAL].fillna('-') if EMAIL_PRINCIPAL in df.columns else sem_contato,
+    )
+    # with_details já tirou o ROW_ID; sai o que foi buscado só para o cálculo
+    return df[[c for c in colunas_originais if c in df.columns] + ['Contato', 'Email']]
+
+
+def _resumir_raizes(df: pd.DataFrame) -> pd.DataFrame:
+    # Matrizes primeiro (sort estável de um bool: O(n)); sem matriz na base, vale a primeira filial
+    sedes = df.iloc[np.argsort(~df[IS_MATRIZ].to_numpy(), kind='stable')].drop_duplicates(CNPJ_RAIZ).set_index(CNPJ_RAIZ)
+    return pd.DataFrame({
+        'Empresa_Raiz': sedes['razao_social'],
+        'Unidades_Total': df[CNPJ_RAIZ].value_counts().reindex(sedes.index),
+        'Capital_Social': sedes['capital_social'],
+        'Cidade_Principal': sedes['municipio_visual'],
+    }).sort_index()
+
+
+@st.cache_resource(ttl=3600, max_entries=16, show_spinner=False)
+def _resumo_em_cache(arquivo: str, versao: str, linhas: int, _df: pd.DataFrame) -> pd.DataFrame:
+    cache_miss("resumo_raizes")
+    return _resumir_raizes(_df)
+
+
+def root_summary(df: pd.DataFrame) -> pd.DataFrame:
+    """Uma linha por raiz de CNPJ (grupo econômico) na base inteira do nicho.
+
+    Razão social, capital e cidade vêm da matriz; `Unidades_Total` conta
+    todos os estabelecimentos da raiz. Calculado uma vez por arquivo e
+    versão: os filtros só decidem quais raízes aparecem (passe a base
+    do `load_data`, não o recorte).
+    """
+    with span("root_summary", linhas=len(df), cache="resumo_raizes"):
+        if not version_of(df):
+            return _resumir_raizes(df)
+        return _resumo_em_cache(df.attrs.get(ARQUIVO_ATTR, ""), version_of(df), len(df), df)
+
+
+@traced()
+def golden_leads(df_leads: pd.DataFrame, resumo: pd.DataFrame, top: int = None) -> pd.DataFrame:
+    """Contas agrupadas pela raiz do CNPJ, da maior para a menor em capital social.
+
+    `df_leads` é o recorte filtrado e `resumo` o `root_summary` da base
+    inteira: o agrupamento no recorte só conta unidades (chave inteira),
+    nome, capital e cidade principal vêm prontos do resumo. Com `top`, só
+    as `top` maiores, sem ordenar todas as contas; o total de contas fica
+    em `attrs[TOTAL_CONTAS_ATTR]`. Cada conta guarda o id da sua primeira
+    unidade no recorte: `with_contacts` nas linhas exibidas traz o
+    contato dela.
+    """
+    contas = df_leads.groupby(CNPJ_RAIZ).agg(
+        Qtd_Unidades=(CNPJ_RAIZ, 'size'),
+        Segmento=('Segmento_Alvo', 'first'),
+        **({ROW_ID: (ROW_ID, 'first')} if ROW_ID in df_leads.columns else {}),
+    )
+    colunas = ['Empresa_Raiz', 'Qtd_Unidades', 'Unidades_Total', 'Segmento', 'Capital_Social', 'Cidade_Principal']
+    contas = contas.join(resumo)[colunas + [c for c in contas.columns if c == ROW_ID]].reset_index()
+    total = len(contas)
+    contas = top_k(contas, 'Capital_Social', total if top is None else top)
+    contas.attrs.update(df_leads.attrs)
+    contas.attrs[TOTAL_CONTAS_ATTR] = total
+    return contas
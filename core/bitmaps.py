@@ -0,0 +1,186 @@
+# --- BITMAPS POR VALOR (MULTISELECT DE SEGMENTO/TIER E CONTAGENS DOS KPIs) ---
+# Para cada coluna de segmento/tier (poucos valores), um bitset numpy
+# empacotado por valor, um bit por linha da base (posição = ROW_ID),
+# calculado uma vez por arquivo e versão. Qualquer combinação marcada no
+# multiselect vira um OU desses bitsets, cruzado (E) com o recorte de
+# UF/cidade em palavras de 64 bits; o recorte resultante fica associado ao
+# DataFrame filtrado e os KPIs de contagem (tubarões, key accounts,
+# contatos ouro) saem da cardinalidade (popcount) do E com o bitset da
+# flag, sem percorrer linhas.
+#
+#   df_filtered = filter_by_values(df_filtered, df, 'tier_concorrente', sel_tier)
+#   sharks = count_where(df_filtered, df, 'is_shark')
+import weakref
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from core.datasets import ARQUIVO_ATTR, ROW_ID, version_of
+from core.tracing import cache_miss, span
+
+# Bitmap de cada DataFrame filtrado, por id do objeto: {id: (weakref do df, Selection)}.
+# Fica fora do `df.attrs`, que o pandas copia a cada operação e o Streamlit
+# tenta serializar em JSON a cada st.dataframe. A entrada sai junto com o df.
+_SELECOES = {}
+
+# Bits ligados em cada byte: popcount para numpy sem np.bitwise_count (< 2.0)
+_BITS_POR_BYTE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class Selection:
+    """Bitmap imutável das linhas de um recorte, sobre as `linhas` da base."""
+    __slots__ = ("bits", "linhas")
+
+    def __init__(self, bits: np.ndarray, linhas: int):
+        self.bits = bits
+        self.linhas = linhas
+
+
+def _selecao_de(df_filtered: pd.DataFrame):
+    """Selection associada a este objeto DataFrame (não às cópias dele), ou None."""
+    entrada = _SELECOES.get(id(df_filtered))
+    if entrada is None or entrada[0]() is not df_filtered:
+        return None
+    return entrada[1]
+
+
+def pack(mascara: np.ndarray) -> np.ndarray:
+    """Máscara booleana -> bitset em palavras uint64 (bit i = linha i)."""
+    empacotado = np.packbits(np.asarray(mascara, dtype=bool), bitorder='little')
+    sobra = -empacotado.size % 8
+    if sobra:
+        empacotado = np.concatenate([empacotado, np.zeros(sobra, dtype=np.uint8)])
+    return empacotado.view(np.uint64)
+
+
+def unpack(bits: np.ndarray, linhas: int) -> np.ndarray:
+    """Bitset -> máscara booleana das `linhas` da base."""
+    return np.unpackbits(bits.view(np.uint8), count=linhas, bitorder='little').view(bool)
+
+
+def cardinality(bits: np.ndarray) -> int:
+    """Quantos bits ligados (linhas no recorte)."""
+    if hasattr(np, "bitwise_count"):
+        return int(np.bitwise_count(bits).sum())
+    return int(_BITS_POR_BYTE[bits.view(np.uint8)].sum())
+
+
+def rows_bitmap(ids: np.ndarray, linhas: int) -> np.ndarray:
+    """Bitset com as posições `ids` ligadas."""
+    mascara = np.zeros(linhas, dtype=bool)
+    mascara[ids] = True
+    return pack(mascara)
+
+
+def _bitmaps_por_valor(serie: pd.Series) -> dict:
+    codigos, valores = pd.factorize(serie, sort=False)
+    return {valor: pack(codigos == i) for i, valor in enumerate(valores)}
+
+
+@st.cache_resource(ttl=3600, max_entries=64, show_spinner=False)
+def _bitmaps_em_cache(arquivo: str, versao: str, linhas: int, coluna: str, _serie: pd.Series) -> dict:
+    cache_miss("bitmaps_valor")
+    return _bitmaps_por_valor(_serie)
+
+
+def value_bitmaps(df: pd.DataFrame, coluna: str) -> dict:
+    """{valor: bitset} de `coluna` na base inteira (passe a base do `load_data`).
+
+    Calculado uma vez por arquivo e versão; nulos não entram em nenhum bitset.
+    """
+    with span("value_bitmaps", linhas=len(df), cache="bitmaps_valor"):
+        if not version_of(df):
+            return _bitmaps_por_valor(df[coluna])
+        return _bitmaps_em_cache(df.attrs.get(ARQUIVO_ATTR, ""), version_of(df), len(df), coluna, df[coluna])
+
+
+def _usa_bitmaps(df_filtered: pd.DataFrame, df: pd.DataFrame) -> bool:
+    # Posição na base = ROW_ID só na base inteira lida do arquivo (load_data)
+    return ROW_ID in df_filtered.columns and bool(version_of(df)) and ROW_ID in df.columns
+
+
+def selection_bits(df_filtered: pd.DataFrame, df: pd.DataFrame) -> np.ndarray:
+    """Bitset das linhas de `df_filtered` sobre a base `df`.
+
+    Reaproveita o associado pelo último `filter_by_values` quando ainda
+    descreve o recorte (mesma base, mesma contagem); senão marca os ROW_ID.
+    """
+    selecao = _selecao_de(df_filtered)
+    if selecao is not None and selecao.linhas == len(df) and cardinality(selecao.bits) == len(df_filtered):
+        return selecao.bits
+    if len(df_filtered) == len(df):
+        return pack(np.ones(len(df), dtype=bool))
+    return rows_bitmap(df_filtered[ROW_ID].to_numpy(), len(df))
+
+
+def filter_bits(bits: np.ndarray, df: pd.DataFrame, coluna: str, valores) -> np.ndarray:
+    """Bitset `bits` cruzado (E) com o OU dos bitsets dos `valores` de `coluna`."""
+    por_valor = value_bitmaps(df, coluna)
+    marcados = [por_valor[v] for v in valores if v in por_valor]
+    return bits & np.bitwise_or.reduce(marcados) if marcados else np.zeros_like(bits)
+
+
+def materialize(df: pd.DataFrame, bits: np.ndarray) -> pd.DataFrame:
+    """Linhas da base `df` com o bit ligado (em ordem de ROW_ID), com o bitmap associado.
+
+    Um `iloc` nas posições ligadas: quem guarda só o bitmap (a sessão)
+    refaz o recorte sem máscara nem cópia guardada por sessão.
+    """
+    if cardinality(bits) == len(df):
+        return with_selection(df.copy(deep=False), bits, len(df))
+    return with_selection(df.iloc[np.flatnonzero(unpack(bits, len(df)))], bits, len(df))
+
+
+def with_selection(df_filtered: pd.DataFrame, bits: np.ndarray, linhas: int) -> pd.DataFrame:
+    """Associa ao recorte o bitmap das linhas dele (lido por `count_where`)."""
+    chave = id(df_filtered)
+    if chave not in _SELECOES:
+        weakref.finalize(df_filtered, _SELECOES.pop, chave, None)
+    _SELECOES[chave] = (weakref.ref(df_filtered), Selection(bits, linhas))
+    return df_filtered
+
+
+def attach_selection(df_filtered: pd.DataFrame, df: pd.DataFrame) -> pd.DataFrame:
+    """Associa ao recorte o bitmap das suas linhas, para recortes reaproveitados entre reruns.
+
+    Cada `filter_by_values` sobre ele parte desse bitmap em vez de marcar
+    os ROW_ID de novo. Sem ROW_ID ou versão, o recorte volta como está.
+    """
+    if _usa_bitmaps(df_filtered, df):
+        with_selection(df_filtered, selection_bits(df_filtered, df), len(df))
+    return df_filtered
+
+
+def filter_by_values(df_filtered: pd.DataFrame, df: pd.DataFrame, coluna: str, valores) -> pd.DataFrame:
+    """Linhas do recorte com `coluna` em `valores` (o `.isin` do multiselect), por bitmaps.
+
+    O OU dos bitsets dos valores marcados é cruzado com o bitset do
+    recorte; só então a máscara volta para as linhas. Sem valores, o
+    recorte volta inteiro.
+    """
+    if not len(valores):
+        return df_filtered
+    if not _usa_bitmaps(df_filtered, df):
+        return df_filtered[df_filtered[coluna].isin(valores)]
+    with span("filtro_bitmap", linhas=len(df_filtered)):
+        bits = filter_bits(selection_bits(df_filtered, df), df, coluna, valores)
+        if cardinality(bits) == len(df_filtered):
+            # Todos os tiers do recorte marcados (o padrão da sidebar): nenhuma linha sai, nada é copiado
+            return with_selection(df_filtered.copy(deep=False), bits, len(df))
+        return materialize(df, bits)
+
+
+def count_where(df_filtered: pd.DataFrame, df: pd.DataFrame, coluna: str, valor=1) -> int:
+    """Linhas do recorte com `coluna == valor` (flags 0/1 ou um valor de categoria).
+
+    Com o bitmap do recorte associado, é o popcount do E com o bitset do
+    valor; senão, a soma da máscara sobre as linhas.
+    """
+    if coluna not in df_filtered.columns:
+        return 0
+    selecao = _selecao_de(df_filtered)
+    if selecao is not None and _usa_bitmaps(df_filtered, df) and selecao.linhas == len(df) and cardinality(selecao.bits) == len(df_filtered):
+        bits = value_bitmaps(df, coluna).get(valor)
+        return cardinality(selecao.bits & bits) if bits is not None else 0
+    return int((df_filtered[coluna] == valor).sum())
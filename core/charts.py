@@ -0,0 +1,109 @@
+# --- GRÁFICOS COMPARTILHADOS (HISTOGRAMA DE MATURIDADE) ---
+import io
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from core.tracing import cache_miss, span
+
+# Mesmos parâmetros que o st.pyplot usa ao serializar a figura
+PNG_DPI = 200
+KDE_PONTOS = 200
+
+
+def age_histogram(idades: pd.Series, limite: float, bins: int):
+    """Histograma das idades até `limite` anos (contagens e bordas das faixas)."""
+    valores = pd.to_numeric(idades, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    valores = valores[valores <= limite]
+    if valores.size == 0:
+        return np.zeros(0, dtype='int64'), np.zeros(0, dtype='float64')
+    return np.histogram(valores, bins=bins)
+
+
+def binned_kde(counts: np.ndarray, edges: np.ndarray, pontos: int = KDE_PONTOS):
+    """KDE gaussiana estimada a partir do histograma, na escala de contagens.
+
+    Cada faixa entra como uma massa no seu ponto central; a banda segue a
+    regra de Scott (a mesma do seaborn). O custo depende do número de
+    faixas, não do número de empresas filtradas.
+    """
+    n = counts.sum()
+    centros = (edges[:-1] + edges[1:]) / 2
+    x = np.linspace(edges[0], edges[-1], pontos)
+    if n < 2:
+        return x, np.zeros_like(x)
+
+    media = np.average(centros, weights=counts)
+    desvio = np.sqrt(np.average((centros - media) ** 2, weights=counts) * n / (n - 1))
+    banda = desvio * n ** (-1 / 5) if desvio > 0 else np.diff(edges).mean()
+
+    z = (x[:, None] - centros[None, :]) / banda
+    densidade = (np.exp(-0.5 * z ** 2) * counts[None, :]).sum(axis=1) / (banda * np.sqrt(2 * np.pi))
+    # Converte densidade para "empresas por faixa", como o kde=True do histplot
+    return x, densidade * np.diff(edges).mean()
+
+
+def render_age_histogram(counts: np.ndarray, edges: np.ndarray, estilo: dict) -> bytes:
+    """Desenha o histograma + KDE e devolve o PNG.
+
+    Usa a API orientada a objetos (`Figure`) em vez do pyplot: a figura não
+    entra no registro global de figuras e é liberada explicitamente ao final,
+    então reruns sucessivos não acumulam memória.
+    """
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(8, 5))
+    try:
+        ax = fig.subplots()
+        fundo = estilo.get('fundo')
+        if fundo:
+            fig.patch.set_facecolor(fundo)
+            ax.set_facecolor(fundo)
+
+        cor = estilo['cor']
+        ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge', color=cor, alpha=.75, edgecolor='white', linewidth=.5)
+        kde_x, kde_y = binned_kde(counts, edges)
+        ax.plot(kde_x, kde_y, color=cor, linewidth=1.5)
+
+        for x, cor_linha, label in estilo.get('linhas', []):
+            ax.axvline(x, color=cor_linha, linestyle='--', linewidth=2, label=label)
+
+        ax.set_xlabel(estilo.get('xlabel', ''))
+        ax.set_ylabel(estilo.get('ylabel', 'Count'))
+        cor_texto = estilo.get('cor_texto')
+        if cor_texto:
+            ax.tick_params(colors=cor_texto)
+            ax.xaxis.label.set_color(cor_texto)
+            ax.yaxis.label.set_color(cor_texto)
+        if estilo.get('despine'):
+            ax.spines[['top', 'right']].set_visible(False)
+        ax.legend()
+
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=PNG_DPI, bbox_inches='tight', facecolor=fig.get_facecolor())
+        return buffer.getvalue()
+    finally:
+        fig.clear()
+        del fig
+
+
+@st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+def _histograma_png(counts: np.ndarray, edges: np.ndarray, estilo: dict):
+    cache_miss("histograma")
+    return render_age_histogram(counts, edges, estilo)
+
+
+def age_histogram_png(idades: pd.Series, limite: float, bins: int, estilo: dict):
+    """PNG do histograma de maturidade, em cache pelas contagens por faixa.
+
+    O histograma em si é barato (um `np.histogram` sobre as idades do
+    recorte); o que o cache evita é desenhar e serializar a figura. Recortes
+    com as mesmas faixas e contagens reaproveitam o mesmo PNG, sem depender
+    dos widgets da sidebar. Retorna None quando não há idades dentro do limite.
+    """
+    with span("histograma_idade", linhas=len(idades), cache="histograma"):
+        counts, edges = age_histogram(idades, limite, bins)
+        if counts.sum() == 0:
+            return None
+        return _histograma_png(counts, edges, estilo)
@@ -0,0 +1,206 @@
+# --- FILTRO POR CNAE (ÍNDICE INVERTIDO DA ATIVIDADE PRINCIPAL E SECUNDÁRIAS) ---
+# O ETL grava, ao lado de cada .parquet, um índice CNAE -> linhas que
+# cobre a atividade principal (`cnae_fiscal`) e a lista de secundárias
+# (`cnae_fiscal_secundaria`, texto separado por vírgula, que nem fica na
+# base em memória). Filtrar por qualquer combinação de códigos vira
+# marcar as linhas das listas deles numa máscara e cruzá-la com o
+# recorte do território pelo id da linha (ROW_ID), sem varrer texto.
+#
+# ETL:      build_cnae_index(df, OUTPUT_FILE)   (depois do to_parquet ordenado)
+# Avulso:   python -m core.cnae --construir leads_saude_processed.parquet ...
+# Painel:   df_filtered = filter_by_cnae(df_filtered, df, cnae_multiselect(df))
+import argparse
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import streamlit as st
+
+from core.datasets import ARQUIVO_ATTR, ROW_ID, data_version
+from core.tracing import cache_miss, span
+
+logger = logging.getLogger(__name__)
+
+COLUNA_CNAE = "cnae_fiscal"
+COLUNA_CNAE_SECUNDARIA = "cnae_fiscal_secundaria"
+# Sufixo da pasta do índice, ao lado do .parquet
+SUFIXO_INDICE = ".cnae"
+
+
+def format_cnae(codigo) -> str:
+    """Código de 7 dígitos na máscara do IBGE: 8630501 -> '8630-5/01'."""
+    texto = str(int(codigo)).zfill(7)
+    return f"{texto[:4]}-{texto[4]}/{texto[5:]}"
+
+
+def _codigos(textos: pa.Array) -> np.ndarray:
+    """Códigos como inteiros (só os dígitos); vazio ou nulo vira 0."""
+    digitos = pc.replace_substring_regex(pc.cast(textos, pa.string()), r"\D", "")
+    digitos = pc.if_else(pc.equal(pc.utf8_length(digitos), 0), pa.scalar(None, pa.string()), digitos)
+    return pc.cast(digitos, pa.int64()).fill_null(0).to_numpy(zero_copy_only=False)
+
+
+def _pares(tabela: pa.Table) -> tuple:
+    """Pares distintos (código, linha) da principal e das secundárias, ordenados."""
+    n = tabela.num_rows
+    codigos, linhas = [], []
+    if COLUNA_CNAE in tabela.column_names:
+        codigos.append(_codigos(tabela.column(COLUNA_CNAE).combine_chunks()))
+        linhas.append(np.arange(n, dtype=np.uint64))
+    if COLUNA_CNAE_SECUNDARIA in tabela.column_names:
+        secundarias = pc.cast(tabela.column(COLUNA_CNAE_SECUNDARIA).combine_chunks(), pa.string()).fill_null("")
+        listas = pc.split_pattern(secundarias, ",")
+        por_linha = np.diff(listas.offsets.to_numpy())
+        codigos.append(_codigos(listas.flatten()))
+        linhas.append(np.repeat(np.arange(n, dtype=np.uint64), por_linha))
+    if not codigos:
+        return np.zeros(0, np.int64), np.zeros(0, np.uint32)
+
+    # Chave única (código, linha) numa só ordenação de uint64; sort + vizinhos como no índice de nomes
+    pares = np.concatenate(codigos).astype(np.uint64) << np.uint64(32)
+    pares |= np.concatenate(linhas)
+    pares = pares[pares >= np.uint64(1 << 32)]
+    pares.sort()
+    pares = pares[np.concatenate([[True], pares[1:] != pares[:-1]])]
+    return (pares >> np.uint64(32)).astype(np.int64), (pares & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+
+def index_path(file_path: str) -> str:
+    """Pasta do índice de CNAE de uma base: `base.parquet` -> `base.cnae/`."""
+    return os.path.splitext(file_path)[0] + SUFIXO_INDICE
+
+
+def build_cnae_index(base, file_path: str) -> dict:
+    """Grava o índice de CNAE de `base` (DataFrame ou tabela Arrow, na ordem de `file_path`).
+
+    Três arrays .npy: `codigos` (CNAEs distintos, crescentes), `inicios`
+    (posição da lista de cada código, CSR) e `linhas` (ids das linhas
+    com o código como principal ou secundária, crescentes). O
+    `meta.json` sai por último e amarra o índice ao arquivo.
+    """
+    if isinstance(base, pd.DataFrame):
+        colunas = [c for c in (COLUNA_CNAE, COLUNA_CNAE_SECUNDARIA) if c in base.columns]
+        base = pa.Table.from_pandas(base[colunas], preserve_index=False)
+    codigo, linhas = _pares(base)
+    distintos = np.flatnonzero(np.concatenate([[True], codigo[1:] != codigo[:-1]])) if codigo.size else np.zeros(0, np.int64)
+    arrays = {
+        "codigos": codigo[distintos].astype(np.int32),
+        "inicios": np.concatenate([distintos, [codigo.size]]).astype(np.int64),
+        "linhas": linhas,
+    }
+
+    destino = index_path(file_path)
+    os.makedirs(destino, exist_ok=True)
+    for nome, array in arrays.items():
+        np.save(os.path.join(destino, f"{nome}.tmp.npy"), array)
+        os.replace(os.path.join(destino, f"{nome}.tmp.npy"), os.path.join(destino, f"{nome}.npy"))
+    meta = {"linhas": base.num_rows, "postagens": int(linhas.size), "bytes_parquet": os.path.getsize(file_path) if os.path.exists(file_path) else None}
+    with open(os.path.join(destino, "meta.json.tmp"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(os.path.join(destino, "meta.json.tmp"), os.path.join(destino, "meta.json"))
+    return meta
+
+
+@st.cache_resource(ttl=3600, max_entries=32, show_spinner=False)
+def _abrir_indice(file_path: str, versao: str):
+    """(códigos, inícios, linhas, linhas do arquivo) mapeados, ou None se ausente/defasado."""
+    cache_miss("indice_cnae")
+    destino = index_path(file_path)
+    try:
+        with open(os.path.join(destino, "meta.json"), encoding='utf-8') as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        logger.warning("%s sem índice de CNAE; rode o ETL ou `python -m core.cnae --construir`", file_path)
+        return None
+    if meta["linhas"] != pq.ParquetFile(file_path).metadata.num_rows or meta.get("bytes_parquet") not in (None, os.path.getsize(file_path)):
+        logger.warning("Índice de CNAE de %s é de outra versão da base; reconstrua-o", file_path)
+        return None
+    arrays = tuple(np.load(os.path.join(destino, f"{nome}.npy"), mmap_mode='r') for nome in ("codigos", "inicios", "linhas"))
+    return arrays + (meta["linhas"],)
+
+
+def cnae_index(df: pd.DataFrame):
+    """Índice de CNAE do arquivo de onde `df` (a base do `load_data`) foi lido, ou None."""
+    arquivo = df.attrs.get(ARQUIVO_ATTR)
+    if not arquivo or not os.path.exists(arquivo):
+        return None
+    return _abrir_indice(arquivo, data_version(arquivo))
+
+
+def cnae_counts(df: pd.DataFrame) -> pd.Series:
+    """Empresas por CNAE (principal ou secundária) na base inteira, da mais comum à mais rara."""
+    indice = cnae_index(df)
+    if indice is None:
+        return pd.Series(dtype=np.int64)
+    codigos, inicios = indice[:2]
+    contagem = pd.Series(np.diff(inicios), index=np.asarray(codigos), name="empresas")
+    return contagem.sort_values(ascending=False, kind='stable')
+
+
+def cnae_mask(df: pd.DataFrame, codigos) -> np.ndarray:
+    """Máscara, por linha do arquivo, das empresas com algum dos `codigos`.
+
+    Vale como OU entre os códigos, na principal ou nas secundárias. Cada
+    código custa uma busca binária e a marcação da sua lista. Devolve None
+    se a base não tem índice.
+    """
+    indice = cnae_index(df)
+    if indice is None:
+        return None
+    todos, inicios, linhas, n = indice
+    procurados = np.unique(np.asarray([int(c) for c in codigos], dtype=np.int64))
+    posicao = np.searchsorted(todos, procurados)
+    mascara = np.zeros(n, dtype=bool)
+    for i, codigo in zip(posicao, procurados):
+        if i < todos.size and todos[i] == codigo:
+            mascara[linhas[inicios[i]:inicios[i + 1]]] = True
+    return mascara
+
+
+def filter_by_cnae(df_filtered: pd.DataFrame, df: pd.DataFrame, codigos) -> pd.DataFrame:
+    """Linhas do recorte `df_filtered` (da base `df`) com algum dos `codigos`.
+
+    Sem códigos, ou sem índice para a base, o recorte volta inteiro.
+    """
+    if not len(codigos) or ROW_ID not in df_filtered.columns:
+        return df_filtered
+    with span("filtro_cnae", linhas=len(df_filtered), cache="indice_cnae"):
+        mascara = cnae_mask(df, codigos)
+        if mascara is None:
+            return df_filtered
+        return df_filtered[mascara[df_filtered[ROW_ID].to_numpy()]]
+
+
+def cnae_multiselect(df: pd.DataFrame, key: str = "filtro_cnae") -> list:
+    """Multiselect de CNAE na sidebar, com as atividades da base da mais comum à mais rara.
+
+    Só aparece quando a base tem índice de CNAE; vazio não filtra. Hubs
+    multi-nicho passam uma `key` por nicho, para a seleção não vazar entre bases.
+    """
+    contagem = cnae_counts(df)
+    if contagem.empty:
+        return []
+    return st.sidebar.multiselect(
+        "Atividade (CNAE principal ou secundária)", contagem.index.tolist(), default=[], key=key,
+        format_func=lambda c: f"{format_cnae(c)} · {contagem[c]:,} empresas", placeholder="Todas as atividades",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--construir', nargs='+', required=True, metavar="PARQUET", help="bases cujo índice de CNAE (re)construir")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    for caminho in args.construir:
+        colunas = [c for c in (COLUNA_CNAE, COLUNA_CNAE_SECUNDARIA) if c in pq.read_schema(caminho).names]
+        meta = build_cnae_index(pq.read_table(caminho, columns=colunas), caminho)
+        logger.info("Índice de CNAE de %s: %s linhas, %s postagens", caminho, meta["linhas"], meta["postagens"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# --- BASES PARQUET (LEITURA COMPARTILHADA E VERSIONAMENTO) ---
+import hashlib
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import streamlit as st
+
+from core.metrics import record_dataset
+from core.schema import CONTATO_FORMATADO, EMAIL_PRINCIPAL, QUALIDADE_CONTATO, compact_schema, with_ages, with_cnpj_keys, with_contact_fields
+from core.tracing import cache_miss, span
+
+# Pasta dos .parquet gerados pelo ETL (padrão: raiz do repositório)
+DATA_DIR = os.environ.get(
+    "BUSSOLA_DATA_DIR",
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+)
+
+logger = logging.getLogger(__name__)
+
+# Atributo do DataFrame com a versão do arquivo que o originou
+VERSAO_ATTR = "versao_dados"
+# Atributos com o caminho do arquivo e a ordem original das colunas (para buscar os detalhes)
+ARQUIVO_ATTR = "arquivo_dados"
+COLUNAS_ATTR = "colunas_arquivo"
+
+# Contato e endereço completo: fora da base em memória, lidos do arquivo só
+# para as linhas exibidas ou exportadas (with_details)
+DETAIL_COLUMNS = (
+    "ddd_1", "telefone_1", "ddd_2", "telefone_2", "email_contato", "nome_fantasia_final",
+    "cnae_fiscal_secundaria", "tipo_logradouro", "logradouro", "numero", "complemento", "cep",
+    CONTATO_FORMATADO, EMAIL_PRINCIPAL,
+)
+# Posição da linha no arquivo: liga o recorte em memória às colunas de detalhe
+ROW_ID = "_linha"
+# Acima disso (exports de UF ou nacionais) os detalhes são lidos sem cache:
+# guardar o recorte inteiro devolveria à memória as colunas tiradas da base
+LIMITE_CACHE_DETALHES = 5_000
+
+
+def dataset_path(nome_arquivo: str) -> str:
+    """Caminho absoluto de uma base: todos os apps resolvem pelo mesmo lugar."""
+    return os.path.abspath(os.path.join(DATA_DIR, nome_arquivo))
+
+
+def data_version(file_path: str) -> str:
+    """Versão do arquivo no disco (mtime + tamanho): muda a cada novo ETL."""
+    info = os.stat(file_path)
+    return f"{info.st_mtime_ns:x}-{info.st_size:x}"
+
+
+def stamp_version(df: pd.DataFrame, file_path: str) -> pd.DataFrame:
+    """Grava no DataFrame a versão do arquivo lido, no momento da leitura.
+
+    A versão viaja junto com o DataFrame em cache (`df.attrs`), então
+    caches derivados só enxergam uma base nova quando o `load_data`
+    também a enxerga.
+    """
+    df.attrs[VERSAO_ATTR] = data_version(file_path)
+    return df
+
+
+def version_of(df: pd.DataFrame) -> str:
+    return df.attrs.get(VERSAO_ATTR, "")
+
+
+def working_columns(nomes: list) -> list:
+    """Colunas do arquivo que entram na base em memória: todas menos as de detalhe.
+
+    Em base de ETL antigo, sem a qualidade do contato, entram também os
+    contatos crus, lidos só para calculá-la (o score sai dela).
+    """
+    colunas = [c for c in nomes if c not in DETAIL_COLUMNS]
+    if QUALIDADE_CONTATO not in nomes:
+        colunas += [c for c in ("telefone_1", "email_contato") if c in nomes]
+    return colunas
+
+
+def working_set(df: pd.DataFrame) -> pd.DataFrame:
+    """Base em memória: sem as colunas de detalhe, com o id de cada linha.
+
+    Campos derivados que o ETL atual já grava (contato, raiz do CNPJ) são
+    completados aqui para bases de ETLs antigos.
+    """
+    df = with_cnpj_keys(with_contact_fields(df))
+    df = df.drop(columns=[c for c in DETAIL_COLUMNS if c in df.columns])
+    df[ROW_ID] = np.arange(len(df), dtype=np.uint32)
+    return df
+
+
+@st.cache_resource(ttl=3600, show_spinner=False)
+def _ler_parquet(file_path: str) -> pd.DataFrame:
+    cache_miss("parquet")
+    nomes = pq.read_schema(file_path).names
+    df = pd.read_parquet(file_path, columns=working_columns(nomes))
+    df = stamp_version(working_set(compact_schema(df)), file_path)
+    df.attrs[COLUNAS_ATTR] = nomes
+    record_dataset(os.path.basename(file_path), df)
+    return df
+
+
+def read_dataset(file_path: str) -> pd.DataFrame:
+    """Base lida uma única vez por processo, compartilhada por nichos e sessões.
+
+    Vários painéis usam o mesmo parquet (concorrência, saúde, construção,
+    educação, TI); aqui todos recebem a mesma leitura. O retorno é uma
+    cópia rasa: os `load_data` podem criar/substituir colunas sem tocar na
+    base compartilhada (copy-on-write), e as colunas não alteradas
+    continuam apontando para a mesma memória. A idade das empresas é
+    calculada aqui, a cada carga, a partir da data de início (core.schema).
+
+    Contatos e endereço completo (DETAIL_COLUMNS) não entram: cada linha
+    leva seu id no arquivo (ROW_ID) e `with_details` busca essas colunas
+    só para as linhas exibidas ou exportadas.
+
+    Com BUSSOLA_SHM_DIR definido, a base vem do store em memória
+    compartilhada entre workers (core.shared_store), se já publicada.
+    """
+    from core.shared_store import attach
+
+    with span("read_dataset", cache="parquet") as etapa:
+        df = attach(os.path.basename(file_path))
+        if df is None:
+            df = _ler_parquet(os.path.abspath(file_path))
+        etapa.linhas = len(df)
+    df = df.copy(deep=False)
+    df.attrs[ARQUIVO_ATTR] = os.path.abspath(file_path)
+    return with_ages(df)
+
+
+def _buscar_detalhes(file_path: str, versao: str, ids: np.ndarray, colunas: tuple):
+    """Colunas de detalhe das linhas `ids` (ordenadas, sem repetição), indexadas por ROW_ID.
+
+    Lê só os row groups que contêm alguma das linhas. Retorna None se o
+    arquivo mudou desde a carga: os ids não valem para a versão nova.
+    """
+    if data_version(file_path) != versao:
+        logger.warning("%s mudou desde a carga; detalhes indisponíveis até a base ser recarregada", file_path)
+        return None
+
+    arquivo = pq.ParquetFile(file_path)
+    colunas = [c for c in colunas if c in arquivo.schema_arrow.names]
+    meta = arquivo.metadata
+    inicios = np.cumsum([0] + [meta.row_group(i).num_rows for i in range(meta.num_row_groups)])
+    grupos = np.searchsorted(inicios, ids, side='right') - 1
+    partes = [arquivo.schema_arrow.empty_table().select(colunas)]
+    for grupo in np.unique(grupos):
+        locais = ids[grupos == grupo] - inicios[grupo]
+        partes.append(arquivo.read_row_group(int(grupo), columns=colunas).take(pa.array(locais)))
+    detalhes = compact_schema(pa.concat_tables(partes).to_pandas())
+    detalhes.index = pd.Index(ids, name=ROW_ID)
+    return detalhes
+
+
+@st.cache_resource(ttl=600, max_entries=32, show_spinner=False)
+def _ler_detalhes(file_path: str, versao: str, chave_ids: str, _ids: np.ndarray, colunas: tuple):
+    """`_buscar_detalhes` em cache, para recortes do tamanho de uma página (tabela, PDF)."""
+    cache_miss("detalhes")
+    return _buscar_detalhes(file_path, versao, _ids, colunas)
+
+
+def with_details(linhas: pd.DataFrame, colunas: list = None) -> pd.DataFrame:
+    """O recorte com as colunas de detalhe (contato, endereço) de cada linha.
+
+    Chame só com as linhas que vão para a tela ou para o arquivo (head da
+    tabela, top do PDF, export). Sem `colunas` vêm todas as de detalhe, na
+    ordem original do arquivo. A coluna ROW_ID sai do resultado.
+
+    Só recortes de até LIMITE_CACHE_DETALHES linhas ficam em cache; exports
+    maiores leem os row groups a cada pedido e não ficam residentes.
+    """
+    if ROW_ID not in linhas.columns or ARQUIVO_ATTR not in linhas.attrs:
+        return linhas
+    ordem = linhas.attrs.get(COLUNAS_ATTR) or []
+    colunas = tuple(c for c in (colunas or DETAIL_COLUMNS) if c not in linhas.columns and (not ordem or c in ordem))
+    ids = linhas[ROW_ID].to_numpy()
+    resultado = linhas.drop(columns=ROW_ID)
+    if not colunas:
+        return resultado
+
+    with span("detalhes", linhas=len(linhas), cache="detalhes"):
+        unicos = np.unique(ids)
+        if len(unicos) > LIMITE_CACHE_DETALHES:
+            detalhes = _buscar_detalhes(linhas.attrs[ARQUIVO_ATTR], version_of(linhas), unicos, colunas)
+        else:
+            chave = hashlib.blake2b(unicos.tobytes(), digest_size=16).hexdigest()
+            detalhes = _ler_detalhes(linhas.attrs[ARQUIVO_ATTR], version_of(linhas), chave, unicos, colunas)
+    if detalhes is None:
+        detalhes = pd.DataFrame(index=pd.Index(unicos, name=ROW_ID), columns=list(colunas))
+    resultado = pd.concat([resultado, detalhes.reindex(ids).set_axis(linhas.index)], axis=1)
+
+    posicao = {c: i for i, c in enumerate(ordem)}
+    return resultado[sorted(resultado.columns, key=lambda c: posicao.get(c, len(ordem)))]
@@ -0,0 +1,101 @@
+# --- FIGURAS PLOTLY (CACHE E COMPACTAÇÃO DO PAYLOAD) ---
+import logging
+
+import numpy as np
+import streamlit as st
+
+from core.tracing import cache_miss, span
+
+logger = logging.getLogger(__name__)
+
+# Chave em session_state com o tamanho do payload de cada figura exibida
+PAYLOAD_KEY = "payload_figuras"
+CASAS_DECIMAIS = 4
+
+
+def payload_bytes(fig) -> int:
+    """Tamanho em bytes do JSON que o st.plotly_chart envia ao navegador."""
+    import plotly.io as pio
+
+    return len(pio.to_json(fig, validate=False).encode('utf-8'))
+
+
+def _compactar_array(valores):
+    """Reduz arrays numéricos ao menor dtype que o plotly.js entende.
+
+    Floats são arredondados; só viram inteiros quando não há parte
+    fracionária (contagens, capital mediano), para o hover não mudar.
+    """
+    if not isinstance(valores, np.ndarray) or valores.dtype.kind not in 'iuf' or valores.size == 0:
+        return valores
+    if valores.dtype.kind == 'f':
+        valores = np.round(valores, CASAS_DECIMAIS)
+        if not np.isfinite(valores).all() or (valores % 1 != 0).any():
+            return valores
+    minimo, maximo = valores.min(), valores.max()
+    for dtype in ('uint8', 'int8', 'uint16', 'int16', 'uint32', 'int32'):
+        limites = np.iinfo(dtype)
+        if limites.min <= minimo and maximo <= limites.max:
+            return valores.astype(dtype)
+    return valores
+
+
+def _compactar_no(no):
+    """Percorre o dicionário da figura compactando todo array numérico."""
+    if isinstance(no, dict):
+        return {k: _compactar_no(v) for k, v in no.items()}
+    if isinstance(no, (list, tuple)) and no and all(isinstance(v, dict) for v in no):
+        return [_compactar_no(v) for v in no]
+    return _compactar_array(no)
+
+
+def compact_figure(fig):
+    """Versão enxuta da figura, com o mesmo visual.
+
+    - floats são arredondados a CASAS_DECIMAIS casas (seguem float64); inteiros,
+      e floats sem parte fracionária, viram o menor inteiro possível;
+    - o template mantém só os padrões dos tipos de trace usados;
+    - `hovertext` idêntico a `text` é removido (o hover passa a ler `text`).
+    """
+    import plotly.graph_objects as go
+
+    dados = fig.to_dict()
+
+    tipos = {trace.get('type', 'scatter') for trace in dados.get('data', [])}
+    template = dados.get('layout', {}).get('template')
+    if template and 'data' in template:
+        template['data'] = {t: v for t, v in template['data'].items() if t in tipos}
+
+    for trace in dados.get('data', []):
+        texto, hover = trace.get('text'), trace.get('hovertext')
+        if texto is not None and hover is not None and np.array_equal(np.asarray(texto, dtype=object), np.asarray(hover, dtype=object)):
+            del trace['hovertext']
+            if 'hovertemplate' in trace:
+                trace['hovertemplate'] = trace['hovertemplate'].replace('%{hovertext}', '%{text}')
+
+    dados['data'] = [_compactar_no(trace) for trace in dados.get('data', [])]
+    return go.Figure(dados, skip_invalid=False)
+
+
+@st.cache_resource(ttl=3600, max_entries=256, show_spinner=False)
+def _figura_compacta(view: str, chave: tuple, _construtor):
+    cache_miss("figuras")
+    fig = _construtor()
+    bruto = payload_bytes(fig)
+    fig = compact_figure(fig)
+    tamanho = {"bruto": bruto, "compacto": payload_bytes(fig)}
+    logger.info("Figura '%s': payload %d -> %d bytes", view, tamanho["bruto"], tamanho["compacto"])
+    return fig, tamanho
+
+
+def cached_figure(view: str, chave: tuple, construtor):
+    """Figura Plotly memoizada por (view, chave do filtro, versão dos dados).
+
+    `construtor` é chamado só no cache miss e deve devolver a figura pronta
+    (com `update_layout`/`update_traces` aplicados). A mesma figura é
+    compartilhada entre sessões: não modifique o objeto retornado.
+    """
+    with span(f"figura: {view}", cache="figuras"):
+        fig, tamanho = _figura_compacta(view, chave, construtor)
+    st.session_state.setdefault(PAYLOAD_KEY, {})[view] = tamanho
+    return fig
@@ -0,0 +1,189 @@
+# --- ESTADO DOS FILTROS ---
+import weakref
+
+import pandas as pd
+import streamlit as st
+
+from core.bitmaps import attach_selection, filter_bits, filter_by_values, materialize, selection_bits
+from core.cnae import filter_by_cnae
+from core.datasets import ROW_ID, version_of
+from core.tracing import span
+
+# Todos os widgets de filtro da sidebar usam keys com este prefixo
+PREFIXO_FILTRO = "filtro_"
+
+
+def _congelar(valor):
+    if isinstance(valor, (list, tuple, set)):
+        return tuple(sorted(str(v) for v in valor))
+    return valor
+
+
+def filter_key(*contexto) -> tuple:
+    """Chave estável e hashable dos filtros ativos da sessão.
+
+    Combina o contexto informado pelo app (script, nicho) com os valores
+    atuais dos widgets cuja key começa com `filtro_`. Serve de chave de
+    cache para tudo que depende apenas do recorte filtrado.
+    """
+    filtros = tuple(sorted(
+        (k, _congelar(v)) for k, v in st.session_state.items()
+        if isinstance(k, str) and k.startswith(PREFIXO_FILTRO)
+    ))
+    return tuple(contexto) + filtros
+
+
+# --- RECORTE DO TERRITÓRIO GUARDADO NA SESSÃO ---
+# UF, cidade e CNAE mudam pouco; o tier é o filtro que o representante
+# mais alterna. Cada nível do recorte (a base, a UF e o território com
+# cidade e CNAE) fica na sessão com a chave dos filtros que o produziram:
+# só é refeito quando um deles muda. A sessão guarda só o bitmap das
+# linhas do nível (1 bit por linha da base) e os parciais derivados dele
+# (contagens por tier, a matriz UF x tier, as listas de UFs e cidades),
+# nunca as linhas: com dezenas de representantes ao mesmo tempo, uma
+# cópia da UF por sessão pesaria mais que a própria base. O DataFrame do
+# recorte é materializado do bitmap a cada rerun (`df.iloc` nas posições
+# ligadas); com o tier, só as linhas finais: o bitmap do território é
+# cruzado com os dos tiers marcados antes de materializar. Trocar só o
+# tier vira somar os parciais do território nos tiers marcados.
+
+# Chave do session_state com os recortes (não começa por `filtro_`: fica fora do filter_key)
+RECORTES_KEY = "_recortes_territorio"
+
+# Recorte materializado -> (entrada da sessão que o gerou, base, território), para o
+# `slice_partial`. O território é None quando o recorte é o próprio território;
+# num recorte filtrado pelo tier, é [território], materializado na primeira
+# vez que um parcial faltar. Fica fora do session_state (weakrefs não
+# serializam); sai junto com o recorte.
+_ORIGENS = {}
+
+
+def _registrar_origem(recorte: pd.DataFrame, entrada: dict, df: pd.DataFrame, territorio: list = None) -> pd.DataFrame:
+    chave = id(recorte)
+    if chave not in _ORIGENS:
+        weakref.finalize(recorte, _ORIGENS.pop, chave, None)
+    _ORIGENS[chave] = (weakref.ref(recorte), entrada, df, territorio)
+    return recorte
+
+
+def _origem(recorte: pd.DataFrame):
+    origem = _ORIGENS.get(id(recorte))
+    if origem is None or origem[0]() is not recorte:
+        return None
+    return origem[1:]
+
+
+def _entrada_da_sessao(df: pd.DataFrame, nivel: str, contexto: tuple, recortar):
+    """Entrada `nivel` da sessão ({chave, bits, parciais}) e, se acabou de ser refeita, o recorte.
+
+    A chave inclui a identidade da base (cada app tem a sua do `load_data`,
+    mesmo quando dividem o arquivo), a versão e o número de linhas.
+    """
+    chave = (id(df), version_of(df), len(df)) + tuple(_congelar(c) for c in contexto)
+    recortes = st.session_state.setdefault(RECORTES_KEY, {})
+    entrada = recortes.get(nivel)
+    if entrada is not None and entrada["chave"] == chave:
+        return entrada, None
+    with span(f"recorte_{nivel}", linhas=len(df)):
+        recorte = attach_selection(recortar(), df)
+        bits = selection_bits(recorte, df) if ROW_ID in recorte.columns and ROW_ID in df.columns and version_of(df) else None
+        # Sem ROW_ID/versão não há bitmap: só então o próprio recorte fica na sessão
+        entrada = {"chave": chave, "bits": bits, "recorte": recorte if bits is None else None, "parciais": {}}
+    recortes[nivel] = entrada
+    return entrada, recorte
+
+
+def _materializar(df: pd.DataFrame, entrada: dict, recorte=None) -> pd.DataFrame:
+    if recorte is None:
+        recorte = entrada["recorte"] if entrada["bits"] is None else materialize(df, entrada["bits"])
+    return _registrar_origem(recorte, entrada, df)
+
+
+def _parcial(df: pd.DataFrame, entrada: dict, nome: str, calcular, recorte=None):
+    """`calcular(recorte)` uma vez por entrada; o recorte só é materializado se faltar o parcial."""
+    if nome not in entrada["parciais"]:
+        entrada["parciais"][nome] = calcular(_materializar(df, entrada, recorte))
+    return entrada["parciais"][nome]
+
+
+def session_slice(df: pd.DataFrame, nivel: str, contexto: tuple, recortar) -> pd.DataFrame:
+    """Recorte `nivel` da base `df`; `recortar()` só roda quando o `contexto` muda.
+
+    Nos demais reruns o recorte sai do bitmap guardado na sessão, com o
+    mesmo bitmap associado (o `filter_by_values` parte dele).
+    """
+    entrada, recorte = _entrada_da_sessao(df, nivel, contexto, recortar)
+    return _materializar(df, entrada, recorte)
+
+
+def slice_partial(recorte: pd.DataFrame, nome: str, calcular):
+    """`calcular(território)` guardado na sessão junto do território de onde `recorte` saiu.
+
+    Com o recorte já filtrado pelo tier (`territory_slice` com `coluna`),
+    o cálculo recebe o território inteiro, materializado só na primeira
+    vez: são parciais por tier, re-somados nos marcados. Fora da sessão
+    (recorte que não veio de `session_slice` nem de `territory_slice`),
+    só calcula sobre o próprio recorte.
+    """
+    origem = _origem(recorte)
+    # Entrada já substituída na sessão (outro território): o parcial não seria reaproveitado
+    if origem is None or not any(e is origem[0] for e in st.session_state.get(RECORTES_KEY, {}).values()):
+        return calcular(recorte)
+    entrada, df, territorio = origem
+    if territorio is None:
+        return _parcial(df, entrada, nome, calcular, recorte)
+    if nome not in entrada["parciais"] and territorio[0] is None:
+        territorio[0] = _materializar(df, entrada)
+    return _parcial(df, entrada, nome, calcular, territorio[0])
+
+
+def _nivel_uf(df: pd.DataFrame, uf: str):
+    """Entrada da sessão com as linhas da UF (ou a base inteira, em "Todos")."""
+    if uf == "Todos":
+        return _entrada_da_sessao(df, "base", (), lambda: df.copy(deep=False))
+    return _entrada_da_sessao(df, "uf", (uf,), lambda: df[df['uf_norm'] == uf])
+
+
+def uf_slice(df: pd.DataFrame, uf: str) -> pd.DataFrame:
+    """Linhas da UF (ou a base inteira, em "Todos"), a partir do bitmap da sessão."""
+    return _materializar(df, *_nivel_uf(df, uf))
+
+
+def uf_options(df: pd.DataFrame) -> list:
+    """UFs da base em ordem alfabética, para o selectbox (calculadas uma vez por sessão e base)."""
+    entrada, recorte = _nivel_uf(df, "Todos")
+    return _parcial(df, entrada, "ufs", lambda r: sorted(str(x) for x in r['uf_norm'].dropna().unique().tolist()), recorte)
+
+
+def city_options(df: pd.DataFrame, uf: str, coluna_cidade: str) -> list:
+    """Cidades da UF em ordem alfabética, para o selectbox (calculadas uma vez por UF)."""
+    entrada, recorte = _nivel_uf(df, uf)
+    return _parcial(df, entrada, f"cidades:{coluna_cidade}", lambda r: sorted(str(x) for x in r[coluna_cidade].dropna().unique().tolist()), recorte)
+
+
+def territory_slice(df: pd.DataFrame, uf: str = "Todos", cidade: str = "Todas", coluna_cidade: str = 'municipio_visual', cnaes=(), coluna: str = None, valores=()) -> pd.DataFrame:
+    """Recorte de UF, cidade e atividade (CNAE) da sidebar, reaproveitado entre reruns.
+
+    Com `coluna`, sai também filtrado pelos `valores` marcados nela (o
+    tier; vazio = todos): o bitmap do território é cruzado com os dos
+    valores e só as linhas finais são materializadas. Sem cidade nem CNAE,
+    o território é o próprio recorte da UF.
+    """
+    if uf == "Todos":
+        cidade = "Todas"
+    if cidade == "Todas" and not len(cnaes):
+        entrada, recorte = _nivel_uf(df, uf)
+    else:
+        def recortar():
+            df_uf = uf_slice(df, uf)
+            recorte = df_uf if cidade == "Todas" else df_uf[df_uf[coluna_cidade] == cidade]
+            return filter_by_cnae(recorte, df, cnaes)
+
+        entrada, recorte = _entrada_da_sessao(df, "territorio", (uf, cidade, coluna_cidade, cnaes), recortar)
+
+    if coluna is None or not len(valores):
+        return _materializar(df, entrada, recorte)
+    if entrada["bits"] is None:
+        recorte = _materializar(df, entrada, recorte)
+        return _registrar_origem(filter_by_values(recorte, df, coluna, valores), entrada, df, [recorte])
+    return _registrar_origem(materialize(df, filter_bits(entrada["bits"], df, coluna, valores)), entrada, df, [recorte])
@@ -0,0 +1,109 @@
+# --- PEGADA DE MEMÓRIA DAS BASES (POR NICHO E POR COLUNA) ---
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from core.datasets import version_of
+from core.metrics import enabled as metrics_enabled, record_footprint
+from core.tracing import annotate, debug_enabled
+
+# Chave do trace com a pegada das bases usadas no rerun
+MEMORIA_KEY = "memoria"
+# Acima desta fração de valores distintos a categoria não compensa
+CARDINALIDADE_MAX_CATEGORIA = 0.5
+
+
+def _bytes_codigos(cardinalidade: int) -> int:
+    """Itemsize dos códigos de um pd.Categorical com essa cardinalidade."""
+    for dtype in ('int8', 'int16', 'int32'):
+        if cardinalidade < np.iinfo(dtype).max:
+            return np.dtype(dtype).itemsize
+    return 8
+
+
+def _projecao_texto(coluna: pd.Series) -> dict:
+    """Bytes projetados da coluna como string Arrow e como categoria."""
+    import pyarrow as pa
+
+    arrow = pa.array(coluna, from_pandas=True, type=pa.large_string())
+    dicionario = arrow.dictionary_encode().dictionary
+    cardinalidade = len(dicionario)
+    return {
+        "cardinalidade": cardinalidade,
+        "bytes_arrow": arrow.nbytes,
+        "bytes_categoria": len(coluna) * _bytes_codigos(cardinalidade) + dicionario.nbytes,
+    }
+
+
+def column_footprint(df: pd.DataFrame) -> pd.DataFrame:
+    """Memória profunda por coluna, com a economia projetada para os textos.
+
+    Para cada coluna de texto (object ou string Arrow) estima o tamanho
+    como string Arrow e como categoria; `sugestao` é a menor das opções e
+    `economia` quanto ela libera em relação ao dtype atual. Colunas cuja
+    cardinalidade passa de CARDINALIDADE_MAX_CATEGORIA não viram categoria.
+    """
+    atual = df.memory_usage(deep=True, index=False)
+    linhas = []
+    for nome in df.columns:
+        coluna = df[nome]
+        texto = coluna.dtype == object or pd.api.types.is_string_dtype(coluna.dtype)
+        registro = {
+            "coluna": nome,
+            "dtype": str(coluna.dtype),
+            "bytes": int(atual[nome]),
+            "texto": texto,
+            "cardinalidade": None,
+            "sugestao": None,
+            "economia": 0,
+        }
+        if texto:
+            projecao = _projecao_texto(coluna)
+            registro["cardinalidade"] = projecao["cardinalidade"]
+            opcoes = {"string[pyarrow]": projecao["bytes_arrow"]}
+            if projecao["cardinalidade"] <= CARDINALIDADE_MAX_CATEGORIA * max(len(coluna), 1):
+                opcoes["category"] = projecao["bytes_categoria"]
+            sugestao, bytes_sugestao = min(opcoes.items(), key=lambda item: item[1])
+            if bytes_sugestao < registro["bytes"] and sugestao != registro["dtype"]:
+                registro["sugestao"] = sugestao
+                registro["economia"] = registro["bytes"] - bytes_sugestao
+        linhas.append(registro)
+
+    tabela = pd.DataFrame(linhas)
+    total = tabela["bytes"].sum()
+    tabela["pct"] = (tabela["bytes"] / total * 100).round(1) if total else 0.0
+    return tabela.sort_values("bytes", ascending=False, ignore_index=True)
+
+
+def footprint_summary(tabela: pd.DataFrame) -> dict:
+    total = int(tabela["bytes"].sum())
+    texto = int(tabela.loc[tabela["texto"], "bytes"].sum())
+    economia = int(tabela["economia"].sum())
+    return {
+        "bytes": total,
+        "bytes_texto": texto,
+        "pct_texto": round(texto / total * 100, 1) if total else 0.0,
+        "economia_projetada": economia,
+        "pct_economia": round(economia / total * 100, 1) if total else 0.0,
+    }
+
+
+@st.cache_resource(ttl=3600, max_entries=64, show_spinner=False)
+def _pegada(nome: str, versao: str, _df: pd.DataFrame):
+    tabela = column_footprint(_df)
+    resumo = footprint_summary(tabela)
+    record_footprint(nome, tabela, resumo)
+    return tabela, resumo
+
+
+def track_dataset(nome: str, df: pd.DataFrame):
+    """Pegada de memória da base do painel, para o painel de depuração e as métricas.
+
+    Calculada uma vez por (base, versão) e só quando alguém vai olhar
+    (`?debug=1` ou métricas ligadas): codificar os textos em dicionário
+    custa segundos nas bases grandes.
+    """
+    if not (debug_enabled() or metrics_enabled()):
+        return
+    tabela, resumo = _pegada(nome, version_of(df), df)
+    annotate(MEMORIA_KEY, {nome: {"resumo": resumo, "colunas": tabela}})
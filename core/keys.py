@@ -0,0 +1,150 @@
+# --- ÍNDICE ORDENADO POR CNPJ (BUSCA PONTUAL, DEDUP E JOIN SEM HASH DE TEXTO) ---
+# O ETL grava cada nicho ordenado pelo CNPJ (uint64, core.schema): a
+# própria coluna, na ordem do arquivo, já é o índice. Busca pontual,
+# deduplicação entre nichos e join com tabelas externas viram
+# `searchsorted` em O(log n) por chave, sem montar hash de strings. Bases
+# de ETLs antigos (fora de ordem) ganham na carga uma permutação ordenada,
+# calculada uma vez por arquivo e versão.
+#
+#   locate(df, [12345678000195])          -> posição (iloc) ou -1
+#   shared_with(df_saude, df_seguros)     -> máscara dos CNPJs presentes nos dois nichos
+#   join_by_cnpj(crm, df, ['razao_social'])  -> tabela externa + colunas do nicho
+#   find_in_files(caminhos, cnpj)         -> linha do CNPJ em cada arquivo, lendo só o row group dele
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import streamlit as st
+
+from core.datasets import ARQUIVO_ATTR, ROW_ID, version_of
+from core.schema import COLUNA_CNPJ, cnpj_integers
+from core.tracing import cache_miss, span
+
+
+def _como_inteiros(cnpjs) -> np.ndarray:
+    """CNPJs em qualquer forma (int, texto com ou sem máscara) como uint64."""
+    if not isinstance(cnpjs, pd.Series):
+        valores = np.atleast_1d(np.asarray(cnpjs))
+        if valores.dtype.kind in 'iu':
+            return valores.astype(np.uint64)
+        cnpjs = pd.Series(valores, dtype=object)
+    if cnpjs.dtype == np.uint64:
+        return cnpjs.to_numpy()
+    if pd.api.types.is_integer_dtype(cnpjs.dtype):
+        return cnpjs.fillna(0).to_numpy(dtype=np.uint64)
+    return cnpj_integers(cnpjs)
+
+
+def _indexar(cnpj: np.ndarray) -> tuple:
+    # Base gravada pelo ETL atual já vem ordenada: checagem O(n), sem cópia
+    if cnpj.size < 2 or bool(np.all(cnpj[:-1] <= cnpj[1:])):
+        return cnpj, None
+    posicoes = np.argsort(cnpj, kind='stable')
+    return cnpj[posicoes], posicoes
+
+
+@st.cache_resource(ttl=3600, max_entries=16, show_spinner=False)
+def _indice_em_cache(arquivo: str, versao: str, linhas: int, _cnpj: np.ndarray) -> tuple:
+    cache_miss("indice_cnpj")
+    return _indexar(_cnpj)
+
+
+def cnpj_index(df: pd.DataFrame) -> tuple:
+    """(chaves ordenadas, posições): `posicoes[i]` é o iloc da i-ésima chave.
+
+    `posicoes` é None quando a base já está na ordem do CNPJ (ETL atual).
+    Calculado uma vez por arquivo e versão; passe a base do `load_data`.
+    """
+    cnpj = _como_inteiros(df[COLUNA_CNPJ])
+    with span("indice_cnpj", linhas=len(df), cache="indice_cnpj"):
+        if not version_of(df):
+            return _indexar(cnpj)
+        return _indice_em_cache(df.attrs.get(ARQUIVO_ATTR, ""), version_of(df), len(df), cnpj)
+
+
+def locate(df: pd.DataFrame, cnpjs) -> np.ndarray:
+    """Posição (iloc) de cada CNPJ na base, ou -1 se ele não está nela.
+
+    CNPJ repetido na base devolve a primeira ocorrência. Aceita inteiros
+    ou texto, com ou sem máscara.
+    """
+    chaves, posicoes = cnpj_index(df)
+    procurados = _como_inteiros(cnpjs)
+    if not chaves.size:
+        return np.full(procurados.size, -1, dtype=np.int64)
+    i = np.minimum(np.searchsorted(chaves, procurados), chaves.size - 1)
+    achou = (chaves[i] == procurados) & (procurados != 0)
+    return np.where(achou, i if posicoes is None else posicoes[i], -1).astype(np.int64)
+
+
+def contains(df: pd.DataFrame, cnpjs) -> np.ndarray:
+    """Máscara: quais dos `cnpjs` estão na base."""
+    return locate(df, cnpjs) >= 0
+
+
+def shared_with(df: pd.DataFrame, outro: pd.DataFrame) -> np.ndarray:
+    """Máscara das linhas de `df` cujo CNPJ também está em `outro` (dedup entre nichos).
+
+    Procura os CNPJs de `df` nas chaves ordenadas de `outro`, já em cache:
+    nenhum hash de texto é montado.
+    """
+    chaves, _ = cnpj_index(outro)
+    cnpj = _como_inteiros(df[COLUNA_CNPJ])
+    if not chaves.size:
+        return np.zeros(len(df), dtype=bool)
+    i = np.minimum(np.searchsorted(chaves, cnpj), chaves.size - 1)
+    return (chaves[i] == cnpj) & (cnpj != 0)
+
+
+def join_by_cnpj(externo: pd.DataFrame, df: pd.DataFrame, colunas: list, coluna_cnpj: str = COLUNA_CNPJ) -> pd.DataFrame:
+    """Left join de uma tabela externa (CRM, lista de clientes) com a base do nicho.
+
+    A tabela externa traz o CNPJ em qualquer formato em `coluna_cnpj`;
+    cada linha recebe as `colunas` da base (nulas quando o CNPJ não está
+    nela), localizadas por `searchsorted` em vez de um merge por texto.
+    """
+    posicoes = locate(df, externo[coluna_cnpj])
+    achou = pd.Series(posicoes >= 0, index=externo.index)
+    trazidas = df[colunas].iloc[np.maximum(posicoes, 0)] if len(df) else df[colunas].reindex(range(len(externo)))
+    return pd.concat([externo, trazidas.set_axis(externo.index).where(achou)], axis=1)
+
+
+def find_in_files(caminhos, cnpj, colunas: list = None) -> dict:
+    """Linha do `cnpj` em cada arquivo parquet, ou None onde ele não está.
+
+    Usa as estatísticas min/max de cada row group: num arquivo ordenado
+    pelo CNPJ só um grupo pode conter a chave, e só a coluna do CNPJ desse
+    grupo é lida (mais as `colunas` pedidas, da linha achada). Arquivos de
+    ETLs antigos (CNPJ em texto, fora de ordem) são varridos por inteiro.
+    Cada resultado é um dict com ROW_ID (posição no arquivo) e as colunas.
+    """
+    procurado = int(_como_inteiros([cnpj])[0])
+    achados = {}
+    for caminho in caminhos:
+        achados[caminho] = None
+        if procurado == 0:
+            continue
+        arquivo = pq.ParquetFile(caminho)
+        meta = arquivo.metadata
+        indice = arquivo.schema_arrow.get_field_index(COLUNA_CNPJ)
+        if indice < 0:
+            continue
+        inteiro = str(arquivo.schema_arrow.field(indice).type) == "uint64"
+        inicio = 0
+        for grupo in range(meta.num_row_groups):
+            linhas = meta.row_group(grupo).num_rows
+            estatisticas = meta.row_group(grupo).column(indice).statistics
+            fora = inteiro and estatisticas is not None and estatisticas.has_min_max and not (estatisticas.min <= procurado <= estatisticas.max)
+            if not fora:
+                valores = arquivo.read_row_group(grupo, columns=[COLUNA_CNPJ]).column(0).to_numpy(zero_copy_only=False)
+                if not inteiro:
+                    valores = cnpj_integers(pd.Series(valores))
+                local = np.flatnonzero(valores == procurado)
+                if local.size:
+                    linha = {ROW_ID: inicio + int(local[0])}
+                    if colunas:
+                        registro = arquivo.read_row_group(grupo, columns=[c for c in colunas if c in arquivo.schema_arrow.names]).slice(int(local[0]), 1)
+                        linha.update(registro.to_pylist()[0])
+                    achados[caminho] = linha
+                    break
+            inicio += linhas
+    return achados
@@ -0,0 +1,46 @@
+# --- IMPORTS SOB DEMANDA ---
+import importlib
+import importlib.util
+import sys
+import threading
+
+
+class _ModuloSobDemanda:
+    """Procurador que importa o módulo no primeiro acesso a um atributo.
+
+    O import acontece sob um lock: várias sessões chegando ao mesmo tempo
+    no primeiro `px.scatter(...)` esperam o mesmo import terminar, em vez
+    de enxergar o módulo pela metade (o LazyLoader do Python 3.11 troca a
+    classe do módulo antes de executá-lo e não é seguro entre threads).
+    """
+
+    def __init__(self, nome: str):
+        self._nome = nome
+        self._modulo = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, atributo):
+        if self._modulo is None:
+            with self._lock:
+                if self._modulo is None:
+                    self._modulo = importlib.import_module(self._nome)
+        return getattr(self._modulo, atributo)
+
+    def __repr__(self):
+        estado = "carregado" if self._modulo is not None else "não carregado"
+        return f"<módulo sob demanda '{self._nome}' ({estado})>"
+
+
+def lazy_import(nome: str):
+    """Módulo que só é carregado no primeiro acesso a um atributo.
+
+    Usado para dependências pesadas (plotly.express) que só alguns
+    caminhos de código precisam: o app sobe sem pagar o import, e quem
+    chega em `px.scatter(...)` carrega o módulo naquele momento.
+    """
+    if nome in sys.modules:
+        return sys.modules[nome]
+
+    if importlib.util.find_spec(nome) is None:
+        raise ModuleNotFoundError(f"Módulo '{nome}' não encontrado", name=nome)
+    return _ModuloSobDemanda(nome)
@@ -0,0 +1,245 @@
+# --- MÉTRICAS DE PRODUÇÃO (LOG JSONL E ENDPOINT PROMETHEUS) ---
+# Cada rerun instrumentado (core.tracing) vira um evento: duração total,
+# tempo por etapa, hits/misses de cache e tamanho dos exports. Os eventos
+# vão para um log JSONL rotativo e para contadores/histogramas servidos em
+# formato texto do Prometheus por uma thread lateral.
+#
+# Log:        BUSSOLA_METRICS_DIR=/var/log/bussola streamlit run hub.py
+# Prometheus: BUSSOLA_METRICS_PORT=9464 streamlit run hub.py  ->  GET :9464/metrics
+# Relatório:  python perf/metrics_report.py /var/log/bussola
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Vazio = desativado (padrão): sem arquivo e sem porta, nada é registrado
+METRICS_DIR = os.environ.get("BUSSOLA_METRICS_DIR", "")
+METRICS_PORT = os.environ.get("BUSSOLA_METRICS_PORT", "")
+LOG_ARQUIVO = "metricas.jsonl"
+LOG_MAX_BYTES = 20 * 1024 ** 2
+LOG_BACKUPS = 5
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BUCKETS_BYTES = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2)
+# Etapas do rerun cujo retorno é um arquivo entregue ao usuário. Os CSVs
+# são gerados no clique, fora do rerun, e chegam como evento "export" (timed_export)
+ETAPAS_EXPORT = {"generate_pdf": "pdf"}
+
+_lock = threading.Lock()
+_estado = {"iniciado": False, "log": None}
+
+
+def enabled() -> bool:
+    return bool(METRICS_DIR or METRICS_PORT)
+
+
+# --- Registro em memória (formato texto do Prometheus) ---
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def _rotulos(rotulos: dict) -> str:
+    if not rotulos:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in rotulos.items()) + "}"
+
+
+class _Metrica:
+    def __init__(self, nome: str, tipo: str, ajuda: str, buckets: tuple = None):
+        self.nome = nome
+        self.tipo = tipo
+        self.ajuda = ajuda
+        self.buckets = buckets
+        self.series = {}
+
+    def _serie(self, rotulos: dict):
+        chave = tuple(sorted(rotulos.items()))
+        if chave not in self.series:
+            self.series[chave] = [0] * (len(self.buckets) + 2) if self.buckets else 0
+        return chave
+
+    def inc(self, valor: float = 1, **rotulos):
+        with _lock:
+            chave = self._serie(rotulos)
+            self.series[chave] += valor
+
+    def set(self, valor: float, **rotulos):
+        with _lock:
+            self.series[self._serie(rotulos)] = valor
+
+    def observe(self, valor: float, **rotulos):
+        with _lock:
+            serie = self.series[self._serie(rotulos)]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[i] += 1
+            serie[-2] += 1
+            serie[-1] += valor
+
+    def render(self) -> list:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+        for chave, valor in sorted(self.series.items()):
+            rotulos = dict(chave)
+            if not self.buckets:
+                linhas.append(f"{self.nome}{_rotulos(rotulos)} {valor}")
+                continue
+            for limite, acumulado in zip(self.buckets, valor):
+                linhas.append(f"{self.nome}_bucket{_rotulos({**rotulos, 'le': limite})} {acumulado}")
+            linhas.append(f"{self.nome}_bucket{_rotulos({**rotulos, 'le': '+Inf'})} {valor[-2]}")
+            linhas.append(f"{self.nome}_count{_rotulos(rotulos)} {valor[-2]}")
+            linhas.append(f"{self.nome}_sum{_rotulos(rotulos)} {valor[-1]}")
+        return linhas
+
+
+RERUN_SEGUNDOS = _Metrica("bussola_rerun_duration_seconds", "histogram", "Duração do rerun completo por painel, nicho e aba.", BUCKETS_SEGUNDOS)
+ETAPA_SEGUNDOS = _Metrica("bussola_stage_duration_seconds", "histogram", "Duração de cada etapa instrumentada do rerun.", BUCKETS_SEGUNDOS)
+CACHE_CONSULTAS = _Metrica("bussola_cache_requests_total", "counter", "Consultas aos caches do app por resultado (hit/miss).")
+EXPORT_BYTES = _Metrica("bussola_export_bytes", "histogram", "Tamanho dos arquivos exportados (CSV/PDF).", BUCKETS_BYTES)
+DATASET_BYTES = _Metrica("bussola_dataset_bytes", "gauge", "Bytes residentes de cada base carregada no processo.")
+COLUNA_BYTES = _Metrica("bussola_dataset_column_bytes", "gauge", "Memória profunda de cada coluna da base de cada painel/nicho.")
+ECONOMIA_BYTES = _Metrica("bussola_dataset_projected_savings_bytes", "gauge", "Economia projetada convertendo os textos em categoria/string Arrow.")
+METRICAS = (RERUN_SEGUNDOS, ETAPA_SEGUNDOS, CACHE_CONSULTAS, EXPORT_BYTES, DATASET_BYTES, COLUNA_BYTES, ECONOMIA_BYTES)
+
+
+def render_prometheus() -> str:
+    with _lock:
+        linhas = [linha for metrica in METRICAS for linha in metrica.render()]
+    return "\n".join(linhas) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        corpo = render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def _iniciar():
+    """Abre o log e sobe o endpoint na primeira métrica do processo."""
+    if _estado["iniciado"]:
+        return
+    with _lock:
+        if _estado["iniciado"]:
+            return
+        _estado["iniciado"] = True
+
+        if METRICS_DIR:
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                os.path.join(METRICS_DIR, LOG_ARQUIVO), maxBytes=LOG_MAX_BYTES,
+                backupCount=LOG_BACKUPS, encoding='utf-8',
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            log = logging.getLogger("bussola.metricas")
+            log.setLevel(logging.INFO)
+            log.propagate = False
+            log.addHandler(handler)
+            _estado["log"] = log
+
+        if METRICS_PORT:
+            try:
+                servidor = ThreadingHTTPServer(("0.0.0.0", int(METRICS_PORT)), _Handler)
+            except OSError as e:
+                # Vários workers no mesmo host: só o primeiro fica com a porta
+                logger.warning("Endpoint de métricas não iniciado na porta %s: %s", METRICS_PORT, e)
+            else:
+                servidor.daemon_threads = True
+                threading.Thread(target=servidor.serve_forever, name="metricas-prometheus", daemon=True).start()
+                logger.info("Métricas Prometheus em :%s/metrics", METRICS_PORT)
+
+
+def _emitir(evento: dict):
+    if _estado["log"] is not None:
+        evento = {"ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "pid": os.getpid(), **evento}
+        _estado["log"].info(json.dumps(evento, ensure_ascii=False, default=str))
+
+
+# --- Pontos de emissão ---
+
+def record_rerun(trace: dict):
+    """Evento de um rerun concluído, a partir do trace do core.tracing."""
+    if not enabled():
+        return
+    _iniciar()
+    painel, nicho, aba = trace["painel"], trace.get("nicho") or "", trace.get("aba") or ""
+    RERUN_SEGUNDOS.observe(trace["total_ms"] / 1000, painel=painel, nicho=nicho, aba=aba)
+    for etapa in trace["etapas"]:
+        ETAPA_SEGUNDOS.observe(etapa["duracao_ms"] / 1000, painel=painel, etapa=etapa["etapa"])
+        if etapa.get("etapa") in ETAPAS_EXPORT and etapa.get("bytes") is not None:
+            EXPORT_BYTES.observe(etapa["bytes"], painel=painel, formato=ETAPAS_EXPORT[etapa["etapa"]])
+    for cache, contagem in trace["cache"].items():
+        for resultado, n in contagem.items():
+            if n:
+                CACHE_CONSULTAS.inc(n, cache=cache, resultado=resultado)
+
+    _emitir({
+        "evento": "rerun",
+        "painel": painel,
+        "nicho": nicho,
+        "aba": aba,
+        "origem": trace.get("origem"),
+        "total_ms": round(trace["total_ms"], 2),
+        "etapas": [
+            {k: (round(v, 2) if isinstance(v, float) else v) for k, v in etapa.items() if v is not None and k != "inicio_ms"}
+            for etapa in trace["etapas"]
+        ],
+        "cache": trace["cache"],
+    })
+
+
+def record_export(formato: str, n_bytes: int, duracao_ms: float, **rotulos):
+    """Export gerado fora do rerun (ex.: CSV adiado, gerado no clique)."""
+    if not enabled():
+        return
+    _iniciar()
+    EXPORT_BYTES.observe(n_bytes, painel=rotulos.get("painel", ""), formato=formato)
+    _emitir({"evento": "export", "formato": formato, "bytes": n_bytes, "duracao_ms": round(duracao_ms, 2), **rotulos})
+
+
+def record_dataset(arquivo: str, df):
+    """Bytes residentes de uma base recém-carregada (gauge por arquivo)."""
+    if not enabled():
+        return
+    _iniciar()
+    n_bytes = int(df.memory_usage(deep=True).sum())
+    DATASET_BYTES.set(n_bytes, arquivo=arquivo)
+    _emitir({"evento": "dataset", "arquivo": arquivo, "linhas": len(df), "bytes": n_bytes})
+
+
+def record_footprint(dataset: str, tabela, resumo: dict):
+    """Pegada de memória por coluna de uma base (core.footprint)."""
+    if not enabled():
+        return
+    _iniciar()
+    for registro in tabela.itertuples(index=False):
+        COLUNA_BYTES.set(registro.bytes, dataset=dataset, coluna=registro.coluna, dtype=registro.dtype)
+    ECONOMIA_BYTES.set(resumo["economia_projetada"], dataset=dataset)
+    _emitir({
+        "evento": "memoria",
+        "dataset": dataset,
+        **resumo,
+        "colunas": tabela[["coluna", "dtype", "bytes", "cardinalidade", "sugestao", "economia"]].to_dict(orient="records"),
+    })
+
+
+def timed_export(formato: str, gerar, **rotulos):
+    """Chama `gerar()` (que devolve os bytes do arquivo) e registra o export."""
+    inicio = time.perf_counter()
+    dados = gerar()
+    record_export(formato, len(dados), (time.perf_counter() - inicio) * 1000, **rotulos)
+    return dados
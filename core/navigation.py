@@ -0,0 +1,60 @@
+# --- NAVEGAÇÃO POR ABAS (EXECUÇÃO SOB DEMANDA) ---
+import logging
+import time
+
+import streamlit as st
+
+from core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Chave em session_state com a aba que disparou o último rerun
+GATILHO_KEY = "aba_gatilho"
+_TROCA_KEY = "_aba_trocada"
+
+
+def _marcar_troca_de_aba():
+    st.session_state[_TROCA_KEY] = True
+
+
+class _AbaCronometrada:
+    """Container de aba que, aberto, vira uma etapa do trace do rerun."""
+
+    def __init__(self, aba, rotulo: str):
+        self._aba = aba
+        self._rotulo = rotulo
+        self._etapa = None
+
+    def __getattr__(self, nome):
+        return getattr(self._aba, nome)
+
+    def __enter__(self):
+        container = self._aba.__enter__()
+        if self._aba.open:
+            self._etapa = span(f"aba: {self._rotulo}")
+            self._etapa.__enter__()
+        return container
+
+    def __exit__(self, *exc):
+        if self._etapa is not None:
+            self._etapa.__exit__(*exc)
+            self._etapa = None
+        return self._aba.__exit__(*exc)
+
+
+def lazy_tabs(labels: list, key: str = "aba_ativa"):
+    """Cria abas com rastreio de estado para computar apenas a aba visível.
+
+    Cada container retornado expõe `.open`; o corpo de cada aba deve ser
+    protegido por `if tab.open:` para que as abas ocultas não calculem
+    agregações nem figuras. As demais abas são computadas sob demanda,
+    quando o usuário as seleciona.
+    """
+    tabs = st.tabs(labels, key=key, on_change=_marcar_troca_de_aba)
+
+    aba_ativa = st.session_state.get(key) or labels[0]
+    origem = "troca_de_aba" if st.session_state.pop(_TROCA_KEY, False) else "filtros"
+    st.session_state[GATILHO_KEY] = {"aba": aba_ativa, "origem": origem, "em": time.time()}
+    logger.debug("Rerun computando apenas a aba '%s' (origem: %s)", aba_ativa, origem)
+
+    return [_AbaCronometrada(aba, rotulo) for aba, rotulo in zip(tabs, labels)]
@@ -0,0 +1,78 @@
+# --- REGISTRO DE NICHOS (SERVIDOR ÚNICO) ---
+import ast
+import importlib
+import importlib.util
+import re
+import unicodedata
+
+import streamlit as st
+
+# Painéis setoriais de nicho único: o módulo expõe `main()`
+PAINEIS_SETORIAIS = {
+    "Concorrência (Seguros)": {"modulo": "app", "icon": "🎯", "title": "Market Mapping - Concorrência", "path": "competitors_processed.parquet"},
+    "Saúde B2B": {"modulo": "app1", "icon": "🩺", "title": "Market Mapping - Saúde B2B", "path": "leads_saude_processed.parquet"},
+    "Varejo B2B": {"modulo": "app2", "icon": "🛒", "title": "Market Mapping - Varejo B2B", "path": "leads_varejo_processed.parquet"},
+    "Setor de TI": {"modulo": "app3", "icon": "💻", "title": "Market Mapping - Setor de TI", "path": "it_market_processed.parquet"},
+    "Educação": {"modulo": "app4", "icon": "🎓", "title": "Market Mapping - Educação", "path": "education_market_processed.parquet"},
+    "Construção Civil": {"modulo": "app5", "icon": "🏗️", "title": "Market Mapping - Construção Civil", "path": "construction_market_processed.parquet"},
+}
+
+# Hubs multi-nicho: o módulo tem um CONFIG_NICHOS e expõe `render_dashboard(nicho)`
+HUBS = {
+    "app6": "Hub de Inteligência B2B",
+    "app7": "Hub B2B - Engenharia, TI & Varejo",
+}
+
+
+def _slug(texto: str) -> str:
+    texto = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', '-', texto.lower()).strip('-')
+
+
+def _config_nichos(modulo: str) -> dict:
+    """Lê o CONFIG_NICHOS do código-fonte do hub sem importar o módulo.
+
+    O dicionário é só de literais, então o `ast` basta: o registro é
+    montado sem pagar o import (e o set_page_config) de cada hub.
+    """
+    origem = importlib.util.find_spec(modulo).origin
+    with open(origem, encoding='utf-8') as f:
+        arvore = ast.parse(f.read(), filename=origem)
+    for no in arvore.body:
+        if isinstance(no, ast.Assign) and any(getattr(alvo, 'id', None) == 'CONFIG_NICHOS' for alvo in no.targets):
+            return ast.literal_eval(no.value)
+    raise LookupError(f"CONFIG_NICHOS não encontrado em {origem}")
+
+
+@st.cache_resource(show_spinner=False)
+def niche_registry() -> dict:
+    """Registro de todos os painéis, agrupado por seção de navegação.
+
+    Cada entrada traz o módulo que a renderiza e, nos hubs, o nicho do
+    CONFIG_NICHOS. Os módulos só são importados quando a página é aberta.
+    """
+    registro = {"Painéis Setoriais": {}}
+    for nome, painel in PAINEIS_SETORIAIS.items():
+        registro["Painéis Setoriais"][f"{painel['modulo']}-{_slug(nome)}"] = {**painel, "nicho": None}
+
+    for modulo, secao in HUBS.items():
+        registro[secao] = {
+            f"{modulo}-{_slug(nicho)}": {"modulo": modulo, "nicho": nicho, "icon": cfg["icon"], "title": nicho, "path": cfg["path"]}
+            for nicho, cfg in _config_nichos(modulo).items()
+        }
+    return registro
+
+
+def dataset_files() -> list:
+    """Arquivos parquet usados por algum painel (sem repetição)."""
+    arquivos = {entrada["path"] for entradas in niche_registry().values() for entrada in entradas.values()}
+    return sorted(arquivos)
+
+
+def render_niche(entrada: dict):
+    """Importa o módulo do painel (na primeira visita) e o renderiza."""
+    modulo = importlib.import_module(entrada["modulo"])
+    if entrada["nicho"] is None:
+        modulo.main()
+    else:
+        modulo.render_dashboard(entrada["nicho"])
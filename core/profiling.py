@@ -0,0 +1,76 @@
+# --- PERFIL SOB DEMANDA DE UM RERUN (cProfile, ?profile=1) ---
+import cProfile
+import io
+import marshal
+import pstats
+import time
+
+import streamlit as st
+
+# Query param que liga a captura (?profile=1)
+PROFILE_PARAM = "profile"
+# Chave em session_state com o perfil do último rerun capturado (um por sessão)
+PERFIL_KEY = "perfil_rerun"
+_EM_CAPTURA_KEY = "_perfil_em_captura"
+TOP_FUNCOES = 25
+
+
+def profile_enabled() -> bool:
+    return st.query_params.get(PROFILE_PARAM) == "1"
+
+
+def profiled_call(funcao, *args, **kwargs):
+    """Executa `funcao` sob o cProfile e guarda o perfil na sessão.
+
+    A sessão guarda só o perfil do rerun mais recente (o anterior é
+    descartado) e nunca abre duas capturas ao mesmo tempo: um fragmento
+    ou rerun aninhado durante a captura roda sem perfil.
+    """
+    if st.session_state.get(_EM_CAPTURA_KEY):
+        return funcao(*args, **kwargs)
+
+    perfil = cProfile.Profile()
+    try:
+        perfil.enable()
+    except ValueError:
+        # Outro profiler já ativo nesta thread (ex.: depurador): não captura
+        return funcao(*args, **kwargs)
+
+    st.session_state[_EM_CAPTURA_KEY] = True
+    inicio = time.perf_counter()
+    try:
+        return funcao(*args, **kwargs)
+    finally:
+        perfil.disable()
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        st.session_state.pop(_EM_CAPTURA_KEY, None)
+        perfil.create_stats()
+        # Mesmo formato do `pstats.Stats.dump_stats`: abre no snakeviz/pstats.
+        # Serializado antes do pstats.Stats, que esvazia `perfil.stats`.
+        prof = marshal.dumps(perfil.stats)
+
+        resumo = io.StringIO()
+        pstats.Stats(perfil, stream=resumo).strip_dirs().sort_stats('cumulative').print_stats(TOP_FUNCOES)
+        st.session_state[PERFIL_KEY] = {
+            "quando": time.strftime("%Y%m%d-%H%M%S"),
+            "duracao_ms": duracao_ms,
+            "prof": prof,
+            "resumo": resumo.getvalue(),
+        }
+
+
+def render_profile_panel(painel: str):
+    """Botão de download do perfil do último rerun (só com ?profile=1)."""
+    perfil = st.session_state.get(PERFIL_KEY)
+    if perfil is None:
+        return
+
+    with st.sidebar.expander("🔬 Perfil do rerun (cProfile)", expanded=True):
+        st.caption(f"Último rerun: {perfil['duracao_ms']:.0f} ms. Abra com `snakeviz arquivo.prof` ou `python -m pstats`.")
+        # on_click="ignore": baixar não dispara um rerun (que trocaria o perfil)
+        st.download_button(
+            "⬇️ Baixar perfil (.prof)", data=perfil["prof"],
+            file_name=f"perfil_{painel}_{perfil['quando']}.prof",
+            mime="application/octet-stream", on_click="ignore", use_container_width=True,
+        )
+        st.code(perfil["resumo"], language=None)
@@ -0,0 +1,35 @@
+# --- SELEÇÃO TOP-K (LISTAS DE LEADS SEM ORDENAR O RECORTE INTEIRO) ---
+# As listas e dossiês mostram as 15-100 maiores contas do recorte. Em vez
+# de ordenar milhões de linhas para ficar com poucas, o argpartition acha
+# em O(n) o valor de corte da primeira chave e só os candidatos até ele
+# (no mínimo k linhas, mais os empates) passam pela ordenação completa.
+import numpy as np
+import pandas as pd
+
+
+def top_k(df: pd.DataFrame, por, k: int, ascending=False) -> pd.DataFrame:
+    """Mesmo resultado de `df.sort_values(por, ascending=ascending).head(k)`.
+
+    Nulos vão para o fim, como no pandas, e empates em todas as chaves
+    mantêm a ordem do recorte (ordenação estável). Se a primeira chave
+    não for numérica, cai na ordenação completa.
+    """
+    por = [por] if isinstance(por, str) else list(por)
+    ordens = [ascending] * len(por) if isinstance(ascending, bool) else list(ascending)
+
+    def ordenar(frame):
+        return frame.sort_values(by=por, ascending=ordens, kind='stable').head(k)
+
+    if k <= 0:
+        return df.iloc[:0]
+    if len(df) <= k or not pd.api.types.is_numeric_dtype(df[por[0]].dtype):
+        return ordenar(df)
+
+    chave = df[por[0]].to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+    if not ordens[0]:
+        chave = -chave
+    chave[np.isnan(chave)] = np.inf
+    corte = np.partition(chave, k - 1)[k - 1]
+    # Quem está depois do corte na primeira chave não entra; os empates no corte
+    # seguem para a ordenação, que desempata pelas demais chaves
+    return ordenar(df.iloc[np.flatnonzero(chave <= corte)])
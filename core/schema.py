@@ -0,0 +1,211 @@
+# --- ESQUEMA DE SERVIÇO DAS BASES (TIPOS COMPACTOS E IDADE NA CARGA) ---
+# O ETL grava DDD/telefone como inteiros com máscara de nulos (não mais
+# float com NaN), a data de início como date32 e não grava idades: a idade
+# é calculada na carga a partir de uma data de referência (hoje), então
+# nunca fica defasada entre um ETL e outro. Textos são strings Arrow da
+# leitura ao export: `.str.*` roda nos kernels do pyarrow.compute. O
+# contato formatado, o e-mail principal e a qualidade do contato também
+# saem do ETL, vetorizados, em vez de linha a linha em cada rerun, assim
+# como a raiz do CNPJ (grupo econômico) e a flag de matriz. O CNPJ é um
+# uint64 (14 dígitos; 0 = sem CNPJ) e o arquivo sai ordenado por ele, o
+# que faz da própria coluna um índice para `searchsorted` (core.keys).
+#
+# ETL:   df = sort_by_cnpj(with_cnpj_keys(with_contact_fields(compact_schema(df))))   (antes do to_parquet)
+# Carga: df = with_ages(compact_schema(df))                                           (core.datasets)
+# Exibição/export: with_cnpj_text(df)  (CNPJ de volta a texto com 14 dígitos)
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+COLUNA_DATA = "data_inicio_atividade"
+COLUNA_IDADE = "idade_empresa_anos"
+# Idades congeladas que o ETL antigo gravava (`idade` nas bases de saúde/varejo)
+IDADES_GRAVADAS = (COLUNA_IDADE, "idade")
+# Contatos numéricos da RFB: inteiros sem sinal anuláveis, no menor tamanho que couber
+INTEIROS_ANULAVEIS = ("ddd_1", "telefone_1", "ddd_2", "telefone_2")
+TIPO_DATA = pd.ArrowDtype(pa.date32())
+# Atributo do DataFrame com a data de referência das idades
+REFERENCIA_ATTR = "data_referencia"
+# Textos de alta cardinalidade: sempre string Arrow, mesmo quando a leitura
+# não os traz como `object` de strings (coluna toda nula, large_string do parquet)
+COLUNAS_TEXTO = (
+    "razao_social", "nome_fantasia_final", "email_contato", "bairro", "municipio",
+    "tipo_logradouro", "logradouro", "complemento",
+)
+# Campos de contato derivados no ETL (with_contact_fields)
+CONTATO_FORMATADO = "contato_formatado"
+EMAIL_PRINCIPAL = "email_principal"
+QUALIDADE_CONTATO = "qualidade_contato"
+SCORE_CONTATO = "score_contato"
+QUALIDADES_CONTATO = ('Ouro (Tel+Email)', 'Prata (Telefone)', 'Bronze (Email)', 'Sem Contato')
+SCORES_CONTATO = dict(zip(QUALIDADES_CONTATO, (2, 1, 1, 0)))
+# CNPJ inteiro (uint64) e chaves do grupo econômico (with_cnpj_keys): raiz de 8 dígitos e matriz (ordem 0001)
+COLUNA_CNPJ = "cnpj_completo"
+CNPJ_RAIZ = "cnpj_raiz"
+IS_MATRIZ = "is_matriz"
+# Row groups pequenos: buscar contatos de poucas linhas (core.datasets.with_details)
+# descomprime só os grupos que as contêm, não a base inteira
+LINHAS_POR_GRUPO = 64 * 1024
+
+
+def _tipo_texto():
+    # O `str` do pandas 3 (string Arrow, NaN como nulo); no 2.x o mesmo tipo se chama 'pyarrow_numpy'
+    try:
+        return pd.StringDtype("pyarrow", na_value=np.nan)
+    except TypeError:
+        return pd.StringDtype("pyarrow_numpy")
+
+
+TIPO_TEXTO = _tipo_texto()
+
+
+def _menor_uint(valores: pd.Series) -> str:
+    maximo = valores.max()
+    for dtype in ('UInt8', 'UInt16', 'UInt32'):
+        if pd.isna(maximo) or maximo <= np.iinfo(dtype.lower()).max:
+            return dtype
+    return 'UInt64'
+
+
+def compact_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Tipos do esquema de serviço. Idempotente: o ETL chama antes de gravar
+    e a carga chama de novo, o que também converte bases geradas por ETLs
+    antigos (custo zero quando a base já está no esquema).
+    """
+    # Cast por coluna, sem mexer no `future.infer_string` do processo (API, ETL e testes importam este módulo)
+    textos = [c for c in df.columns if df[c].dtype != TIPO_TEXTO and (
+        c in COLUNAS_TEXTO or (df[c].dtype == object and pd.api.types.infer_dtype(df[c], skipna=True) == "string"))]
+    if textos:
+        df = df.astype({c: TIPO_TEXTO for c in textos})
+
+    tipos = {}
+    for coluna in INTEIROS_ANULAVEIS:
+        if coluna in df.columns and not pd.api.types.is_unsigned_integer_dtype(df[coluna].dtype):
+            tipos[coluna] = _menor_uint(pd.to_numeric(df[coluna], errors='coerce'))
+    if tipos:
+        df = df.assign(**{c: pd.to_numeric(df[c], errors='coerce').astype(t) for c, t in tipos.items()})
+
+    if COLUNA_CNPJ in df.columns and df[COLUNA_CNPJ].dtype != np.uint64:
+        df = df.assign(**{COLUNA_CNPJ: cnpj_integers(df[COLUNA_CNPJ])})
+
+    if COLUNA_DATA in df.columns:
+        if df[COLUNA_DATA].dtype != TIPO_DATA:
+            datas = pd.to_datetime(df[COLUNA_DATA], errors='coerce')
+            df = df.assign(**{COLUNA_DATA: datas.astype(TIPO_DATA)})
+        # Com a data em mãos a idade sai na carga; a gravada só ocuparia espaço
+        gravadas = [c for c in IDADES_GRAVADAS if c in df.columns]
+        if gravadas:
+            df = df.drop(columns=gravadas)
+    elif COLUNA_IDADE not in df.columns and "idade" in df.columns:
+        df = df.rename(columns={"idade": COLUNA_IDADE})
+    return df
+
+
+def format_phones(ddd: pd.Series, telefone: pd.Series) -> pd.Series:
+    """'(DD) XXXX-XXXX' / '(DD) XXXXX-XXXX'; sem DDD, o número cru; nulo sem telefone."""
+    tel = telefone.astype(TIPO_TEXTO)
+    hifenizado = tel.str.replace(r'^(\d{4,5})(\d{4})$', r'\1-\2', regex=True)
+    return ('(' + ddd.astype(TIPO_TEXTO) + ') ' + hifenizado).fillna(tel)
+
+
+def primary_emails(emails: pd.Series) -> pd.Series:
+    """Primeiro e-mail da lista (a RFB separa por vírgula), aparado e em minúsculas."""
+    principal = emails.astype(TIPO_TEXTO).str.replace(r'\s*,.*$', '', regex=True).str.strip().str.lower()
+    return principal.mask(principal == '')
+
+
+def with_contact_fields(df: pd.DataFrame) -> pd.DataFrame:
+    """Contato formatado, e-mail principal e qualidade do contato (tier e score).
+
+    Idempotente: calcula só os campos que faltam e para os quais há os
+    contatos crus (ddd_1/telefone_1/email_contato). Tier e score são
+    independentes: um tier já gravado nunca é recalculado, e o score
+    ausente sai dele. O ETL chama sobre a base inteira; bases antigas
+    passam por aqui na carga.
+    """
+    novas = {}
+    if EMAIL_PRINCIPAL not in df.columns and "email_contato" in df.columns:
+        novas[EMAIL_PRINCIPAL] = primary_emails(df["email_contato"])
+    if CONTATO_FORMATADO not in df.columns and {"ddd_1", "telefone_1"} <= set(df.columns):
+        novas[CONTATO_FORMATADO] = format_phones(df["ddd_1"], df["telefone_1"])
+    if QUALIDADE_CONTATO not in df.columns and ("telefone_1" in df.columns or "email_contato" in df.columns):
+        emails = novas.get(EMAIL_PRINCIPAL, df.get(EMAIL_PRINCIPAL))
+        tel = df["telefone_1"].notna().to_numpy() if "telefone_1" in df.columns else np.zeros(len(df), bool)
+        email = emails.notna().to_numpy() if emails is not None else np.zeros(len(df), bool)
+        novas[QUALIDADE_CONTATO] = pd.Series(
+            np.select([tel & email, tel, email], QUALIDADES_CONTATO[:3], QUALIDADES_CONTATO[3]), index=df.index, dtype=TIPO_TEXTO)
+    qualidade = novas.get(QUALIDADE_CONTATO, df.get(QUALIDADE_CONTATO))
+    if SCORE_CONTATO not in df.columns and qualidade is not None:
+        # O score sai do tier (gravado ou recém-calculado): Ouro 2, Prata/Bronze 1, sem contato 0
+        novas[SCORE_CONTATO] = qualidade.map(SCORES_CONTATO).fillna(0).to_numpy(dtype=np.uint8)
+    return df.assign(**novas) if novas else df
+
+
+def cnpj_integers(cnpj: pd.Series) -> np.ndarray:
+    """CNPJ em texto (com ou sem máscara) como uint64 de 14 dígitos; 0 se ausente ou inválido."""
+    digitos = cnpj.astype(TIPO_TEXTO).str.replace(r'\D', '', regex=True)
+    # float64 é exato até 2^53, folgado para 14 dígitos
+    numero = pd.to_numeric(digitos.mask(digitos == ''), errors='coerce')
+    return numero.where(numero < 1e14).fillna(0).to_numpy().astype(np.uint64)
+
+
+def cnpj_text(cnpj: pd.Series) -> pd.Series:
+    """CNPJ inteiro de volta a texto: 14 dígitos com os zeros à esquerda; nulo se 0."""
+    return cnpj.astype(TIPO_TEXTO).str.zfill(14).mask(cnpj.to_numpy() == 0)
+
+
+def with_cnpj_text(df: pd.DataFrame) -> pd.DataFrame:
+    """Cópia para exibição/export com o CNPJ em texto (tabelas, PDF e CSV)."""
+    if COLUNA_CNPJ not in df.columns or df[COLUNA_CNPJ].dtype != np.uint64:
+        return df
+    return df.assign(**{COLUNA_CNPJ: cnpj_text(df[COLUNA_CNPJ])})
+
+
+def with_cnpj_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """Raiz do CNPJ (8 dígitos, UInt32) e `is_matriz` (ordem 0001); filial é o contrário.
+
+    A raiz identifica o grupo econômico mesmo quando as filiais têm razão
+    social grafada de outro jeito. Idempotente; CNPJ inválido fica sem raiz.
+    """
+    if CNPJ_RAIZ in df.columns or COLUNA_CNPJ not in df.columns:
+        return df
+    cnpj = df[COLUNA_CNPJ]
+    cnpj = cnpj.to_numpy() if cnpj.dtype == np.uint64 else cnpj_integers(cnpj)
+    raiz = (cnpj // 1_000_000).astype(np.uint32)
+    return df.assign(**{
+        CNPJ_RAIZ: pd.arrays.IntegerArray(raiz, mask=cnpj == 0),
+        IS_MATRIZ: (cnpj // 100) % 10_000 == 1,
+    })
+
+
+def sort_by_cnpj(df: pd.DataFrame) -> pd.DataFrame:
+    """Base ordenada pelo CNPJ, como o ETL grava: a coluna vira um índice ordenado."""
+    if COLUNA_CNPJ not in df.columns:
+        return df
+    return df.iloc[np.argsort(df[COLUNA_CNPJ].to_numpy(), kind='stable')].reset_index(drop=True)
+
+
+def company_ages(datas: pd.Series, referencia: date) -> np.ndarray:
+    """Idade em anos (1 casa, float32) de cada data de início; NaN sem data."""
+    dias = pa.array(datas).cast(pa.int32()).to_numpy(zero_copy_only=False)
+    idade = (np.int32((referencia - date(1970, 1, 1)).days) - dias) / 365.25
+    return np.round(idade, 1).astype(np.float32)
+
+
+def with_ages(df: pd.DataFrame, referencia: date = None) -> pd.DataFrame:
+    """Recalcula `idade_empresa_anos` a partir da data de início.
+
+    Sem `referencia`, vale a data de hoje. Bases sem a data (ETL antigo)
+    mantêm a idade gravada, só que em float32.
+    """
+    if COLUNA_DATA not in df.columns:
+        if COLUNA_IDADE in df.columns and df[COLUNA_IDADE].dtype != np.float32:
+            df[COLUNA_IDADE] = df[COLUNA_IDADE].astype(np.float32)
+        return df
+
+    referencia = referencia or date.today()
+    df[COLUNA_IDADE] = company_ages(df[COLUNA_DATA], referencia)
+    df.attrs[REFERENCIA_ATTR] = referencia.isoformat()
+    return df
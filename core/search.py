@@ -0,0 +1,311 @@
+# --- BUSCA DE EMPRESAS POR NOME (ÍNDICE INVERTIDO DE TRIGRAMAS) ---
+# O ETL normaliza a razão social (sem acentos, maiúsculas, só letras e
+# dígitos) e grava, ao lado de cada .parquet, um índice invertido
+# trigrama -> linhas em arrays .npy. Os painéis e a API abrem esses
+# arrays com mmap: nada é carregado na RAM até a consulta, e as páginas
+# ficam no page cache compartilhado entre workers. Uma consulta cruza só
+# as listas dos trigramas dela, da mais rara para a mais comum, e
+# ranqueia pela fração dos trigramas da consulta presentes no nome. As
+# colunas exibidas vão num Arrow sem compressão, também mapeado.
+#
+# ETL:      build_name_index(df, OUTPUT_FILE)   (depois do to_parquet ordenado)
+# Avulso:   python -m core.search --construir leads_saude_processed.parquet ...
+# Consulta: search_names("clinica sao lucas", [caminhos dos parquet])
+import argparse
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import streamlit as st
+
+from core.datasets import ROW_ID, data_version
+from core.schema import compact_schema
+from core.tracing import cache_miss, span
+
+logger = logging.getLogger(__name__)
+
+# Alfabeto do nome normalizado: espaço, dígitos e letras; um trigrama cabe em 37^3 códigos
+ALFABETO = " 0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+N_TRIGRAMAS = len(ALFABETO) ** 3
+COLUNA_NOME = "razao_social"
+# Sufixo da pasta do índice, ao lado do .parquet
+SUFIXO_INDICE = ".busca"
+# Nomes por bloco na construção: limita a memória dos pares (trigrama, linha)
+LINHAS_POR_BLOCO = 256 * 1024
+# Fração mínima dos trigramas da consulta que o nome precisa conter
+COBERTURA_MINIMA = 0.6
+# Colunas exibidas de cada empresa encontrada (lidas do arquivo só para elas)
+COLUNAS_RESULTADO = ["razao_social", "cnpj_completo", "uf", "municipio"]
+# Linhas por janela do contador das consultas de palavras comuns: o contador
+# (1 byte por linha) fica do tamanho da cache do processador, não do arquivo
+LINHAS_POR_JANELA = 1024 * 1024
+
+_CODIGOS = np.zeros(256, dtype=np.int32)
+_CODIGOS[np.frombuffer(ALFABETO.encode('ascii'), dtype=np.uint8)] = np.arange(len(ALFABETO))
+
+
+def normalize_names(nomes) -> pa.Array:
+    """Nomes sem acentos, em maiúsculas, com só letras/dígitos e um espaço
+    entre as palavras, mais um espaço nas pontas (trigramas de início e fim
+    de palavra). Nulo vira nome vazio."""
+    if isinstance(nomes, pa.ChunkedArray):
+        nomes = nomes.combine_chunks()
+    elif not isinstance(nomes, pa.Array):
+        nomes = pa.array(nomes, type=pa.string())
+    texto = pc.utf8_normalize(pc.cast(nomes, pa.string()).fill_null(""), "NFKD")
+    texto = pc.replace_substring_regex(pc.utf8_upper(texto), r"[^\x00-\x7f]", "")
+    texto = pc.utf8_trim_whitespace(pc.replace_substring_regex(texto, r"[^A-Z0-9]+", " "))
+    return pc.binary_join_element_wise(" ", texto, " ", "")
+
+
+def _trigramas(normalizados: pa.Array, primeira_linha: int = 0) -> tuple:
+    """Pares distintos (trigrama, linha), ordenados por trigrama e depois linha."""
+    # Cópia contígua (offset 0): os buffers são lidos direto
+    normalizados = pa.concat_arrays([normalizados.cast(pa.string())])
+    n = len(normalizados)
+    offsets = np.frombuffer(normalizados.buffers()[1], dtype=np.int32)[:n + 1]
+    dados = normalizados.buffers()[2]
+    codigos = _CODIGOS[np.frombuffer(dados, dtype=np.uint8)] if dados is not None else np.zeros(0, np.int32)
+
+    # Offsets de string Arrow são int32: posições do bloco cabem em int32
+    por_nome = np.maximum(np.diff(offsets) - 2, 0)
+    total = int(por_nome.sum())
+    posicoes = np.repeat(offsets[:-1] - (np.cumsum(por_nome, dtype=np.int32) - por_nome), por_nome) + np.arange(total, dtype=np.int32)
+    trigrama = (codigos[posicoes] * len(ALFABETO) + codigos[posicoes + 1]) * len(ALFABETO) + codigos[posicoes + 2]
+    del posicoes
+
+    # Chave única (trigrama, linha) numa só ordenação de uint64
+    pares = trigrama.astype(np.uint64) << np.uint64(32)
+    del trigrama
+    pares |= np.repeat(np.arange(primeira_linha, primeira_linha + n, dtype=np.uint64), por_nome)
+    # sort + vizinhos diferentes: o np.unique do numpy 2.x passa por hash e é várias vezes mais lento aqui
+    pares.sort()
+    pares = pares[np.concatenate([[True], pares[1:] != pares[:-1]])]
+    return (pares >> np.uint64(32)).astype(np.int64), (pares & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+
+def index_path(file_path: str) -> str:
+    """Pasta do índice de nomes de uma base: `base.parquet` -> `base.busca/`."""
+    return os.path.splitext(file_path)[0] + SUFIXO_INDICE
+
+
+def _tabela(base) -> pa.Table:
+    if isinstance(base, pd.DataFrame):
+        colunas = [c for c in COLUNAS_RESULTADO if c in base.columns]
+        return pa.Table.from_pandas(base[colunas], preserve_index=False)
+    return base.select([c for c in COLUNAS_RESULTADO if c in base.column_names])
+
+
+def build_name_index(base, file_path: str) -> dict:
+    """Grava o índice de nomes de `base` (DataFrame ou tabela Arrow, na ordem de `file_path`).
+
+    Três arrays .npy: `inicios` (posição da lista de cada trigrama, CSR),
+    `linhas` (ids das linhas, crescentes dentro de cada lista) e
+    `tamanhos` (trigramas distintos de cada nome); e `exibicao.arrow`,
+    as COLUNAS_RESULTADO sem compressão, para montar o resultado sem
+    descomprimir o .parquet. O `meta.json` sai por último e amarra o
+    índice ao arquivo (linhas e bytes do .parquet).
+    """
+    tabela = _tabela(base)
+    nomes = tabela.column(COLUNA_NOME)
+    n = len(nomes)
+    blocos, contagens = [], np.zeros(N_TRIGRAMAS, dtype=np.int64)
+    tamanhos = np.zeros(n, dtype=np.uint16)
+    for inicio in range(0, n, LINHAS_POR_BLOCO):
+        trigrama, linhas = _trigramas(normalize_names(nomes.slice(inicio, LINHAS_POR_BLOCO)), inicio)
+        contagem = np.bincount(trigrama, minlength=N_TRIGRAMAS)
+        contagens += contagem
+        tamanhos[inicio:inicio + LINHAS_POR_BLOCO] = np.bincount(linhas - inicio, minlength=min(LINHAS_POR_BLOCO, n - inicio)).clip(max=np.iinfo(np.uint16).max)
+        blocos.append((contagem, linhas))
+
+    destino = index_path(file_path)
+    os.makedirs(destino, exist_ok=True)
+    inicios = np.concatenate([[0], np.cumsum(contagens)]).astype(np.int64)
+    postagens = np.lib.format.open_memmap(os.path.join(destino, "linhas.npy.tmp"), mode='w+', dtype=np.uint32, shape=(int(inicios[-1]),))
+    cursor = inicios[:-1].copy()
+    # Blocos em ordem de linha: cada lista continua crescente ao juntar os blocos
+    for contagem, linhas in blocos:
+        inicio_bloco = np.concatenate([[0], np.cumsum(contagem)[:-1]])
+        trigrama = np.repeat(np.arange(N_TRIGRAMAS), contagem)
+        postagens[cursor[trigrama] + np.arange(linhas.size) - inicio_bloco[trigrama]] = linhas
+        cursor += contagem
+    postagens.flush()
+    del postagens, blocos
+
+    os.replace(os.path.join(destino, "linhas.npy.tmp"), os.path.join(destino, "linhas.npy"))
+    for nome, array in (("inicios", inicios), ("tamanhos", tamanhos)):
+        np.save(os.path.join(destino, f"{nome}.tmp.npy"), array)
+        os.replace(os.path.join(destino, f"{nome}.tmp.npy"), os.path.join(destino, f"{nome}.npy"))
+    with pa.OSFile(os.path.join(destino, "exibicao.arrow.tmp"), 'wb') as f:
+        with pa.ipc.new_file(f, tabela.schema) as escritor:
+            escritor.write_table(tabela.combine_chunks())
+    os.replace(os.path.join(destino, "exibicao.arrow.tmp"), os.path.join(destino, "exibicao.arrow"))
+
+    meta = {"linhas": n, "postagens": int(inicios[-1]), "bytes_parquet": os.path.getsize(file_path) if os.path.exists(file_path) else None}
+    with open(os.path.join(destino, "meta.json.tmp"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(os.path.join(destino, "meta.json.tmp"), os.path.join(destino, "meta.json"))
+    return meta
+
+
+@st.cache_resource(ttl=3600, max_entries=32, show_spinner=False)
+def _abrir_indice(file_path: str, versao: str):
+    """Arrays e colunas de exibição mapeados (somente leitura), ou None se ausente/defasado."""
+    cache_miss("indice_nomes")
+    destino = index_path(file_path)
+    try:
+        with open(os.path.join(destino, "meta.json"), encoding='utf-8') as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        logger.warning("%s sem índice de nomes; rode o ETL ou `python -m core.search --construir`", file_path)
+        return None
+    if meta["linhas"] != pq.ParquetFile(file_path).metadata.num_rows or meta.get("bytes_parquet") not in (None, os.path.getsize(file_path)):
+        logger.warning("Índice de nomes de %s é de outra versão da base; reconstrua-o", file_path)
+        return None
+    arrays = tuple(np.load(os.path.join(destino, f"{nome}.npy"), mmap_mode='r') for nome in ("inicios", "linhas", "tamanhos"))
+    exibicao = pa.ipc.open_file(pa.memory_map(os.path.join(destino, "exibicao.arrow"), 'r')).read_all()
+    return arrays + (exibicao,)
+
+
+def _consulta(texto: str) -> np.ndarray:
+    trigrama, _ = _trigramas(normalize_names([texto]))
+    return np.unique(trigrama)
+
+
+def _contidos(lista: np.ndarray, valores: np.ndarray) -> np.ndarray:
+    """Máscara de `valores` presentes na lista crescente `lista`."""
+    if not lista.size:
+        return np.zeros(valores.size, dtype=bool)
+    return lista[np.minimum(np.searchsorted(lista, valores), lista.size - 1)] == valores
+
+
+def _contar(listas: list, inicio: int, fim: int, q: int) -> np.ndarray:
+    """Quantos dos trigramas da consulta cada linha de [inicio, fim) tem."""
+    contagem = np.zeros(fim - inicio, dtype=np.uint8 if q < 256 else np.uint16)
+    cheias = 0
+    for lista in listas:
+        # Listas crescentes: o trecho da janela sai de duas buscas binárias (no dtype da
+        # lista: com outro, o numpy converteria a lista inteira antes de buscar)
+        a, b = np.searchsorted(lista, np.array([inicio, fim], dtype=lista.dtype))
+        if b - a == fim - inicio:
+            # Trigrama presente em todas as linhas (ex.: o sufixo do nicho) soma 1 para todas sem varrer a lista
+            cheias += 1
+        elif b > a:
+            contagem[lista[a:b] - np.uint32(inicio)] += 1
+    return contagem + cheias if cheias else contagem
+
+
+def _melhores(candidatos: np.ndarray, acertos: np.ndarray, q: int, tamanhos: np.ndarray, limite: int) -> tuple:
+    """(linhas, acertos) dos `limite` candidatos de maior cobertura; entre iguais, o nome mais parecido."""
+    if candidatos.size > limite:
+        jaccard = acertos / (q + tamanhos[candidatos].astype(np.int32) - acertos)
+        # A cobertura anda em passos de 1/q: o Jaccard em milésimos só desempata
+        melhores = np.argpartition(-(acertos / q + jaccard * 1e-3), limite - 1)[:limite]
+        candidatos, acertos = candidatos[melhores], acertos[melhores]
+    return candidatos, acertos
+
+
+def _buscar_no_indice(indice: tuple, trigramas: np.ndarray, limite: int) -> tuple:
+    """(linhas, cobertura, semelhança) dos `limite` melhores nomes de um arquivo."""
+    inicios, postagens, tamanhos = indice[:3]
+    listas = sorted((postagens[inicios[t]:inicios[t + 1]] for t in trigramas), key=len)
+    n, q = tamanhos.size, len(listas)
+    minimo = max(1, int(np.ceil(q * COBERTURA_MINIMA)))
+    # Listas mais raras que bastam para achar quem tem `minimo` trigramas (pigeonhole)
+    raras = listas[:q - minimo + 1]
+
+    candidatos = None
+    if listas[0].size <= n // 64:
+        # Consulta seletiva: interseção a partir da lista mais rara, O(rara x q x log n)
+        candidatos = listas[0]
+        for lista in listas[1:]:
+            candidatos = candidatos[_contidos(lista, candidatos)]
+        acertos = np.full(candidatos.size, q, dtype=np.int32)
+        if candidatos.size < limite:
+            candidatos = None
+            if sum(lista.size for lista in raras) <= n // 8:
+                # Poucos exatos (erro de digitação, palavra a mais): quem tem `minimo` trigramas
+                # contém ao menos uma das listas raras
+                candidatos = np.concatenate(raras)
+                candidatos.sort()
+                candidatos = candidatos[np.concatenate([[True], candidatos[1:] != candidatos[:-1]])] if candidatos.size else candidatos
+                acertos = np.zeros(candidatos.size, dtype=np.int32)
+                for lista in listas:
+                    acertos += _contidos(lista, candidatos)
+                fica = acertos >= minimo
+                candidatos, acertos = candidatos[fica], acertos[fica]
+
+    if candidatos is None:
+        # Só palavras comuns: um contador por linha sai mais barato que cruzar listas longas. Janela
+        # a janela, ficam só os `limite` melhores de cada uma: a memória não cresce com o arquivo
+        partes, exatos = [], 0
+        for inicio in range(0, n, LINHAS_POR_JANELA):
+            contagem = _contar(listas, inicio, min(n, inicio + LINHAS_POR_JANELA), q)
+            linhas = np.flatnonzero(contagem == q)
+            exatos += linhas.size
+            if exatos < limite:
+                # Até aqui, poucos com todos os trigramas: entram os que têm `minimo`
+                linhas = np.flatnonzero(contagem >= minimo)
+            partes.append(_melhores(linhas + inicio, contagem[linhas].astype(np.int32), q, tamanhos, limite))
+        candidatos = np.concatenate([linhas for linhas, _ in partes])
+        acertos = np.concatenate([acertos for _, acertos in partes])
+
+    # Cobertura da consulta primeiro; entre iguais, o nome mais parecido (Jaccard dos trigramas)
+    candidatos, acertos = _melhores(candidatos, acertos, q, tamanhos, limite)
+    return candidatos, acertos / q, acertos / (q + tamanhos[candidatos].astype(np.int32) - acertos)
+
+
+def search_names(consulta: str, caminhos, limite: int = 20) -> pd.DataFrame:
+    """Empresas cujo nome casa com `consulta`, ranqueadas entre todas as bases.
+
+    Cada linha traz o arquivo, a posição no arquivo (ROW_ID), a relevância
+    (0 a 1, fração dos trigramas da consulta no nome), a semelhança do
+    nome inteiro com a consulta (Jaccard dos trigramas, desempate) e as
+    COLUNAS_RESULTADO, tiradas do `exibicao.arrow` mapeado. Bases sem
+    índice (ou com índice de outra versão) ficam de fora.
+    """
+    colunas = ["arquivo", ROW_ID, "relevancia", "semelhanca"]
+    vazio = pd.DataFrame(columns=colunas + COLUNAS_RESULTADO)
+    trigramas = _consulta(consulta)
+    if not trigramas.size:
+        return vazio
+
+    with span("busca_nomes", cache="indice_nomes") as etapa:
+        achados = []
+        for caminho in caminhos:
+            indice = _abrir_indice(caminho, data_version(caminho))
+            if indice is None:
+                continue
+            linhas, cobertura, jaccard = _buscar_no_indice(indice, trigramas, limite)
+            if linhas.size:
+                exibicao = compact_schema(indice[3].take(pa.array(linhas)).to_pandas())
+                achados.append(pd.concat([
+                    pd.DataFrame({"arquivo": caminho, ROW_ID: linhas, "relevancia": cobertura, "semelhanca": jaccard}), exibicao,
+                ], axis=1))
+        if not achados:
+            return vazio
+        resultado = pd.concat(achados, ignore_index=True).sort_values(
+            ["relevancia", "semelhanca", "arquivo", ROW_ID], ascending=[False, False, True, True], kind='stable',
+        ).head(limite).reset_index(drop=True)
+        etapa.linhas = len(resultado)
+    return resultado[colunas + [c for c in COLUNAS_RESULTADO if c in resultado.columns]]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--construir', nargs='+', required=True, metavar="PARQUET", help="bases cujo índice de nomes (re)construir")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    for caminho in args.construir:
+        colunas = [c for c in COLUNAS_RESULTADO if c in pq.read_schema(caminho).names]
+        meta = build_name_index(pq.read_table(caminho, columns=colunas), caminho)
+        logger.info("Índice de nomes de %s: %s linhas, %s postagens", caminho, meta["linhas"], meta["postagens"])
+
+
+if __name__ == "__main__":
+    main()
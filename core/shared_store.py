@@ -0,0 +1,195 @@
+# --- STORE DE BASES EM MEMÓRIA COMPARTILHADA (VÁRIOS WORKERS POR HOST) ---
+# Um processo carregador publica cada base como arquivo Arrow IPC em
+# /dev/shm; os workers do Streamlit mapeiam o arquivo somente-leitura.
+# As páginas ficam no page cache uma única vez, então N workers custam
+# uma cópia de cada base. Uma nova publicação troca o manifesto com
+# os.replace (atômico): quem já mapeou a versão antiga segue com ela até
+# soltar a referência, e o próximo carregamento pega a nova.
+#
+# Carregador: BUSSOLA_SHM_DIR=/dev/shm/bussola python -m core.shared_store --watch 60
+# Workers:    BUSSOLA_SHM_DIR=/dev/shm/bussola streamlit run hub.py
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+
+from core.datasets import COLUNAS_ATTR, VERSAO_ATTR, data_version, dataset_path, working_columns, working_set
+from core.metrics import record_dataset
+from core.schema import TIPO_TEXTO, compact_schema
+
+logger = logging.getLogger(__name__)
+
+# Vazio = store desativado (cada processo lê o parquet, como antes)
+SHM_DIR = os.environ.get("BUSSOLA_SHM_DIR", "")
+MANIFESTO = "manifest.json"
+
+_lock = threading.Lock()
+_manifesto_cache = {"mtime": None, "conteudo": {}}
+_anexados = {}
+
+
+def _ler_manifesto(shm_dir: str) -> dict:
+    caminho = os.path.join(shm_dir, MANIFESTO)
+    try:
+        mtime = os.stat(caminho).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    with _lock:
+        if _manifesto_cache["mtime"] != mtime:
+            with open(caminho, encoding='utf-8') as f:
+                _manifesto_cache["conteudo"] = json.load(f)
+            _manifesto_cache["mtime"] = mtime
+        return _manifesto_cache["conteudo"]
+
+
+def _gravar_manifesto(shm_dir: str, manifesto: dict):
+    temporario = os.path.join(shm_dir, f".{MANIFESTO}.{os.getpid()}")
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, os.path.join(shm_dir, MANIFESTO))
+    with _lock:
+        _manifesto_cache["mtime"] = None
+
+
+def publish(file_path: str, shm_dir: str) -> dict:
+    """Publica (ou republica) uma base parquet no store. Uso do carregador."""
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+
+    nome = os.path.basename(file_path)
+    versao = data_version(file_path)
+    manifesto = dict(_ler_manifesto(shm_dir))
+    anterior = manifesto.get(nome)
+    if anterior and anterior["versao"] == versao:
+        return anterior
+
+    # Um único lote por coluna: permite aos workers expor os numéricos como views numpy
+    tabela = pq.read_table(file_path).combine_chunks()
+    segmento = f"{nome}.{versao}.arrow"
+    destino = os.path.join(shm_dir, segmento)
+    with pa.OSFile(destino + ".tmp", 'wb') as f:
+        with ipc.new_file(f, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+    os.replace(destino + ".tmp", destino)
+
+    manifesto[nome] = {
+        "segmento": segmento,
+        "versao": versao,
+        "linhas": tabela.num_rows,
+        "bytes": os.path.getsize(destino),
+        "publicado_em": time.time(),
+    }
+    _gravar_manifesto(shm_dir, manifesto)
+
+    # Workers que ainda mapeiam o segmento antigo continuam válidos após o unlink
+    if anterior and anterior["segmento"] != segmento:
+        try:
+            os.unlink(os.path.join(shm_dir, anterior["segmento"]))
+        except FileNotFoundError:
+            pass
+    logger.info("Publicado %s (%s linhas, %.1f MB)", nome, tabela.num_rows, manifesto[nome]["bytes"] / 1024 ** 2)
+    return manifesto[nome]
+
+
+def _para_pandas(tabela):
+    """Converte sem copiar: numéricos sem nulos viram views numpy do mapa.
+
+    Textos viram direto o TIPO_TEXTO (string Arrow sobre os mesmos buffers),
+    no pandas 2 e no 3: sem o mapeamento, o pyarrow passa por objetos `str`
+    do Python e copia cada coluna de texto para o heap do worker.
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    def tipo_pandas(tipo):
+        # Mesmos dtypes do pd.read_parquet: inteiros com nulos mascarados, datas em Arrow
+        if pa.types.is_string(tipo) or pa.types.is_large_string(tipo):
+            return TIPO_TEXTO
+        if pa.types.is_integer(tipo):
+            return pd.api.types.pandas_dtype(str(tipo).title().replace("Uint", "UInt"))
+        if pa.types.is_date(tipo):
+            return pd.ArrowDtype(tipo)
+        return None
+
+    colunas = {}
+    for nome, coluna in zip(tabela.column_names, tabela.columns):
+        numerica = pa.types.is_integer(coluna.type) or pa.types.is_floating(coluna.type)
+        if numerica and coluna.num_chunks == 1 and coluna.null_count == 0:
+            colunas[nome] = coluna.chunk(0).to_numpy(zero_copy_only=True)
+        else:
+            # Strings continuam nos buffers Arrow do mapa; o resto é convertido
+            colunas[nome] = coluna.to_pandas(types_mapper=tipo_pandas)
+    return pd.DataFrame(colunas, copy=False)
+
+
+def attach(nome: str, shm_dir: str = SHM_DIR):
+    """Base em memória (`working_set`) mapeada do store, ou None se não publicada.
+
+    As colunas de detalhe (contato, endereço) saem da tabela Arrow antes da
+    conversão: nunca chegam ao heap do worker. As demais apontam para o
+    arquivo mapeado (sem cópia); qualquer escrita gera uma cópia local pelo
+    copy-on-write do pandas. A base pronta, com os campos derivados, fica
+    em memória do worker até o manifesto apontar para uma versão nova.
+    """
+    if not shm_dir:
+        return None
+    entrada = _ler_manifesto(shm_dir).get(nome)
+    if entrada is None:
+        return None
+
+    with _lock:
+        atual = _anexados.get(nome)
+        if atual is not None and atual[0] == entrada["versao"]:
+            return atual[1]
+
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    mapa = pa.memory_map(os.path.join(shm_dir, entrada["segmento"]), 'r')
+    tabela = ipc.open_file(mapa).read_all()
+    nomes = tabela.column_names
+    df = working_set(compact_schema(_para_pandas(tabela.select(working_columns(nomes)))))
+    df.attrs[VERSAO_ATTR] = entrada["versao"]
+    df.attrs[COLUNAS_ATTR] = nomes
+    with _lock:
+        _anexados[nome] = (entrada["versao"], df)
+    record_dataset(nome, df)
+    return df
+
+
+def _limpar_orfaos(shm_dir: str):
+    """Remove segmentos que nenhuma entrada do manifesto referencia."""
+    em_uso = {e["segmento"] for e in _ler_manifesto(shm_dir).values()}
+    for arquivo in os.listdir(shm_dir):
+        if arquivo.endswith((".arrow", ".arrow.tmp")) and arquivo not in em_uso:
+            os.unlink(os.path.join(shm_dir, arquivo))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dir', default=SHM_DIR or "/dev/shm/bussola")
+    parser.add_argument('--watch', type=float, default=0, help="segundos entre checagens de ETL novo (0 = publica e sai)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    from core.niches import dataset_files
+
+    os.makedirs(args.dir, exist_ok=True)
+    _limpar_orfaos(args.dir)
+    while True:
+        for arquivo in dataset_files():
+            file_path = dataset_path(arquivo)
+            if os.path.exists(file_path):
+                publish(file_path, args.dir)
+            else:
+                logger.warning("Base não encontrada: %s", file_path)
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
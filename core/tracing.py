@@ -0,0 +1,235 @@
+# --- INSTRUMENTAÇÃO DO RERUN (ETAPAS, CACHE E PAINEL DE DEPURAÇÃO) ---
+import functools
+import os
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+from core.metrics import record_rerun
+
+# Chave em session_state com o trace do último rerun concluído
+TRACE_KEY = "trace_rerun"
+# Query param que liga o painel de depuração na sidebar (?debug=1)
+DEBUG_PARAM = "debug"
+_ATUAL_KEY = "_trace_em_andamento"
+
+
+class _Etapa:
+    """Handle de uma etapa em andamento: quem a abriu pode informar `linhas`
+    e, se a etapa gera um arquivo, o tamanho em `bytes`."""
+
+    __slots__ = ("linhas", "bytes")
+
+    def __init__(self, linhas=None):
+        self.linhas = linhas
+        self.bytes = None
+
+
+def _trace_atual():
+    """Trace do rerun em andamento nesta sessão, ou None fora de um rerun.
+
+    Fora do `streamlit run` (API, benchmarks, ETL) não há sessão: as
+    etapas viram no-op e as funções instrumentadas rodam sem custo extra.
+    """
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return None
+    return st.session_state.get(_ATUAL_KEY)
+
+
+@contextmanager
+def span(nome: str, linhas: int = None, cache: str = None):
+    """Cronometra uma etapa do rerun.
+
+    `linhas` (ou `etapa.linhas`, dentro do bloco) registra o tamanho do
+    recorte naquela etapa. Com `cache`, a etapa conta um hit no cache de
+    mesmo nome, ou um miss se o corpo da função em cache rodou (ver
+    `cache_miss`).
+    """
+    trace = _trace_atual()
+    etapa = _Etapa(linhas)
+    if trace is None:
+        yield etapa
+        return
+
+    registro = {"etapa": nome, "nivel": trace["_nivel"], "inicio_ms": (time.perf_counter() - trace["_t0"]) * 1000}
+    trace["etapas"].append(registro)
+    if cache is not None:
+        trace["_misses"].discard(cache)
+    trace["_nivel"] += 1
+    inicio = time.perf_counter()
+    try:
+        yield etapa
+    finally:
+        trace["_nivel"] -= 1
+        registro["duracao_ms"] = (time.perf_counter() - inicio) * 1000
+        registro["linhas"] = etapa.linhas
+        if etapa.bytes is not None:
+            registro["bytes"] = etapa.bytes
+        if cache is not None:
+            resultado = "miss" if cache in trace["_misses"] else "hit"
+            registro["cache"] = resultado
+            trace["cache"].setdefault(cache, {"hit": 0, "miss": 0})[resultado] += 1
+
+
+def _linhas_do_resultado(resultado):
+    if isinstance(resultado, tuple) and resultado:
+        resultado = resultado[0]
+    if isinstance(resultado, (pd.DataFrame, pd.Series)):
+        return len(resultado)
+    return None
+
+
+def traced(nome: str = None):
+    """Decorator: a função vira uma etapa do rerun.
+
+    As linhas são lidas do retorno quando ele é um DataFrame (ou uma tupla
+    que começa por um, como o `sidebar_filters`); um retorno em bytes (o
+    PDF) registra o tamanho do arquivo.
+    """
+    def decorador(funcao):
+        rotulo = nome or funcao.__name__
+
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            with span(rotulo) as etapa:
+                resultado = funcao(*args, **kwargs)
+                etapa.linhas = _linhas_do_resultado(resultado)
+                if isinstance(resultado, (bytes, bytearray)):
+                    etapa.bytes = len(resultado)
+            return resultado
+        return envoltorio
+    return decorador
+
+
+def cache_miss(cache: str):
+    """Chamado no corpo de uma função em cache: marca o miss na etapa aberta."""
+    trace = _trace_atual()
+    if trace is not None:
+        trace["_misses"].add(cache)
+
+
+def annotate(chave: str, valor: dict):
+    """Anexa informações ao trace do rerun em andamento (ex.: pegada de memória)."""
+    trace = _trace_atual()
+    if trace is not None:
+        trace.setdefault(chave, {}).update(valor)
+
+
+def debug_enabled() -> bool:
+    return st.query_params.get(DEBUG_PARAM) == "1"
+
+
+def trace_rerun(funcao):
+    """Decorator do `main()`/`render_dashboard()`: um trace por rerun.
+
+    Ao fim do rerun o trace fica em `st.session_state[TRACE_KEY]`, segue
+    para as métricas de produção (core.metrics) e, com `?debug=1` na URL,
+    é exibido no painel de depuração da sidebar. Com `?profile=1`, o rerun
+    roda sob o cProfile (core.profiling) e o perfil fica para download.
+    """
+    from core.navigation import GATILHO_KEY
+    from core.profiling import profile_enabled, profiled_call, render_profile_panel
+
+    @functools.wraps(funcao)
+    def envoltorio(*args, **kwargs):
+        inicio = time.time()
+        trace = {
+            "painel": os.path.splitext(os.path.basename(funcao.__globals__.get("__file__", funcao.__module__)))[0],
+            # render_dashboard(nicho) dos hubs
+            "nicho": args[0] if args and isinstance(args[0], str) else None,
+            "etapas": [],
+            "cache": {},
+            "_t0": time.perf_counter(),
+            "_nivel": 0,
+            "_misses": set(),
+        }
+        st.session_state[_ATUAL_KEY] = trace
+        perfilado = profile_enabled()
+        try:
+            resultado = profiled_call(funcao, *args, **kwargs) if perfilado else funcao(*args, **kwargs)
+        except BaseException as e:
+            trace["erro"] = type(e).__name__
+            raise
+        finally:
+            st.session_state.pop(_ATUAL_KEY, None)
+            trace["total_ms"] = (time.perf_counter() - trace.pop("_t0")) * 1000
+            del trace["_nivel"], trace["_misses"]
+            # A aba só vale se o lazy_tabs rodou neste rerun (sem filtro vazio/st.stop antes)
+            gatilho = st.session_state.get(GATILHO_KEY) or {}
+            if gatilho.get("em", 0) < inicio:
+                gatilho = {}
+            trace["aba"], trace["origem"] = gatilho.get("aba"), gatilho.get("origem")
+            st.session_state[TRACE_KEY] = trace
+            record_rerun(trace)
+
+        if debug_enabled():
+            render_debug_panel(trace)
+        if perfilado:
+            render_profile_panel(trace["painel"])
+        return resultado
+    return envoltorio
+
+
+def _figura_cascata(etapas: pd.DataFrame):
+    import plotly.graph_objects as go
+
+    rotulos = [f"{'  ' * nivel}{nome}" for nome, nivel in zip(etapas['etapa'], etapas['nivel'])]
+    fig = go.Figure(go.Bar(
+        y=rotulos, x=etapas['duracao_ms'], base=etapas['inicio_ms'], orientation='h',
+        marker_color=etapas['nivel'], marker_colorscale='Blues_r',
+        hovertemplate="%{y}<br>início %{base:.1f} ms<br>duração %{x:.1f} ms<extra></extra>",
+    ))
+    fig.update_yaxes(autorange='reversed')
+    fig.update_layout(
+        template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)",
+        height=max(200, 22 * len(etapas) + 60), margin=dict(l=0, r=0, t=10, b=0),
+        xaxis_title="ms desde o início do rerun",
+    )
+    return fig
+
+
+def render_debug_panel(trace: dict):
+    """Painel de depuração (só com ?debug=1): cascata, cache e linhas por etapa."""
+    from core.figures import PAYLOAD_KEY
+
+    with st.sidebar.expander("🛠️ Depuração do rerun", expanded=True):
+        st.caption(
+            f"Rerun em {trace['total_ms']:.0f} ms"
+            + (f" · aba '{trace['aba']}' ({trace['origem']})" if trace["aba"] else "")
+        )
+        if not trace["etapas"]:
+            st.caption("Nenhuma etapa instrumentada neste rerun.")
+            return
+
+        etapas = pd.DataFrame(trace["etapas"])
+        st.plotly_chart(_figura_cascata(etapas), use_container_width=True)
+
+        tabela = etapas.assign(etapa=[f"{'· ' * n}{e}" for e, n in zip(etapas['etapa'], etapas['nivel'])])
+        colunas = [c for c in ('etapa', 'duracao_ms', 'linhas', 'bytes', 'cache') if c in tabela.columns]
+        st.dataframe(tabela[colunas].round({'duracao_ms': 1}), hide_index=True, use_container_width=True)
+
+        if trace["cache"]:
+            st.markdown("**Cache**")
+            st.dataframe(pd.DataFrame(trace["cache"]).T, use_container_width=True)
+
+        for nome, memoria in trace.get("memoria", {}).items():
+            resumo = memoria["resumo"]
+            st.markdown(f"**Memória da base: {nome}**")
+            st.caption(
+                f"{resumo['bytes'] / 1024 ** 2:,.1f} MB · textos: {resumo['pct_texto']:.0f}% · "
+                f"economia projetada (categoria/Arrow): {resumo['economia_projetada'] / 1024 ** 2:,.1f} MB ({resumo['pct_economia']:.0f}%)"
+            )
+            colunas = memoria["colunas"].assign(MB=memoria["colunas"]["bytes"] / 1024 ** 2, economia_MB=memoria["colunas"]["economia"] / 1024 ** 2)
+            st.dataframe(
+                colunas[["coluna", "dtype", "MB", "pct", "cardinalidade", "sugestao", "economia_MB"]].round({"MB": 2, "economia_MB": 2}),
+                hide_index=True, use_container_width=True,
+            )
+
+        payload = st.session_state.get(PAYLOAD_KEY)
+        if payload:
+            st.markdown("**Payload das figuras (bytes)**")
+            st.dataframe(pd.DataFrame(payload).T, use_container_width=True)
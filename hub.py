@@ -0,0 +1,89 @@
+# --- SERVIDOR ÚNICO: TODOS OS PAINÉIS EM UM PROCESSO ---
+# Substitui os oito `streamlit run appX.py`: um processo, um import do stack,
+# e as bases parquet lidas uma vez e compartilhadas por nichos e sessões.
+# A página inicial busca empresas pelo nome em todas as bases (core.search).
+#
+# Uso: streamlit run hub.py
+import os
+import time
+
+import streamlit as st
+from core.datasets import dataset_path
+from core.niches import niche_registry, render_niche
+from core.schema import cnpj_text
+from core.search import search_names
+
+st.set_page_config(
+    page_title="Bússola dos Dados - Hub",
+    layout="wide",
+    initial_sidebar_state="expanded",
+    page_icon="🧭"
+)
+
+
+def _pagina(chave: str, entrada: dict):
+    return st.Page(lambda: render_niche(entrada), title=entrada["title"], icon=entrada["icon"], url_path=chave)
+
+
+@st.fragment
+def render_company_search():
+    """Busca por razão social em todas as bases: em quais painéis a empresa está."""
+    consulta = st.text_input("🔎 Buscar empresa", placeholder="Razão social (sem acentos também vale), ex.: clinica sao lucas")
+    if not consulta.strip():
+        return
+
+    paineis = {}
+    for entradas in niche_registry().values():
+        for entrada in entradas.values():
+            paineis.setdefault(dataset_path(entrada["path"]), []).append(entrada["title"])
+    caminhos = [c for c in paineis if os.path.exists(c)]
+
+    inicio = time.perf_counter()
+    achados = search_names(consulta, caminhos, limite=50)
+    duracao_ms = (time.perf_counter() - inicio) * 1000
+    if achados.empty:
+        st.info("Nenhuma empresa encontrada com esse nome.")
+        return
+
+    # A mesma empresa (CNPJ) em vários arquivos vira uma linha, com todos os painéis
+    achados = achados.assign(Painéis=achados["arquivo"].map(paineis))
+    empresas = achados.groupby("cnpj_completo", sort=False).agg(
+        Empresa=("razao_social", "first"),
+        UF=("uf", "first"),
+        Município=("municipio", "first"),
+        Relevância=("relevancia", "max"),
+        Painéis=("Painéis", lambda listas: ", ".join(dict.fromkeys(p for lista in listas for p in lista))),
+    ).reset_index()
+    empresas.insert(1, "CNPJ", cnpj_text(empresas.pop("cnpj_completo")))
+    st.caption(f"{len(empresas)} empresas em {duracao_ms:.0f} ms")
+    st.dataframe(
+        empresas[["Empresa", "CNPJ", "UF", "Município", "Painéis", "Relevância"]],
+        hide_index=True, use_container_width=True,
+        column_config={"Relevância": st.column_config.ProgressColumn(min_value=0.0, max_value=1.0, format="%.2f")},
+    )
+
+
+def render_home(paginas: dict):
+    st.markdown("<h1 style='text-align: center;'>🧭 Bússola dos Dados</h1>", unsafe_allow_html=True)
+    st.markdown("<p style='text-align: center; color: gray;'>Todos os painéis de inteligência B2B em um único lugar. Escolha um nicho para começar.</p>", unsafe_allow_html=True)
+    render_company_search()
+    st.markdown("---")
+
+    for secao, lista in paginas.items():
+        st.markdown(f"### {secao}")
+        cols = st.columns(3)
+        for i, pagina in enumerate(lista):
+            cols[i % 3].page_link(pagina, use_container_width=True)
+
+
+def main():
+    paginas = {
+        secao: [_pagina(chave, entrada) for chave, entrada in entradas.items()]
+        for secao, entradas in niche_registry().items()
+    }
+    inicio = st.Page(lambda: render_home(paginas), title="Início", icon="🏠", url_path="inicio", default=True)
+    st.navigation({"Bússola dos Dados": [inicio], **paginas}).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# --- TESTE DE CARGA DA API JSON ---
+# Dispara requisições concorrentes (conexões keep-alive) contra o nicho de
+# maior base e mede requisições/s e latência p50/p95 por visão: primeira
+# chamada (cálculo), chamadas repetidas (cache de resposta) e
+# revalidação com If-None-Match (304).
+#
+# Uso: python perf/api_load_test.py --conexoes 16 --segundos 10
+#      (sobe o api.py sozinho; use --url para apontar para um já rodando)
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def _requisitar(leitor, escritor, host, caminho, cabecalhos=None):
+    linhas = [f"GET {caminho} HTTP/1.1", f"Host: {host}"]
+    linhas += [f"{k}: {v}" for k, v in (cabecalhos or {}).items()]
+    escritor.write(("\r\n".join(linhas) + "\r\n\r\n").encode('latin-1'))
+    await escritor.drain()
+
+    status = int((await leitor.readline()).split()[1])
+    resposta = {}
+    while (linha := await leitor.readline()) not in (b"\r\n", b""):
+        nome, _, valor = linha.decode('latin-1').partition(":")
+        resposta[nome.strip().lower()] = valor.strip()
+    corpo = await leitor.readexactly(int(resposta.get("content-length", 0)))
+    return status, resposta, corpo
+
+
+async def _get_json(host, porta, caminho):
+    leitor, escritor = await asyncio.open_connection(host, porta)
+    try:
+        status, cabecalhos, corpo = await _requisitar(leitor, escritor, host, caminho)
+    finally:
+        escritor.close()
+    try:
+        return status, cabecalhos, json.loads(corpo)
+    except ValueError:
+        return status, cabecalhos, corpo[:200]
+
+
+async def _cliente(host, porta, caminhos, cabecalhos, fim, latencias, erros):
+    leitor, escritor = await asyncio.open_connection(host, porta)
+    i = 0
+    try:
+        while time.perf_counter() < fim:
+            caminho = caminhos[i % len(caminhos)]
+            i += 1
+            inicio = time.perf_counter()
+            status, _, _ = await _requisitar(leitor, escritor, host, caminho, cabecalhos.get(caminho))
+            latencias.append(time.perf_counter() - inicio)
+            if status not in (200, 304):
+                erros.append(status)
+    finally:
+        escritor.close()
+
+
+async def rodada(host, porta, caminhos, conexoes, segundos, cabecalhos=None) -> dict:
+    latencias, erros = [], []
+    fim = time.perf_counter() + segundos
+    await asyncio.gather(*[
+        _cliente(host, porta, caminhos, cabecalhos or {}, fim, latencias, erros)
+        for _ in range(conexoes)
+    ])
+    ms = np.array(latencias) * 1000
+    return {
+        "req_s": len(latencias) / segundos,
+        "p50_ms": float(np.percentile(ms, 50)) if len(ms) else None,
+        "p95_ms": float(np.percentile(ms, 95)) if len(ms) else None,
+        "erros": len(erros),
+    }
+
+
+def _subir_api(porta: int):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(RAIZ, "api.py"), "--port", str(porta)],
+        cwd=RAIZ, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    for _ in range(300):
+        try:
+            asyncio.run(_get_json("127.0.0.1", porta, "/nichos"))
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("api.py não respondeu em 30s")
+
+
+async def principal(args):
+    alvo = urlsplit(args.url)
+    host, porta = alvo.hostname, alvo.port or 80
+
+    _, _, nichos = await _get_json(host, porta, "/nichos")
+    disponiveis = [n for n in nichos["items"] if n["disponivel"]]
+    if not disponiveis:
+        raise SystemExit("Nenhuma base de nicho disponível: rode o ETL primeiro.")
+    maior = max(disponiveis, key=lambda n: n["bytes"])
+    base = f"/nichos/{maior['slug']}"
+    print(f"Nicho alvo: {maior['nicho']} ({maior['bytes'] / 1024 ** 2:.1f} MB)")
+
+    # UF de maior volume para as consultas territoriais
+    status, _, heat = await _get_json(host, porta, f"{base}/heatmap")
+    if status != 200:
+        raise SystemExit(f"{base}/heatmap respondeu {status}: {heat}")
+    uf = heat["items"][-1]["uf_norm"]
+    _, _, municipios = await _get_json(host, porta, f"{base}/municipios?" + urlencode({"uf": uf}))
+    cidade = municipios["items"][0]["municipio_visual"]
+
+    visoes = {
+        "heatmap": [f"{base}/heatmap", f"{base}/heatmap?" + urlencode({"uf": uf})],
+        "municipios": [f"{base}/municipios?" + urlencode({"uf": uf})],
+        "peers": [f"{base}/peers?" + urlencode({"uf": uf, "cidade": cidade})],
+        "golden-leads": [f"{base}/golden-leads?" + urlencode({"uf": uf, "page": p}) for p in range(1, 6)],
+    }
+
+    print(f"{'visão':<14}{'1ª chamada':>12}{'req/s':>10}{'p50':>9}{'p95':>9}{'304 req/s':>11}{'p95':>9}")
+    for visao, caminhos in visoes.items():
+        # 1ª chamada: cálculo da agregação (cache de resposta vazio para esta chave)
+        inicio = time.perf_counter()
+        etags = {}
+        for caminho in caminhos:
+            _, cabecalhos, _ = await _get_json(host, porta, caminho)
+            etags[caminho] = {"If-None-Match": cabecalhos["etag"]}
+        fria = (time.perf_counter() - inicio) / len(caminhos) * 1000
+
+        quente = await rodada(host, porta, caminhos, args.conexoes, args.segundos)
+        revalida = await rodada(host, porta, caminhos, args.conexoes, args.segundos, etags)
+        print(f"{visao:<14}{fria:>10.1f}ms{quente['req_s']:>10.0f}{quente['p50_ms']:>7.1f}ms{quente['p95_ms']:>7.1f}ms"
+              f"{revalida['req_s']:>11.0f}{revalida['p95_ms']:>7.1f}ms"
+              + (f"  erros: {quente['erros'] + revalida['erros']}" if quente['erros'] + revalida['erros'] else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default=None, help="API já rodando (padrão: sobe uma em --porta)")
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--conexoes', type=int, default=16)
+    parser.add_argument('--segundos', type=float, default=5)
+    args = parser.parse_args()
+
+    proc = None
+    if args.url is None:
+        proc = _subir_api(args.porta)
+        args.url = f"http://127.0.0.1:{args.porta}"
+    try:
+        asyncio.run(principal(args))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# --- SUÍTE DE MICROBENCHMARKS DOS PAINÉIS ---
+# Mede, para cada painel/nicho do registro, as etapas de um rerun típico
+# com o recorte da UF de maior volume: carga da base (fria e em cache),
+# sidebar, agregações de cada aba, busca de cidades pares, dossiê PDF e
+# exportação CSV. Salva um JSON por execução para comparar ao longo do
+# tempo (--comparar).
+#
+# As agregações por aba são medidas nos hubs (app6/app7), cujas contas
+# ficam em core.aggregations; nos painéis setoriais (app..app5) elas
+# estão dentro do main() e entram só no teste de rerun de ponta a ponta.
+#
+# Uso: python perf/synthetic_data.py --linhas 1M --saida /tmp/bussola_1m
+#      python perf/benchmarks.py --dados /tmp/bussola_1m
+#      python perf/benchmarks.py --dados /tmp/bussola_1m --comparar perf/resultados/<anterior>.json
+import argparse
+import gc
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import warnings
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# Coluna de cidade usada no filtro de cada painel setorial (os hubs usam municipio_visual)
+COL_CIDADE = {"app": "municipio_norm", "app1": "municipio_visual", "app2": "municipio_visual",
+              "app3": "municipio_norm", "app4": "municipio_norm", "app5": "municipio_norm"}
+# Mesmas opções de cada hub (ver app6/app7 e api.py)
+MIN_TOTAL_MUNICIPIO = {"app6": 5}
+PEERS_NORMALIZADO = {"app7"}
+
+
+def cronometrar(funcao, repeticoes: int, preparar=None) -> dict:
+    amostras = []
+    for _ in range(repeticoes):
+        if preparar is not None:
+            preparar()
+        gc.collect()
+        inicio = time.perf_counter()
+        funcao()
+        amostras.append((time.perf_counter() - inicio) * 1000)
+    ordenadas = sorted(amostras)
+    return {
+        "mediana_ms": round(ordenadas[len(ordenadas) // 2], 3),
+        "min_ms": round(ordenadas[0], 3),
+        "amostras_ms": [round(a, 3) for a in amostras],
+    }
+
+
+def _recorte(df, col_cidade: str):
+    """UF de maior volume e sua maior cidade: o recorte mais pesado de um rerun."""
+    uf = df['uf_norm'].value_counts().idxmax()
+    df_uf = df[df['uf_norm'] == uf]
+    cidade = df_uf[col_cidade].value_counts().idxmax()
+    return uf, df_uf, cidade, df_uf[df_uf[col_cidade] == cidade]
+
+
+def medir_entrada(entrada: dict, repeticoes: int) -> dict:
+    import streamlit as st
+    import streamlit.logger
+
+    from core.aggregations import apply_filters, golden_leads, municipio_matrix, peer_cities, root_summary, uf_heatmap, with_contacts
+    from core.charts import age_histogram, binned_kde
+    from core.datasets import with_details
+    from core.schema import with_cnpj_text
+
+    # Fora do `streamlit run` cada widget avisa "missing ScriptRunContext";
+    # o import do painel relê a config e restaura o nível padrão
+    streamlit.logger.set_log_level("error")
+    modulo = importlib.import_module(entrada["modulo"])
+    streamlit.logger.set_log_level("error")
+    hub = entrada["nicho"] is not None
+    args = (entrada["nicho"],) if hub else ()
+    etapas = {}
+
+    etapas["load_data_fria"] = cronometrar(lambda: modulo.load_data(*args), repeticoes, preparar=st.cache_resource.clear)
+    etapas["load_data_cache"] = cronometrar(lambda: modulo.load_data(*args), repeticoes)
+    df = modulo.load_data(*args)
+
+    if hub:
+        cfg = modulo.CONFIG_NICHOS[entrada["nicho"]]
+        etapas["sidebar_filters"] = cronometrar(lambda: modulo.sidebar_filters(df, cfg), repeticoes)
+        uf, df_uf, cidade, df_cidade = _recorte(df, 'municipio_visual')
+        etapas["filtro_uf"] = cronometrar(lambda: apply_filters(df, uf, "Todas", cfg["tiers"]), repeticoes)
+        etapas["aba_heatmap_uf"] = cronometrar(lambda: uf_heatmap(df, cfg["tiers"]), repeticoes)
+        minimo = MIN_TOTAL_MUNICIPIO.get(entrada["modulo"], 0)
+        etapas["aba_matriz_municipios"] = cronometrar(lambda: municipio_matrix(df_uf, min_total=minimo), repeticoes)
+        normalizado = entrada["modulo"] in PEERS_NORMALIZADO
+        etapas["cidades_pares"] = cronometrar(lambda: peer_cities(df_uf, cidade, normalizado=normalizado), repeticoes)
+        etapas["aba_histograma_idade"] = cronometrar(
+            lambda: binned_kde(*age_histogram(df_uf['idade_empresa_anos'], limite=50, bins=30)), repeticoes)
+        etapas["aba_golden_leads"] = cronometrar(lambda: with_contacts(golden_leads(df_uf, root_summary(df), top=100)), repeticoes)
+        etapas["generate_pdf"] = cronometrar(lambda: modulo.generate_pdf(df_cidade, cidade, uf, cfg), repeticoes)
+    else:
+        etapas["sidebar_filters"] = cronometrar(lambda: modulo.sidebar_filters(df), repeticoes)
+        uf, df_uf, cidade, df_cidade = _recorte(df, COL_CIDADE[entrada["modulo"]])
+        etapas["generate_pdf"] = cronometrar(lambda: modulo.generate_pdf(df_cidade, cidade, uf), repeticoes)
+
+    # O CSV busca no arquivo as colunas de contato/detalhe fora do conjunto de trabalho
+    etapas["export_csv"] = cronometrar(lambda: with_cnpj_text(with_details(df_uf)).to_csv(index=False).encode('utf-8-sig'), repeticoes)
+    return {
+        "linhas": len(df),
+        "recorte": {"uf": uf, "linhas_uf": len(df_uf), "cidade": cidade, "linhas_cidade": len(df_cidade)},
+        "etapas": etapas,
+    }
+
+
+def _meta(dados: str) -> dict:
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+    import streamlit as st
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "quando": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "dados": os.path.abspath(dados),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "pyarrow": pa.__version__,
+        "streamlit": st.__version__,
+        "maquina": f"{platform.system()} {platform.machine()} ({os.cpu_count()} CPUs)",
+    }
+
+
+def comparar(atual: dict, anterior: dict):
+    print(f"\nComparação com {anterior['meta']['quando']} (commit {anterior['meta'].get('commit') or '?'}):")
+    print(f"{'painel':<42}{'etapa':<24}{'antes':>10}{'agora':>10}{'razão':>8}")
+    for slug, resultado in atual["resultados"].items():
+        antes = anterior["resultados"].get(slug, {}).get("etapas", {})
+        for etapa, medida in resultado["etapas"].items():
+            if etapa not in antes:
+                continue
+            a, b = antes[etapa]["mediana_ms"], medida["mediana_ms"]
+            razao = b / a if a else float('nan')
+            marca = "  <- mais lento" if razao > 1.2 else ""
+            print(f"{slug:<42}{etapa:<24}{a:>8.1f}ms{b:>8.1f}ms{razao:>7.2f}x{marca}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dados', required=True, help="pasta com as bases (ex.: saída do synthetic_data.py)")
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--paineis', nargs='*', default=None, help="slugs do registro (padrão: todos com base disponível)")
+    parser.add_argument('--saida', default=os.path.join(RAIZ, "perf", "resultados"))
+    parser.add_argument('--comparar', default=None, help="JSON de uma execução anterior")
+    args = parser.parse_args()
+
+    # Antes de importar core.datasets: os painéis resolvem as bases por aqui
+    os.environ["BUSSOLA_DATA_DIR"] = os.path.abspath(args.dados)
+    os.environ.pop("BUSSOLA_SHM_DIR", None)
+    warnings.filterwarnings("ignore")
+
+    from core.datasets import dataset_path
+    from core.niches import niche_registry
+
+    entradas = {slug: e for secao in niche_registry().values() for slug, e in secao.items()}
+    selecionadas = args.paineis or [s for s, e in entradas.items() if os.path.exists(dataset_path(e["path"]))]
+
+    resultado = {"meta": _meta(args.dados), "resultados": {}}
+    for slug in selecionadas:
+        inicio = time.perf_counter()
+        resultado["resultados"][slug] = medir_entrada(entradas[slug], args.repeticoes)
+        etapas = resultado["resultados"][slug]["etapas"]
+        resumo = "  ".join(f"{nome}={m['mediana_ms']:.0f}ms" for nome, m in etapas.items())
+        print(f"{slug} ({resultado['resultados'][slug]['linhas']:,} linhas, {time.perf_counter() - inicio:.0f}s): {resumo}")
+
+    os.makedirs(args.saida, exist_ok=True)
+    linhas = max((r["linhas"] for r in resultado["resultados"].values()), default=0)
+    destino = os.path.join(args.saida, f"bench-{linhas}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(destino, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados salvos em {destino}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            comparar(resultado, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
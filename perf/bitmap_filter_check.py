@@ -0,0 +1,93 @@
+# --- MULTISELECT DE TIER: BITMAPS POR VALOR x ISIN NO RECORTE ---
+# Para uma base sintética, mede o passo do tier da sidebar em três
+# recortes de território (Brasil, a maior UF e a maior cidade dela) e
+# combinações sorteadas de tiers: `.isin` sobre o recorte, como era, e o
+# E dos bitsets por valor (core.bitmaps). Mede também o KPI de contagem
+# (contatos ouro, key accounts): soma da flag nas linhas x popcount do E com o bitset da
+# flag. Confere que os dois caminhos dão as mesmas linhas e contagens.
+#
+# Uso: python perf/synthetic_data.py --linhas 1M --saida /tmp/bussola_1m
+#      python perf/bitmap_filter_check.py --dados /tmp/bussola_1m
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.bitmaps import count_where, filter_by_values, value_bitmaps  # noqa: E402
+from core.datasets import read_dataset  # noqa: E402
+
+
+def cronometrar(funcao, repeticoes: int) -> float:
+    amostras = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        amostras.append((time.perf_counter() - inicio) * 1000)
+    return float(np.median(amostras))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dados', required=True, help="pasta gerada pelo perf/synthetic_data.py")
+    parser.add_argument('--base', default="leads_saude_processed.parquet")
+    parser.add_argument('--coluna', default="segmento_saude", help="coluna do multiselect de tier")
+    parser.add_argument('--flag', default="qualidade_contato", help="coluna do KPI de contagem")
+    parser.add_argument('--valor', default="Ouro (Tel+Email)", help="valor contado na flag")
+    parser.add_argument('--combinacoes', type=int, default=10)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--json', default=None, help="salva o resultado neste arquivo")
+    args = parser.parse_args()
+
+    df = read_dataset(os.path.join(args.dados, args.base))
+    inicio = time.perf_counter()
+    value_bitmaps(df, args.coluna)
+    value_bitmaps(df, args.flag)
+    construcao_ms = (time.perf_counter() - inicio) * 1000
+
+    uf = df['uf_norm'].value_counts().index[0]
+    df_uf = df[df['uf_norm'] == uf]
+    cidade = df_uf['municipio_visual'].value_counts().index[0]
+    recortes = {"Brasil": df.copy(deep=False), uf: df_uf, f"{uf}/{cidade}": df_uf[df_uf['municipio_visual'] == cidade]}
+    tiers = df[args.coluna].dropna().unique().tolist()
+    rng = np.random.default_rng(0)
+    # A primeira é o padrão da sidebar (todos marcados); as demais, sorteadas
+    combinacoes = [tiers] + [rng.choice(tiers, int(rng.integers(1, len(tiers))), replace=False).tolist() for _ in range(args.combinacoes)]
+
+    resultado = {"base": args.base, "linhas": len(df), "bitmaps_ms": round(construcao_ms, 1), "recortes": {}}
+    for nome, recorte in recortes.items():
+        tempos = {"isin": [], "bitmaps": [], "kpi_soma": [], "kpi_popcount": []}
+        for sel in combinacoes:
+            via_isin = recorte[recorte[args.coluna].isin(sel)]
+            via_bitmaps = filter_by_values(recorte, df, args.coluna, sel)
+            assert via_isin.index.equals(via_bitmaps.index), sel
+            esperado = int((via_isin[args.flag] == args.valor).sum())
+            assert count_where(via_bitmaps, df, args.flag, args.valor) == esperado, sel
+
+            tempos["isin"].append(cronometrar(lambda: recorte[recorte[args.coluna].isin(sel)], args.repeticoes))
+            tempos["bitmaps"].append(cronometrar(lambda: filter_by_values(recorte, df, args.coluna, sel), args.repeticoes))
+            tempos["kpi_soma"].append(cronometrar(lambda: int((via_isin[args.flag] == args.valor).sum()), args.repeticoes))
+            tempos["kpi_popcount"].append(cronometrar(lambda: count_where(via_bitmaps, df, args.flag, args.valor), args.repeticoes))
+        resultado["recortes"][nome] = {
+            "linhas": len(recorte),
+            "todos_marcados": {k: round(v[0], 2) for k, v in tempos.items()},
+            **{k: round(float(np.median(v[1:])), 2) for k, v in tempos.items()},
+        }
+
+    print(f"\n{args.base}: {len(df):,} linhas, {len(tiers)} valores em {args.coluna}, bitmaps em {construcao_ms:.0f} ms")
+    print(f"  {'recorte':<28}{'linhas':>10}{'isin':>10}{'bitmaps':>10}{'kpi soma':>11}{'popcount':>10}  (ms, mediana)")
+    for nome, r in resultado["recortes"].items():
+        for rotulo, t in ((nome, r), ("  todos os tiers marcados", r["todos_marcados"])):
+            print(f"  {rotulo:<28}{r['linhas']:>10,}{t['isin']:>10.2f}{t['bitmaps']:>10.2f}{t['kpi_soma']:>11.2f}{t['kpi_popcount']:>10.2f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# --- FILTRO POR CNAE: ÍNDICE INVERTIDO x MÁSCARAS DE TEXTO ---
+# Constrói (ou reaproveita) o índice de CNAE de uma base sintética
+# (core.cnae) e mede o filtro da sidebar para combinações sorteadas de
+# 1 a 4 códigos, cruzadas com o recorte de uma UF: pelo índice (listas de
+# linhas -> máscara -> ROW_ID do recorte) e como seria sem ele, com
+# `isin` na principal e `str.contains` na lista de secundárias em texto
+# (coluna que nem fica na base em memória). Confere que os dois dão as
+# mesmas linhas antes de comparar tempos.
+#
+# Uso: python perf/synthetic_data.py --linhas 1M --saida /tmp/bussola_1m
+#      python perf/cnae_filter_check.py --dados /tmp/bussola_1m
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.cnae import COLUNA_CNAE, COLUNA_CNAE_SECUNDARIA, build_cnae_index, cnae_counts, filter_by_cnae, index_path  # noqa: E402
+from core.datasets import ARQUIVO_ATTR, ROW_ID  # noqa: E402
+
+
+def _tamanho(pasta: str) -> int:
+    return sum(os.path.getsize(os.path.join(pasta, f)) for f in os.listdir(pasta))
+
+
+def _por_texto(df: pd.DataFrame, recorte: pd.DataFrame, codigos: list) -> pd.DataFrame:
+    """O filtro sem índice: principal por `isin`, secundárias por regex na lista em texto."""
+    textos = [str(c) for c in codigos]
+    mascara = df[COLUNA_CNAE].isin(textos) | df[COLUNA_CNAE_SECUNDARIA].str.contains(
+        r"(?:^|,)(?:" + "|".join(textos) + r")(?:,|$)", regex=True, na=False,
+    )
+    return recorte[mascara.loc[recorte.index].to_numpy()]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dados', required=True, help="pasta gerada pelo perf/synthetic_data.py")
+    parser.add_argument('--base', default="leads_saude_processed.parquet")
+    parser.add_argument('--combinacoes', type=int, default=20)
+    parser.add_argument('--reconstruir', action='store_true', help="refaz o índice mesmo se já existir")
+    parser.add_argument('--json', default=None, help="salva o resultado neste arquivo")
+    args = parser.parse_args()
+
+    caminho = os.path.abspath(os.path.join(args.dados, args.base))
+    resultado = {"base": args.base}
+    df = pd.read_parquet(caminho, columns=['uf_norm', COLUNA_CNAE, COLUNA_CNAE_SECUNDARIA])
+    if args.reconstruir or not os.path.exists(os.path.join(index_path(caminho), "meta.json")):
+        inicio = time.perf_counter()
+        build_cnae_index(df, caminho)
+        resultado["construcao_s"] = round(time.perf_counter() - inicio, 2)
+    resultado["linhas"] = pq.ParquetFile(caminho).metadata.num_rows
+    resultado["indice_mb"] = round(_tamanho(index_path(caminho)) / 1024 ** 2, 1)
+    df[ROW_ID] = np.arange(len(df), dtype=np.uint32)
+    df.attrs[ARQUIVO_ATTR] = caminho
+
+    codigos = cnae_counts(df).index.to_numpy()
+    ufs = df['uf_norm'].value_counts().index[:5].tolist()
+    rng = np.random.default_rng(0)
+    tempos = {"indice": [], "texto": []}
+    for i in range(args.combinacoes):
+        escolhidos = rng.choice(codigos, int(rng.integers(1, min(4, codigos.size) + 1)), replace=False).tolist()
+        recorte = df[df['uf_norm'] == ufs[i % len(ufs)]]
+
+        inicio = time.perf_counter()
+        via_indice = filter_by_cnae(recorte, df, escolhidos)
+        tempos["indice"].append((time.perf_counter() - inicio) * 1000)
+        inicio = time.perf_counter()
+        via_texto = _por_texto(df, recorte, escolhidos)
+        tempos["texto"].append((time.perf_counter() - inicio) * 1000)
+        assert np.array_equal(via_indice[ROW_ID].to_numpy(), via_texto[ROW_ID].to_numpy()), escolhidos
+
+    resultado["tempo_ms"] = {
+        nome: {"p50": round(float(np.percentile(t, 50)), 2), "p95": round(float(np.percentile(t, 95)), 2)}
+        for nome, t in tempos.items()
+    }
+    print(f"\n{args.base}: {resultado['linhas']:,} linhas, {codigos.size} CNAEs, índice de {resultado['indice_mb']:.1f} MB"
+          + (f" ({resultado['construcao_s']:.2f}s)" if "construcao_s" in resultado else ""))
+    for nome, t in resultado["tempo_ms"].items():
+        print(f"  {nome:<8} p50 {t['p50']:>9.2f} ms   p95 {t['p95']:>9.2f} ms")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# --- COMPARAÇÃO: CNPJ EM TEXTO (HASH) x UINT64 ORDENADO (SEARCHSORTED) ---
+# Para duas bases sintéticas (um nicho e outro para a deduplicação),
+# compara a memória da coluna de CNPJ como string Arrow e como uint64 e o
+# tempo das três operações que a chave ordenada atende (core.keys): busca
+# pontual de um lote de CNPJs, deduplicação entre nichos e join de uma
+# tabela externa (lista de CRM com CNPJs mascarados) com a base. Também
+# confere que os dois caminhos dão o mesmo resultado.
+#
+# Uso: python perf/synthetic_data.py --linhas 1M --saida /tmp/bussola_1m
+#      python perf/cnpj_index_check.py --dados /tmp/bussola_1m
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.keys import join_by_cnpj, locate, shared_with  # noqa: E402
+from core.schema import COLUNA_CNPJ, TIPO_TEXTO, cnpj_text, compact_schema  # noqa: E402
+
+
+def cronometrar(funcao, repeticoes: int) -> float:
+    amostras = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        amostras.append((time.perf_counter() - inicio) * 1000)
+    return float(np.median(amostras))
+
+
+def _ler(caminho: str) -> pd.DataFrame:
+    return compact_schema(pd.read_parquet(caminho, columns=[COLUNA_CNPJ, 'razao_social', 'municipio_visual']))
+
+
+def comparar(base: str, outra: str, lote: int, repeticoes: int) -> dict:
+    df, df_outra = _ler(base), _ler(outra)
+    texto, texto_outra = cnpj_text(df[COLUNA_CNPJ]), cnpj_text(df_outra[COLUNA_CNPJ])
+    df_texto = df.assign(**{COLUNA_CNPJ: texto})
+
+    rng = np.random.default_rng(0)
+    # Metade do lote existe na base, metade não
+    procurados = np.concatenate([
+        df[COLUNA_CNPJ].to_numpy()[rng.integers(0, len(df), lote // 2)],
+        rng.integers(10 ** 13, 10 ** 14, lote - lote // 2).astype(np.uint64),
+    ])
+    procurados_txt = pd.Series(procurados.astype(str), dtype=TIPO_TEXTO).str.zfill(14)
+    crm = pd.DataFrame({"documento": procurados_txt.str.replace(r'^(\d{2})(\d{3})(\d{3})(\d{4})(\d{2})$', r'\1.\2.\3/\4-\5', regex=True)})
+    crm_txt = crm.assign(**{COLUNA_CNPJ: crm["documento"].str.replace(r'\D', '', regex=True)})
+
+    # Aquece o índice (em cache por arquivo/versão no app; aqui, uma ordenação já feita pelo ETL)
+    locate(df, procurados[:1])
+    locate(df_outra, procurados[:1])
+
+    operacoes = {
+        "busca_pontual": (
+            lambda: texto.isin(procurados_txt),
+            lambda: locate(df, procurados),
+        ),
+        "dedup_entre_nichos": (
+            lambda: texto.isin(texto_outra),
+            lambda: shared_with(df, df_outra),
+        ),
+        "join_externo": (
+            lambda: crm_txt.merge(df_texto.drop_duplicates(COLUNA_CNPJ), on=COLUNA_CNPJ, how='left'),
+            lambda: join_by_cnpj(crm, df, ['razao_social', 'municipio_visual'], coluna_cnpj="documento"),
+        ),
+    }
+
+    # Os dois caminhos precisam concordar antes de comparar tempos
+    assert int(texto.isin(procurados_txt).sum()) == int(np.isin(df[COLUNA_CNPJ].to_numpy(), procurados).sum())
+    assert np.array_equal(texto.isin(texto_outra).to_numpy(), shared_with(df, df_outra))
+    via_texto = crm_txt.merge(df_texto.drop_duplicates(COLUNA_CNPJ), on=COLUNA_CNPJ, how='left')
+    via_indice = join_by_cnpj(crm, df, ['razao_social', 'municipio_visual'], coluna_cnpj="documento")
+    assert via_texto['razao_social'].fillna('').tolist() == via_indice['razao_social'].fillna('').tolist()
+
+    resultado = {
+        "linhas": len(df),
+        "linhas_outra": len(df_outra),
+        "lote": lote,
+        "memoria_mb": {
+            "texto": round(texto.memory_usage(deep=True, index=False) / 1024 ** 2, 1),
+            "uint64": round(df[COLUNA_CNPJ].memory_usage(deep=True, index=False) / 1024 ** 2, 1),
+        },
+        "tempo_ms": {},
+    }
+    for operacao, (hash_texto, ordenado) in operacoes.items():
+        resultado["tempo_ms"][operacao] = {
+            "texto": round(cronometrar(hash_texto, repeticoes), 1),
+            "uint64": round(cronometrar(ordenado, repeticoes), 1),
+        }
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dados', required=True, help="pasta gerada pelo perf/synthetic_data.py")
+    parser.add_argument('--base', default="leads_saude_processed.parquet")
+    parser.add_argument('--outra', default="competitors_processed.parquet", help="nicho contra o qual deduplicar")
+    parser.add_argument('--lote', type=int, default=10_000, help="CNPJs por busca/join")
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--json', default=None, help="salva o resultado neste arquivo")
+    args = parser.parse_args()
+
+    r = comparar(os.path.join(args.dados, args.base), os.path.join(args.dados, args.outra), args.lote, args.repeticoes)
+    m = r["memoria_mb"]
+    print(f"\n{args.base} ({r['linhas']:,} linhas) x {args.outra} ({r['linhas_outra']:,} linhas), lote de {r['lote']:,} CNPJs")
+    print(f"  {'':<24}{'texto':>13}{'uint64':>13}")
+    print(f"  {'memória da coluna':<24}{m['texto']:>10.1f} MB{m['uint64']:>10.1f} MB{m['texto'] / max(m['uint64'], 0.01):>8.1f}x")
+    for operacao, t in r["tempo_ms"].items():
+        print(f"  {operacao:<24}{t['texto']:>10.1f} ms{t['uint64']:>10.1f} ms{t['texto'] / max(t['uint64'], 0.01):>8.1f}x")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(r, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
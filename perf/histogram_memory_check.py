@@ -0,0 +1,110 @@
+# --- VERIFICAÇÃO DE MEMÓRIA DO HISTOGRAMA DE MATURIDADE ---
+# Simula N reruns pedindo o PNG do histograma como os painéis pedem
+# (core.charts.age_histogram_png, com o _histograma_png em st.cache_data):
+# metade dos reruns repete recortes já vistos (hit), a outra metade traz
+# recortes novos (miss: desenha a figura e despeja a entrada mais antiga
+# do cache cheio). A memória residente é amostrada ao longo dos reruns,
+# sem tracemalloc (que infla e desloca o próprio RSS), e o teste falha se
+# ela ainda cresce na segunda metade: a inclinação (MB por mil reruns) da
+# segunda metade é comparada com a tolerância, e a da primeira é
+# mostrada para referência.
+#
+# Uso: python perf/histogram_memory_check.py --reruns 10000
+import argparse
+import gc
+import os
+import resource
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.charts import age_histogram_png  # noqa: E402
+
+ESTILO = {
+    'fundo': '#1E1E1E', 'cor_texto': 'white', 'cor': '#c0392b',
+    'linhas': [(5, 'orange', "Early Stage (Novos)"), (20, 'green', "Legacy (Tradicionais)")],
+}
+# Recortes que se repetem (hits); os demais são novos a cada rerun
+RECORRENTES = 50
+# Acima do max_entries do _histograma_png: o aquecimento enche o cache
+AQUECIMENTO = 400
+
+
+def rss_mb() -> float:
+    """Memória residente atual (Linux: /proc; demais: pico do processo)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def inclinacao(reruns: list, rss: list) -> float:
+    """MB por mil reruns (ajuste linear das amostras)."""
+    return float(np.polyfit(reruns, rss, 1)[0]) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--reruns', type=int, default=10_000)
+    parser.add_argument('--aquecimento', type=int, default=AQUECIMENTO)
+    parser.add_argument('--linhas', type=int, default=50_000)
+    parser.add_argument('--amostras', type=int, default=40, help="leituras do RSS ao longo dos reruns")
+    parser.add_argument('--tolerancia-mb', type=float, default=1.0, help="inclinação máxima da 2ª metade, em MB por mil reruns")
+    args = parser.parse_args()
+
+    # Fora do `streamlit run`, o st.cache_data usa o cache em memória do processo (avisa, mas guarda)
+    warnings.filterwarnings("ignore")
+
+    rng = np.random.default_rng(42)
+    idades = pd.Series(rng.gamma(2.0, 6.0, args.linhas))
+
+    def rerun(i: int):
+        # Recortes diferentes a cada rerun, como filtros trocando na sidebar
+        semente = i % RECORRENTES if i % 2 == 0 else RECORRENTES + i
+        return age_histogram_png(idades.sample(frac=.5, random_state=semente), 50, 30, ESTILO)
+
+    # Recortes novos do aquecimento fora da faixa dos medidos (sementes a partir de `reruns`)
+    for i in range(args.reruns, args.reruns + args.aquecimento):
+        rerun(i)
+    gc.collect()
+
+    passo = max(args.reruns // args.amostras, 1)
+    pontos, rss = [0], [rss_mb()]
+    inicio = time.perf_counter()
+    for i in range(args.reruns):
+        assert rerun(i) is not None
+        if (i + 1) % passo == 0:
+            gc.collect()
+            pontos.append(i + 1)
+            rss.append(rss_mb())
+            if len(pontos) % max(args.amostras // 10, 1) == 1:
+                print(f"rerun {i + 1:>6}: rss {rss[-1]:8.1f} MB")
+    duracao = time.perf_counter() - inicio
+
+    meio = len(pontos) // 2
+    primeira = inclinacao(pontos[:meio + 1], rss[:meio + 1])
+    segunda = inclinacao(pontos[meio:], rss[meio:])
+
+    figuras_abertas = []
+    if 'matplotlib.pyplot' in sys.modules:
+        figuras_abertas = sys.modules['matplotlib.pyplot'].get_fignums()
+
+    print(f"{args.reruns:,} reruns em {duracao:.0f}s | rss {rss[0]:.1f} -> {rss[-1]:.1f} MB "
+          f"(pico {max(rss):.1f}) | figuras pyplot abertas: {len(figuras_abertas)}")
+    print(f"Inclinação do RSS: 1ª metade {primeira:+.2f} MB/mil reruns | 2ª metade {segunda:+.2f} MB/mil reruns "
+          f"(tolerância {args.tolerancia_mb:.2f})")
+    if figuras_abertas or segunda > args.tolerancia_mb:
+        print("FALHA: memória ainda cresce na segunda metade dos reruns.")
+        return 1
+    print("OK: memória estável.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
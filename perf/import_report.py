@@ -0,0 +1,90 @@
+# --- RELATÓRIO DE TEMPO DE IMPORT (COLD START) POR APP ---
+# Executa, num processo Python novo por app, apenas os imports de topo do
+# script (o que o Streamlit paga antes da primeira linha de UI) com
+# `-X importtime`, e resume o custo por pacote.
+#
+# Uso: python perf/import_report.py [app.py app6.py ...] [--top 8] [--json saida.json]
+import argparse
+import ast
+import glob
+import json
+import os
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def top_level_imports(caminho: str) -> str:
+    """Código com apenas os imports de topo do script (e os lazy_import)."""
+    with open(caminho, encoding='utf-8') as f:
+        arvore = ast.parse(f.read(), filename=caminho)
+    nos = [
+        no for no in arvore.body
+        if isinstance(no, (ast.Import, ast.ImportFrom))
+        or (isinstance(no, ast.Assign) and isinstance(no.value, ast.Call)
+            and getattr(no.value.func, 'id', None) == 'lazy_import')
+    ]
+    return ast.unparse(ast.Module(body=nos, type_ignores=[]))
+
+
+def _importtime(codigo: str) -> str:
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', codigo],
+        cwd=RAIZ, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Falha ao executar os imports:\n{proc.stderr[-2000:]}")
+    return proc.stderr
+
+
+def _por_pacote(saida: str) -> dict:
+    """Soma o tempo cumulativo (µs) dos imports de primeiro nível por pacote raiz."""
+    pacotes = {}
+    for linha in saida.splitlines():
+        if not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        _, cumulativo, nome = linha[len('import time:'):].split('|')
+        # Só os imports de primeiro nível (sem indentação) somam no total
+        if nome.startswith('  '):
+            continue
+        raiz = nome.strip().split('.')[0]
+        pacotes[raiz] = pacotes.get(raiz, 0) + int(cumulativo)
+    return pacotes
+
+
+def measure(caminho: str) -> dict:
+    """Roda os imports do app com -X importtime e agrega por pacote raiz."""
+    codigo = "import sys; sys.path.insert(0, %r)\n%s" % (RAIZ, top_level_imports(caminho))
+    pacotes = _por_pacote(_importtime(codigo))
+    # O que o interpretador importa sozinho (site, encodings...) não é custo do app
+    for nome in _por_pacote(_importtime("pass")):
+        pacotes.pop(nome, None)
+    return {
+        'app': os.path.basename(caminho),
+        'total_ms': round(sum(pacotes.values()) / 1000, 1),
+        'pacotes_ms': {k: round(v / 1000, 1) for k, v in sorted(pacotes.items(), key=lambda kv: -kv[1])},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('apps', nargs='*')
+    parser.add_argument('--top', type=int, default=8)
+    parser.add_argument('--json', dest='saida_json')
+    args = parser.parse_args()
+
+    apps = args.apps or sorted(glob.glob(os.path.join(RAIZ, 'app*.py')))
+    resultados = [measure(os.path.abspath(app)) for app in apps]
+
+    for r in resultados:
+        principais = list(r['pacotes_ms'].items())[:args.top]
+        print(f"{r['app']:<10} {r['total_ms']:>8.1f} ms | " + ", ".join(f"{k} {v:.0f}" for k, v in principais))
+
+    if args.saida_json:
+        with open(args.saida_json, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
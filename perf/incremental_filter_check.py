@@ -0,0 +1,108 @@
+# --- TROCA SÓ DO TIER: RECORTE DA SESSÃO E PARCIAIS POR TIER x RECÁLCULO ---
+# Para uma base sintética, simula o rerun de quem só alterna tiers no
+# multiselect, em dois recortes de território (Brasil e a maior UF):
+# como era, refazendo as máscaras de UF/cidade, o filtro do tier, a
+# contagem do KPI e a matriz UF x tier do heatmap a cada troca; e com o
+# território guardado na sessão como bitmap (core.filters), cruzado com o
+# do tier antes de materializar as linhas, e os parciais por tier
+# re-somados nos marcados (core.aggregations). Mede também a primeira
+# vez de cada território (recorte + parciais) e confere que os dois
+# caminhos dão as mesmas linhas, KPI e heatmap.
+#
+# Uso: python perf/synthetic_data.py --linhas 1M --saida /tmp/bussola_1m
+#      python perf/incremental_filter_check.py --dados /tmp/bussola_1m
+import argparse
+import json
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.aggregations import heatmap_rows, sum_tiers, tier_counts, uf_tier_counts  # noqa: E402
+from core.bitmaps import filter_by_values  # noqa: E402
+from core.datasets import read_dataset  # noqa: E402
+from core.filters import RECORTES_KEY, slice_partial, territory_slice  # noqa: E402
+
+
+def cronometrar(funcao, repeticoes: int) -> float:
+    amostras = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        amostras.append((time.perf_counter() - inicio) * 1000)
+    return float(np.median(amostras))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dados', required=True, help="pasta gerada pelo perf/synthetic_data.py")
+    parser.add_argument('--base', default="leads_saude_processed.parquet")
+    parser.add_argument('--coluna', default="segmento_saude", help="coluna do multiselect de tier")
+    parser.add_argument('--flag', default="is_key_account", help="flag 0/1 do KPI de contagem")
+    parser.add_argument('--combinacoes', type=int, default=10)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--json', default=None, help="salva o resultado neste arquivo")
+    args = parser.parse_args()
+
+    # Fora do `streamlit run`, o session_state é o da sessão avulsa (avisa, mas guarda)
+    warnings.filterwarnings("ignore")
+    import streamlit as st
+
+    df = read_dataset(os.path.join(args.dados, args.base))
+    if args.flag not in df.columns:
+        df[args.flag] = df[args.coluna].isin(df[args.coluna].value_counts().index[-1:]).astype(int)
+    tiers = df[args.coluna].dropna().unique().tolist()
+    rng = np.random.default_rng(0)
+    combinacoes = [rng.choice(tiers, int(rng.integers(1, len(tiers))), replace=False).tolist() for _ in range(args.combinacoes)]
+
+    def recalcular(uf, sel):
+        """O rerun como era: território, tier, KPI e heatmap do zero."""
+        recorte = df.copy() if uf == "Todos" else df[df['uf_norm'] == uf]
+        recorte = filter_by_values(recorte, df, args.coluna, sel)
+        kpi = int(recorte[args.flag].sum())
+        return recorte, kpi, heatmap_rows(uf_tier_counts(recorte, args.coluna), tiers)
+
+    def reaproveitar(uf, sel):
+        """O rerun com o território da sessão e os parciais por tier."""
+        recorte = territory_slice(df, uf, coluna=args.coluna, valores=sel)
+        kpi = int(sum_tiers(slice_partial(recorte, "kpis", lambda r: tier_counts(r, args.coluna, [args.flag])), sel)[args.flag])
+        contagem = slice_partial(recorte, "heatmap", lambda r: uf_tier_counts(r, args.coluna))
+        return recorte, kpi, heatmap_rows(contagem, tiers, 15, sel)
+
+    resultado = {"base": args.base, "linhas": len(df), "recortes": {}}
+    for uf in ("Todos", df['uf_norm'].value_counts().index[0]):
+        st.session_state.pop(RECORTES_KEY, None)
+        inicio = time.perf_counter()
+        reaproveitar(uf, tiers)
+        primeira_ms = (time.perf_counter() - inicio) * 1000
+
+        tempos = {"recalculo": [], "sessao": []}
+        for sel in combinacoes:
+            antes, depois = recalcular(uf, sel), reaproveitar(uf, sel)
+            assert antes[0].index.equals(depois[0].index) and antes[1] == depois[1], sel
+            pd.testing.assert_frame_equal(antes[2], depois[2])
+            tempos["recalculo"].append(cronometrar(lambda: recalcular(uf, sel), args.repeticoes))
+            tempos["sessao"].append(cronometrar(lambda: reaproveitar(uf, sel), args.repeticoes))
+        resultado["recortes"][uf] = {
+            "linhas": len(territory_slice(df, uf)),
+            "primeira_vez_ms": round(primeira_ms, 1),
+            **{k: round(float(np.median(v)), 2) for k, v in tempos.items()},
+        }
+
+    print(f"\n{args.base}: {len(df):,} linhas, {len(tiers)} valores em {args.coluna}, {args.combinacoes} trocas de tier")
+    print(f"  {'território':<14}{'linhas':>10}{'recálculo':>12}{'sessão':>10}{'1ª vez':>10}  (ms, mediana)")
+    for uf, r in resultado["recortes"].items():
+        print(f"  {uf:<14}{r['linhas']:>10,}{r['recalculo']:>12.2f}{r['sessao']:>10.2f}{r['primeira_vez_ms']:>10.1f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
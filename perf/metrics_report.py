@@ -0,0 +1,156 @@
+# --- RELATÓRIO OFFLINE DAS MÉTRICAS DE PRODUÇÃO ---
+# Lê o log JSONL rotativo gravado pelos apps (core.metrics, com
+# BUSSOLA_METRICS_DIR definido) e resume p50/p95 dos reruns por nicho e
+# aba, as etapas mais lentas, a taxa de acerto dos caches, os exports e a
+# pegada de memória mais recente de cada base.
+#
+# Uso: python perf/metrics_report.py /var/log/bussola
+#      python perf/metrics_report.py /var/log/bussola --desde 2026-10-01T00:00:00 --json resumo.json
+import argparse
+import glob
+import json
+import os
+import sys
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from core.metrics import ETAPAS_EXPORT, LOG_ARQUIVO  # noqa: E402
+
+
+def ler_eventos(pasta: str, desde: str = None) -> list:
+    """Eventos de todos os arquivos do log (o atual e os rotacionados)."""
+    eventos = []
+    for caminho in sorted(glob.glob(os.path.join(pasta, LOG_ARQUIVO + "*")), reverse=True):
+        with open(caminho, encoding='utf-8') as f:
+            for linha in f:
+                try:
+                    evento = json.loads(linha)
+                except ValueError:
+                    continue
+                if desde is None or evento.get("ts", "") >= desde:
+                    eventos.append(evento)
+    return eventos
+
+
+def _percentis(valores: list) -> dict:
+    ms = np.array(valores, dtype='float64')
+    return {
+        "n": len(ms),
+        "p50_ms": round(float(np.percentile(ms, 50)), 1),
+        "p95_ms": round(float(np.percentile(ms, 95)), 1),
+    }
+
+
+def resumir(eventos: list, top_etapas: int = 15) -> dict:
+    reruns = [e for e in eventos if e.get("evento") == "rerun"]
+
+    por_visao, por_etapa, cache = {}, {}, {}
+    for e in reruns:
+        nicho = e.get("nicho") or e.get("painel")
+        por_visao.setdefault((nicho, e.get("aba") or "-"), []).append(e["total_ms"])
+        for etapa in e.get("etapas", []):
+            por_etapa.setdefault((nicho, etapa["etapa"]), []).append(etapa["duracao_ms"])
+        for nome, contagem in e.get("cache", {}).items():
+            total = cache.setdefault(nome, {"hit": 0, "miss": 0})
+            total["hit"] += contagem.get("hit", 0)
+            total["miss"] += contagem.get("miss", 0)
+
+    exports = {}
+    for e in eventos:
+        if e.get("evento") == "export":
+            exports.setdefault(e["formato"], {"bytes": [], "ms": []})
+            exports[e["formato"]]["bytes"].append(e["bytes"])
+            exports[e["formato"]]["ms"].append(e["duracao_ms"])
+        elif e.get("evento") == "rerun":
+            for etapa in e.get("etapas", []):
+                if etapa.get("bytes") is not None:
+                    formato = ETAPAS_EXPORT.get(etapa["etapa"], etapa["etapa"])
+                    exports.setdefault(formato, {"bytes": [], "ms": []})
+                    exports[formato]["bytes"].append(etapa["bytes"])
+                    exports[formato]["ms"].append(etapa["duracao_ms"])
+
+    # Pegada de memória: vale o evento mais recente de cada base
+    memoria = {}
+    for e in eventos:
+        if e.get("evento") == "memoria" and e["ts"] >= memoria.get(e["dataset"], {}).get("ts", ""):
+            memoria[e["dataset"]] = e
+
+    etapas = sorted(
+        ({"nicho": n, "etapa": et, **_percentis(v)} for (n, et), v in por_etapa.items()),
+        key=lambda r: r["p95_ms"], reverse=True,
+    )
+    return {
+        "reruns": len(reruns),
+        "por_visao": [{"nicho": n, "aba": a, **_percentis(v)} for (n, a), v in sorted(por_visao.items())],
+        "etapas_mais_lentas": etapas[:top_etapas],
+        "cache": {
+            nome: {**c, "taxa_acerto": round(c["hit"] / (c["hit"] + c["miss"]), 3) if c["hit"] + c["miss"] else None}
+            for nome, c in sorted(cache.items())
+        },
+        "exports": {
+            formato: {
+                **_percentis(v["ms"]),
+                "bytes_mediana": int(np.median(v["bytes"])),
+                "bytes_max": int(max(v["bytes"])),
+            }
+            for formato, v in sorted(exports.items())
+        },
+        "memoria": {
+            dataset: {k: e[k] for k in ("bytes", "pct_texto", "economia_projetada", "pct_economia")}
+            for dataset, e in sorted(memoria.items())
+        },
+    }
+
+
+def imprimir(resumo: dict):
+    print(f"{resumo['reruns']} reruns\n")
+    print(f"{'nicho':<28}{'aba':<40}{'n':>7}{'p50':>10}{'p95':>10}")
+    for r in resumo["por_visao"]:
+        print(f"{str(r['nicho'])[:27]:<28}{str(r['aba'])[:39]:<40}{r['n']:>7}{r['p50_ms']:>8.0f}ms{r['p95_ms']:>8.0f}ms")
+
+    print(f"\n{'nicho':<28}{'etapa (maiores p95)':<40}{'n':>7}{'p50':>10}{'p95':>10}")
+    for r in resumo["etapas_mais_lentas"]:
+        print(f"{str(r['nicho'])[:27]:<28}{r['etapa'][:39]:<40}{r['n']:>7}{r['p50_ms']:>8.0f}ms{r['p95_ms']:>8.0f}ms")
+
+    if resumo["cache"]:
+        print(f"\n{'cache':<16}{'hits':>9}{'misses':>9}{'acerto':>9}")
+        for nome, c in resumo["cache"].items():
+            taxa = f"{c['taxa_acerto']:.1%}" if c["taxa_acerto"] is not None else "-"
+            print(f"{nome:<16}{c['hit']:>9}{c['miss']:>9}{taxa:>9}")
+
+    if resumo["exports"]:
+        print(f"\n{'export':<10}{'n':>7}{'p50':>10}{'p95':>10}{'mediana':>12}{'máx':>12}")
+        for formato, x in resumo["exports"].items():
+            print(f"{formato:<10}{x['n']:>7}{x['p50_ms']:>8.0f}ms{x['p95_ms']:>8.0f}ms"
+                  f"{x['bytes_mediana'] / 1024:>10.0f}KB{x['bytes_max'] / 1024:>10.0f}KB")
+
+    if resumo["memoria"]:
+        print(f"\n{'base':<40}{'memória':>12}{'textos':>9}{'economia projetada':>22}")
+        for dataset, m in resumo["memoria"].items():
+            print(f"{dataset[:39]:<40}{m['bytes'] / 1024 ** 2:>10.1f}MB{m['pct_texto']:>8.0f}%"
+                  f"{m['economia_projetada'] / 1024 ** 2:>12.1f}MB ({m['pct_economia']:.0f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('pasta', help="BUSSOLA_METRICS_DIR dos apps")
+    parser.add_argument('--desde', default=None, help="só eventos a partir deste instante (ISO, ex.: 2026-10-01T00:00:00)")
+    parser.add_argument('--top', type=int, default=15, help="quantas etapas listar")
+    parser.add_argument('--json', default=None, help="salva o resumo neste arquivo")
+    args = parser.parse_args()
+
+    eventos = ler_eventos(args.pasta, args.desde)
+    if not eventos:
+        raise SystemExit(f"Nenhum evento em {args.pasta}: os apps rodaram com BUSSOLA_METRICS_DIR apontando para lá?")
+    resumo = resumir(eventos, args.top)
+    imprimir(resumo)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resumo, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
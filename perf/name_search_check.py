@@ -0,0 +1,103 @@
+# --- BUSCA DE EMPRESAS: ÍNDICE DE TRIGRAMAS x VARREDURA DE TEXTO ---
+# Constrói (ou reaproveita) o índice de nomes de cada base sintética
+# (core.search) e mede: tempo de construção, tamanho em disco, latência
+# da busca em todas as bases (p50/p95, índice mapeado e já no page
+# cache) e a mesma consulta feita como hoje seria possível, varrendo a
+# razão social com `str.contains` sem acentos. As consultas são trechos
+# de nomes reais das bases, em minúsculas e sem acentos, como um vendedor
+# digitaria.
+#
+# Uso: python perf/synthetic_data.py --linhas 1M --saida /tmp/bussola_1m
+#      python perf/name_search_check.py --dados /tmp/bussola_1m
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.search import COLUNA_NOME, build_name_index, index_path, normalize_names, search_names  # noqa: E402
+
+
+def _tamanho(pasta: str) -> int:
+    return sum(os.path.getsize(os.path.join(pasta, f)) for f in os.listdir(pasta))
+
+
+def _consultas(caminhos: list, quantidade: int, seed: int) -> list:
+    """Duas a três palavras seguidas de nomes sorteados, sem acento e em minúsculas."""
+    rng = np.random.default_rng(seed)
+    consultas = []
+    for i in range(quantidade):
+        caminho = caminhos[i % len(caminhos)]
+        linhas = pq.ParquetFile(caminho).metadata.num_rows
+        nome = pq.read_table(caminho, columns=[COLUNA_NOME]).column(0)[int(rng.integers(linhas))].as_py()
+        palavras = normalize_names([nome])[0].as_py().split()
+        inicio = int(rng.integers(max(1, len(palavras) - 2)))
+        consultas.append(" ".join(palavras[inicio:inicio + int(rng.integers(2, 4))]).lower())
+    return consultas
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dados', required=True, help="pasta gerada pelo perf/synthetic_data.py")
+    parser.add_argument('--consultas', type=int, default=30)
+    parser.add_argument('--limite', type=int, default=20)
+    parser.add_argument('--reconstruir', action='store_true', help="refaz os índices mesmo se já existirem")
+    parser.add_argument('--sem-varredura', action='store_true', help="pula a comparação com str.contains (lenta em 10M)")
+    parser.add_argument('--json', default=None, help="salva o resultado neste arquivo")
+    args = parser.parse_args()
+
+    caminhos = sorted(glob.glob(os.path.join(args.dados, "*.parquet")))
+    resultado = {"bases": {}, "consultas": {}}
+    for caminho in caminhos:
+        if args.reconstruir or not os.path.exists(os.path.join(index_path(caminho), "meta.json")):
+            inicio = time.perf_counter()
+            build_name_index(pq.read_table(caminho, columns=[COLUNA_NOME]).column(0), caminho)
+            resultado["bases"][os.path.basename(caminho)] = {"construcao_s": round(time.perf_counter() - inicio, 1)}
+        base = resultado["bases"].setdefault(os.path.basename(caminho), {})
+        base["linhas"] = pq.ParquetFile(caminho).metadata.num_rows
+        base["indice_mb"] = round(_tamanho(index_path(caminho)) / 1024 ** 2, 1)
+
+    total = sum(b["linhas"] for b in resultado["bases"].values())
+    print(f"\n{len(caminhos)} bases, {total:,} nomes")
+    for nome, b in resultado["bases"].items():
+        print(f"  {nome:<40}{b['linhas']:>12,} linhas{b['indice_mb']:>9.1f} MB" + (f"{b['construcao_s']:>8.1f}s" if "construcao_s" in b else ""))
+
+    consultas = _consultas(caminhos, args.consultas, seed=0)
+    search_names(consultas[0], caminhos, args.limite)   # abre os mapas (cache) e aquece o page cache
+
+    tempos = []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        achados = search_names(consulta, caminhos, args.limite)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        resultado["consultas"][consulta] = {"ms": round(tempos[-1], 1), "achados": len(achados)}
+    resultado["indice_ms"] = {"p50": round(float(np.percentile(tempos, 50)), 1), "p95": round(float(np.percentile(tempos, 95)), 1)}
+    print(f"\n  índice de trigramas      p50 {resultado['indice_ms']['p50']:>8.1f} ms   p95 {resultado['indice_ms']['p95']:>8.1f} ms")
+
+    if not args.sem_varredura:
+        # Nomes já normalizados em memória: o custo medido é só a varredura
+        nomes = [normalize_names(pq.read_table(c, columns=[COLUNA_NOME]).column(0)) for c in caminhos]
+        varredura = []
+        for consulta in consultas[:5]:
+            padrao = normalize_names([consulta])[0].as_py().strip()
+            inicio = time.perf_counter()
+            for array in nomes:
+                pc.match_substring(array, padrao)
+            varredura.append((time.perf_counter() - inicio) * 1000)
+        resultado["varredura_ms"] = {"p50": round(float(np.percentile(varredura, 50)), 1)}
+        print(f"  varredura (str.contains) p50 {resultado['varredura_ms']['p50']:>8.1f} ms")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+# --- TESTE DE LATÊNCIA COM SESSÕES CONCORRENTES (AppTest) ---
+# Simula N usuários usando os painéis ao mesmo tempo, num único processo
+# (como o hub.py em produção): cada sessão é uma thread com seu próprio
+# AppTest e segue o roteiro de uso típico — abrir o painel, escolher UF,
+# escolher cidade, tirar e recolocar um segmento, passar por todas as abas
+# e baixar o CSV. Mede o tempo de cada rerun por interação (p50/p95/p99) e
+# o pico de memória (RSS) do processo.
+#
+# Uso: python perf/synthetic_data.py --linhas 100k --saida /tmp/bussola_100k
+#      python perf/session_load_test.py --dados /tmp/bussola_100k --sessoes 8
+#      python perf/session_load_test.py --dados /tmp/bussola_100k --paineis app6-saude-privada --sessoes 4 --rodadas 3
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import traceback
+import warnings
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# Multiselects de segmento/porte de cada painel (o primeiro que existir)
+CHAVES_SEGMENTO = ("filtro_tier", "filtro_segmento", "filtro_porte")
+
+
+def _da_chave(widget, chave: str) -> bool:
+    """Widget de filtro `chave`, com ou sem o sufixo do nicho (hubs usam `filtro_uf_<nicho>`)."""
+    return widget.key == chave or str(widget.key).startswith(f"{chave}_")
+
+
+def script_painel(entrada: dict):
+    """Script de cada sessão: o mesmo render_niche que o hub.py usa por página."""
+    from core.niches import render_niche
+    render_niche(entrada)
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for linha in f:
+            if linha.startswith("VmRSS:"):
+                return int(linha.split()[1]) / 1024
+    return 0.0
+
+
+class MonitorRSS(threading.Thread):
+    """Amostra o RSS do processo enquanto as sessões rodam."""
+
+    def __init__(self, intervalo: float = 0.05):
+        super().__init__(daemon=True)
+        self.intervalo = intervalo
+        self.pico_mb = _rss_mb()
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            self.pico_mb = max(self.pico_mb, _rss_mb())
+
+    def parar(self) -> float:
+        self._parar.set()
+        self.join()
+        return max(self.pico_mb, _rss_mb())
+
+
+def _runtime_compartilhado():
+    """Um Runtime de teste para o processo inteiro, com uma sessão por thread.
+
+    O AppTest instala um Runtime novo (com seu MediaFileManager) a cada
+    run() e o desfaz no fim, e todo AppTest usa o mesmo id de sessão: entre
+    threads, uma sessão buscaria o download de outra (ou acharia Runtime
+    nenhum) e o fim de um rerun apagaria os downloads das demais. No
+    servidor de verdade há um Runtime por processo e um id por sessão;
+    aqui também.
+    """
+    from unittest.mock import MagicMock
+
+    from streamlit.components.v2.component_manager import BidiComponentManager
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.dataframe_source_manager import DataframeSourceManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = DataframeSourceManager()
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    componentes = BidiComponentManager()
+    componentes.discover_and_register_components(start_file_watching=False)
+    runtime.bidi_component_registry = componentes
+
+    Runtime.instance = classmethod(lambda cls: runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+
+    init_original = LocalScriptRunner.__init__
+
+    def init_com_sessao_propria(self, *args, **kwargs):
+        init_original(self, *args, **kwargs)
+        self._session_id = threading.current_thread().name
+
+    LocalScriptRunner.__init__ = init_com_sessao_propria
+    return runtime
+
+
+class Sessao(threading.Thread):
+    """Um usuário: roteiro de interações sobre um painel do registro."""
+
+    def __init__(self, numero: int, entrada: dict, args, largada: threading.Barrier, runtime):
+        super().__init__(name=f"sessao-{numero}", daemon=True)
+        self.numero = numero
+        self.entrada = entrada
+        self.args = args
+        self.largada = largada
+        self.runtime = runtime
+        self.rng = random.Random(args.semente + numero)
+        self.tempos = []
+        self.excecoes = []
+
+    def _rerun(self, at, etapa: str):
+        if self.args.pausa:
+            time.sleep(self.rng.uniform(0, 2 * self.args.pausa))
+        inicio = time.perf_counter()
+        at.run()
+        self.tempos.append((etapa, (time.perf_counter() - inicio) * 1000))
+        for excecao in at.exception:
+            self.excecoes.append({"etapa": etapa, "mensagem": str(excecao.value)[:300]})
+
+    def _escolher(self, widget, limite: int = None) -> bool:
+        opcoes = [o for o in widget.options if o not in ("Todos", "Todas")][:limite]
+        if not opcoes:
+            return False
+        widget.select(self.rng.choice(opcoes))
+        return True
+
+    def _baixar(self, at):
+        for botao in at.get("download_button"):
+            if botao.proto.deferred_file_id and "CSV" in botao.proto.label:
+                inicio = time.perf_counter()
+                self.runtime.media_file_mgr.execute_deferred(botao.proto.deferred_file_id)
+                self.tempos.append(("download_csv", (time.perf_counter() - inicio) * 1000))
+
+    def roteiro(self, at):
+        self._rerun(at, "carga_inicial")
+
+        ufs = [s for s in at.selectbox if _da_chave(s, "filtro_uf")]
+        if ufs and self._escolher(ufs[0]):
+            self._rerun(at, "escolher_uf")
+
+        cidades = [s for s in at.selectbox if _da_chave(s, "filtro_cidade")]
+        # As primeiras opções em ordem alfabética: mistura capitais e cidades pequenas
+        if cidades and self._escolher(cidades[0], limite=10):
+            self._rerun(at, "escolher_cidade")
+
+        segmentos = [m for m in at.multiselect if any(_da_chave(m, c) for c in CHAVES_SEGMENTO)]
+        if segmentos and len(segmentos[0].value) > 1:
+            segmento = segmentos[0]
+            removido = self.rng.choice(segmento.value)
+            segmento.unselect(removido)
+            self._rerun(at, "remover_segmento")
+            at.multiselect(key=segmento.key).select(removido)
+            self._rerun(at, "restaurar_segmento")
+
+        for posicao, aba in enumerate([t.label for t in at.tabs][1:], start=2):
+            at.session_state["aba_ativa"] = aba
+            self._rerun(at, f"aba_{posicao}")
+            self._baixar(at)
+
+    def run(self):
+        from streamlit.testing.v1 import AppTest
+
+        self.largada.wait()
+        for _ in range(self.args.rodadas):
+            at = AppTest.from_function(script_painel, args=(self.entrada,), default_timeout=self.args.timeout)
+            try:
+                self.roteiro(at)
+            except Exception:
+                self.excecoes.append({"etapa": "roteiro", "mensagem": traceback.format_exc(limit=3)[-600:]})
+
+
+def resumir(sessoes: list) -> dict:
+    por_etapa = {}
+    for sessao in sessoes:
+        for etapa, ms in sessao.tempos:
+            por_etapa.setdefault(etapa, []).append(ms)
+    resumo = {}
+    for etapa, amostras in por_etapa.items():
+        ms = np.array(amostras)
+        resumo[etapa] = {
+            "n": len(ms),
+            "p50_ms": round(float(np.percentile(ms, 50)), 1),
+            "p95_ms": round(float(np.percentile(ms, 95)), 1),
+            "p99_ms": round(float(np.percentile(ms, 99)), 1),
+            "max_ms": round(float(ms.max()), 1),
+        }
+    return resumo
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dados', required=True, help="pasta com as bases (ex.: saída do synthetic_data.py)")
+    parser.add_argument('--sessoes', type=int, default=8, help="usuários simultâneos")
+    parser.add_argument('--rodadas', type=int, default=1, help="vezes que cada sessão repete o roteiro")
+    parser.add_argument('--paineis', nargs='*', default=None, help="slugs do registro (padrão: todos com base disponível)")
+    parser.add_argument('--pausa', type=float, default=0.0, help="tempo médio de 'leitura' entre interações, em s")
+    parser.add_argument('--timeout', type=float, default=300.0, help="limite de cada rerun, em s")
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', default=os.path.join(RAIZ, "perf", "resultados"))
+    args = parser.parse_args()
+
+    # Antes de importar core.datasets: os painéis resolvem as bases por aqui
+    os.environ["BUSSOLA_DATA_DIR"] = os.path.abspath(args.dados)
+    os.environ.pop("BUSSOLA_SHM_DIR", None)
+    warnings.filterwarnings("ignore")
+
+    import streamlit.logger
+
+    from core.datasets import dataset_path
+    from core.niches import niche_registry
+
+    streamlit.logger.set_log_level("error")
+    entradas = {slug: e for secao in niche_registry().values() for slug, e in secao.items()}
+    selecionadas = args.paineis or [s for s, e in entradas.items() if os.path.exists(dataset_path(e["path"]))]
+    if not selecionadas:
+        raise SystemExit(f"Nenhuma base encontrada em {args.dados}: rode o perf/synthetic_data.py primeiro.")
+
+    runtime = _runtime_compartilhado()
+    largada = threading.Barrier(args.sessoes)
+    sessoes = [
+        Sessao(i, entradas[selecionadas[i % len(selecionadas)]], args, largada, runtime)
+        for i in range(args.sessoes)
+    ]
+
+    rss_base = _rss_mb()
+    monitor = MonitorRSS()
+    monitor.start()
+    inicio = time.perf_counter()
+    for sessao in sessoes:
+        sessao.start()
+    for sessao in sessoes:
+        sessao.join()
+    duracao = time.perf_counter() - inicio
+    rss_pico = monitor.parar()
+    streamlit.logger.set_log_level("error")
+
+    resumo = resumir(sessoes)
+    excecoes = [dict(sessao=s.numero, painel=s.entrada["title"], **e) for s in sessoes for e in s.excecoes]
+
+    print(f"{args.sessoes} sessões x {args.rodadas} rodada(s) em {len(selecionadas)} painel(is), {duracao:.1f}s no total")
+    print(f"{'interação':<22}{'n':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'máx':>10}")
+    for etapa, m in resumo.items():
+        print(f"{etapa:<22}{m['n']:>6}{m['p50_ms']:>8.0f}ms{m['p95_ms']:>8.0f}ms{m['p99_ms']:>8.0f}ms{m['max_ms']:>8.0f}ms")
+    print(f"RSS: {rss_base:.0f} MB antes das sessões, pico {rss_pico:.0f} MB "
+          f"(ru_maxrss {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB)")
+    if excecoes:
+        print(f"\n{len(excecoes)} exceção(ões) nos reruns:")
+        for e in excecoes[:10]:
+            print(f"  sessão {e['sessao']} ({e['painel']}), {e['etapa']}: {e['mensagem'].strip().splitlines()[-1]}")
+
+    os.makedirs(args.saida, exist_ok=True)
+    destino = os.path.join(args.saida, f"sessoes-{args.sessoes}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(destino, 'w', encoding='utf-8') as f:
+        json.dump({
+            "quando": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "dados": os.path.abspath(args.dados),
+            "sessoes": args.sessoes,
+            "rodadas": args.rodadas,
+            "paineis": selecionadas,
+            "duracao_s": round(duracao, 1),
+            "rss_mb": {"base": round(rss_base), "pico": round(rss_pico)},
+            "interacoes": resumo,
+            "excecoes": excecoes,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados salvos em {destino}")
+    sys.exit(1 if excecoes else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# --- VERIFICAÇÃO DO STORE EM MEMÓRIA COMPARTILHADA ---
+# Publica uma base sintética no store e sobe N processos "worker" que a
+# anexam e percorrem todas as colunas. Compara a memória somada (PSS) com
+# o modo antigo, em que cada worker lê o próprio parquet.
+#
+# Uso: python perf/shared_store_check.py --workers 4 --linhas 1000000
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import shared_store  # noqa: E402
+
+
+def memoria_mb() -> dict:
+    """PSS e memória anônima (heap próprio, não compartilhável) do processo (Linux)."""
+    valores = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for linha in f:
+            campo, _, resto = linha.partition(':')
+            if campo in ('Pss', 'Anonymous'):
+                valores[campo] = int(resto.split()[0]) / 1024
+    return {"pss": valores['Pss'], "privada": valores['Anonymous']}
+
+
+def _worker(modo, parquet, shm_dir, pronto, liberar, fila):
+    base = memoria_mb()
+    if modo == "store":
+        df = shared_store.attach(os.path.basename(parquet), shm_dir)
+    else:
+        df = pd.read_parquet(parquet)
+    # Toca todas as colunas, como os filtros e agregações fazem
+    for col in df.columns:
+        if pd.api.types.is_numeric_dtype(df[col]):
+            df[col].sum()
+        else:
+            df[col].iloc[::1000].tolist()
+    # Mede só depois que todos anexaram: páginas mapeadas por um único
+    # processo ainda aparecem como privadas
+    pronto.wait()
+    atual = memoria_mb()
+    fila.put({k: atual[k] - base[k] for k in atual})
+    liberar.wait()
+
+
+def medir(modo, parquet, shm_dir, workers) -> list:
+    ctx = mp.get_context("spawn")
+    pronto, liberar, fila = ctx.Barrier(workers + 1), ctx.Event(), ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(modo, parquet, shm_dir, pronto, liberar, fila)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    # Todos os workers vivos ao mesmo tempo: o PSS divide as páginas compartilhadas
+    pronto.wait()
+    resultados = [fila.get() for _ in procs]
+    liberar.set()
+    for p in procs:
+        p.join()
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--linhas', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        # CNPJ como o ETL grava (core.schema): uint64
+        "cnpj_completo": rng.integers(10 ** 13, 10 ** 14, args.linhas, dtype=np.uint64),
+        "capital_social": rng.gamma(2.0, 50_000, args.linhas),
+        "idade_empresa_anos": rng.gamma(2.0, 6.0, args.linhas),
+        "uf_norm": rng.choice(["SP", "RJ", "MG", "PR", "RS", "BA"], args.linhas),
+        "municipio_norm": rng.choice([f"municipio {i}" for i in range(5000)], args.linhas),
+        "razao_social": [f"EMPRESA {i} LTDA" for i in range(args.linhas)],
+    })
+
+    with tempfile.TemporaryDirectory() as pasta, tempfile.TemporaryDirectory(dir="/dev/shm") as shm_dir:
+        parquet = os.path.join(pasta, "sintetico.parquet")
+        df.to_parquet(parquet, index=False)
+        entrada = shared_store.publish(parquet, shm_dir)
+        print(f"Segmento publicado: {entrada['bytes'] / 1024 ** 2:.1f} MB")
+
+        for modo in ("parquet", "store"):
+            resultados = medir(modo, parquet, shm_dir, args.workers)
+            pss = sum(r["pss"] for r in resultados)
+            privada = sum(r["privada"] for r in resultados)
+            print(f"{modo:<8} {args.workers} workers | PSS somado {pss:8.1f} MB | heap próprio somado {privada:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# --- COMPARAÇÃO: TEXTOS EM OBJECT x STRING ARROW ---
+# Lê cada base sintética duas vezes, com os textos como `object` (strings
+# Python, o padrão do pandas 2) e como string Arrow (esquema de serviço,
+# core.schema), e compara memória profunda e o tempo das operações de
+# texto que os loaders e os painéis fazem: normalização de bairro e
+# município, busca de substring, filtro por cidade, contagem por UF e
+# export CSV do recorte.
+#
+# Uso: python perf/synthetic_data.py --linhas 1M --saida /tmp/bussola_1m
+#      python perf/string_dtype_check.py --dados /tmp/bussola_1m
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.schema import TIPO_TEXTO, compact_schema  # noqa: E402
+
+# Mesmas operações dos load_data/main() (ver app*.py); cada uma recebe a base inteira
+OPERACOES = {
+    "bairro.lower.strip": lambda df: df['bairro'].str.lower().str.strip(),
+    "municipio.title": lambda df: df['municipio'].str.title(),
+    "razao_social.contains": lambda df: df['razao_social'].str.contains('LTDA', na=False, regex=False),
+    "natureza.startswith": lambda df: df['natureza_juridica'].str.startswith('2'),
+    "email.lower": lambda df: df['email_contato'].str.lower(),
+    "filtro_cidade": lambda df: df[df['municipio_norm'] == df['municipio_norm'].iloc[0]],
+    "contagem_uf": lambda df: df.groupby('uf_norm', observed=True).size(),
+    "csv_uf": lambda df: df[df['uf_norm'] == 'SP'].to_csv(index=False),
+}
+
+
+def _textos(df: pd.DataFrame) -> list:
+    return [c for c in df.columns if df[c].dtype == TIPO_TEXTO]
+
+
+def cronometrar(funcao, df, repeticoes: int) -> float:
+    amostras = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(df)
+        amostras.append((time.perf_counter() - inicio) * 1000)
+    return float(np.median(amostras))
+
+
+def comparar(arquivo: str, repeticoes: int) -> dict:
+    arrow = compact_schema(pd.read_parquet(arquivo))
+    textos = _textos(arrow)
+    objeto = arrow.astype({c: object for c in textos})
+
+    resultado = {"linhas": len(arrow), "colunas_texto": len(textos), "memoria_mb": {}, "tempo_ms": {}}
+    for nome, df in (("object", objeto), ("arrow", arrow)):
+        resultado["memoria_mb"][nome] = round(df[textos].memory_usage(deep=True, index=False).sum() / 1024 ** 2, 1)
+    for operacao, funcao in OPERACOES.items():
+        resultado["tempo_ms"][operacao] = {
+            nome: round(cronometrar(funcao, df, repeticoes), 1) for nome, df in (("object", objeto), ("arrow", arrow))
+        }
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dados', required=True, help="pasta gerada pelo perf/synthetic_data.py")
+    parser.add_argument('--arquivos', nargs='*', default=None, help="só estes arquivos (padrão: todos os .parquet)")
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--json', default=None, help="salva o resultado neste arquivo")
+    args = parser.parse_args()
+
+    arquivos = args.arquivos or sorted(os.path.basename(p) for p in glob.glob(os.path.join(args.dados, "*.parquet")))
+    resultados = {}
+    for arquivo in arquivos:
+        r = resultados[arquivo] = comparar(os.path.join(args.dados, arquivo), args.repeticoes)
+        m = r["memoria_mb"]
+        print(f"\n{arquivo} ({r['linhas']:,} linhas, {r['colunas_texto']} colunas de texto)")
+        print(f"  {'memória dos textos':<24}{m['object']:>10.1f} MB{m['arrow']:>10.1f} MB{m['object'] / m['arrow']:>8.1f}x")
+        for operacao, t in r["tempo_ms"].items():
+            print(f"  {operacao:<24}{t['object']:>10.1f} ms{t['arrow']:>10.1f} ms{t['object'] / max(t['arrow'], 0.01):>8.1f}x")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,475 @@
+# --- GERADOR DE BASES SINTÉTICAS EM ESCALA RFB ---
+# Os .parquet versionados são ponteiros LFS; este script gera bases com o
+# mesmo esquema que cada painel lê, para medir desempenho localmente.
+#
+# Distribuições: UF e município concentrados (Zipf dentro da UF, capital
+# no topo), bairros com "Centro" dominante, capital social log-normal,
+# fundação com muitas empresas jovens, matrizes e filiais com a mesma
+# raiz de CNPJ (dígitos verificadores válidos) e contatos incompletos
+# como na base da Receita (DDD/telefone numéricos com nulos). Como o ETL,
+# grava cada base ordenada pelo CNPJ e, ao lado dela, o índice de nomes
+# da busca de empresas (core.search) e o índice de CNAE do filtro por
+# atividade (core.cnae).
+#
+# Uso: python perf/synthetic_data.py --linhas 1M --saida /tmp/bussola_1m
+#      BUSSOLA_DATA_DIR=/tmp/bussola_1m streamlit run hub.py
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.schema import LINHAS_POR_GRUPO, compact_schema, with_ages, with_cnpj_keys, with_contact_fields  # noqa: E402
+from core.cnae import COLUNA_CNAE, COLUNA_CNAE_SECUNDARIA, build_cnae_index  # noqa: E402
+from core.search import COLUNAS_RESULTADO, build_name_index  # noqa: E402
+
+# UF: participação aproximada no total de empresas ativas, nº de municípios e DDDs
+UFS = {
+    "SP": (29.0, 645, [11, 12, 13, 14, 15, 16, 17, 18, 19]),
+    "MG": (11.0, 853, [31, 32, 33, 34, 35, 37, 38]),
+    "RJ": (8.5, 92, [21, 22, 24]),
+    "PR": (7.0, 399, [41, 42, 43, 44, 45, 46]),
+    "RS": (7.0, 497, [51, 53, 54, 55]),
+    "SC": (5.5, 295, [47, 48, 49]),
+    "BA": (4.5, 417, [71, 73, 74, 75, 77]),
+    "GO": (3.5, 246, [62, 64]),
+    "PE": (3.0, 185, [81, 87]),
+    "CE": (2.8, 184, [85, 88]),
+    "DF": (2.2, 1, [61]),
+    "ES": (2.0, 78, [27, 28]),
+    "PA": (2.0, 144, [91, 93, 94]),
+    "MT": (2.0, 141, [65, 66]),
+    "MS": (1.4, 79, [67]),
+    "MA": (1.3, 217, [98, 99]),
+    "PB": (1.2, 223, [83]),
+    "RN": (1.1, 167, [84]),
+    "AM": (1.1, 62, [92, 97]),
+    "AL": (0.9, 102, [82]),
+    "PI": (0.9, 224, [86, 89]),
+    "SE": (0.7, 75, [79]),
+    "RO": (0.7, 52, [69]),
+    "TO": (0.6, 139, [63]),
+    "AC": (0.3, 22, [68]),
+    "AP": (0.3, 16, [96]),
+    "RR": (0.3, 15, [95]),
+}
+CAPITAIS = {
+    "SP": "São Paulo", "MG": "Belo Horizonte", "RJ": "Rio de Janeiro", "PR": "Curitiba",
+    "RS": "Porto Alegre", "SC": "Florianópolis", "BA": "Salvador", "GO": "Goiânia",
+    "PE": "Recife", "CE": "Fortaleza", "DF": "Brasília", "ES": "Vitória", "PA": "Belém",
+    "MT": "Cuiabá", "MS": "Campo Grande", "MA": "São Luís", "PB": "João Pessoa",
+    "RN": "Natal", "AM": "Manaus", "AL": "Maceió", "PI": "Teresina", "SE": "Aracaju",
+    "RO": "Porto Velho", "TO": "Palmas", "AC": "Rio Branco", "AP": "Macapá", "RR": "Boa Vista",
+}
+PREFIXOS = ["São José", "Santa Rita", "Nova", "Bom Jesus", "Santo Antônio", "Campo", "Porto", "Vila",
+            "Rio", "Serra", "Alto", "Boa Esperança", "Monte", "Lagoa", "Palmeira", "Itaú", "Jacaré",
+            "Ribeirão", "Água", "Barra"]
+SUFIXOS = ["do Sul", "da Serra", "do Norte", "das Flores", "Alegre", "Verde", "Grande", "Nova",
+           "dos Campos", "do Oeste", "da Mata", "do Rio", "Bonita", "Preto", "de Minas", "Paulista",
+           "do Leste", "Dourada", "Branca", "Azul"]
+BAIRROS = ["Centro", "Jardim América", "Vila Nova", "Santa Cecília", "Boa Vista", "Industrial",
+           "São Cristóvão", "Jardim Europa", "Vila Mariana", "Liberdade", "Bela Vista", "Aeroporto",
+           "Santo Amaro", "Parque das Nações", "Cidade Nova", "Jardim Paulista", "Vila Operária",
+           "Distrito Industrial", "Alto da Boa Vista", "Morumbi", "Pinheiros", "Consolação",
+           "Ipiranga", "Tatuapé", "Itaim Bibi", "Moema", "Brooklin", "Lapa", "Barra Funda",
+           "Água Verde", "Batel", "Savassi", "Funcionários", "Copacabana", "Tijuca", "Botafogo",
+           "Meireles", "Aldeota", "Boa Viagem", "Pituba", "Campinas", "Setor Bueno", "Asa Sul",
+           "Asa Norte", "Moinhos de Vento", "Petrópolis", "Trindade", "Centro Histórico",
+           "Jardim Botânico", "Santa Efigênia"]
+NOMES = ["Alfa", "Brasil", "Central", "Nacional", "União", "Paulista", "Horizonte", "Atlântico",
+         "Vitória", "Progresso", "Aliança", "Estrela", "Pioneira", "Continental", "Primus", "Real",
+         "Imperial", "Ideal", "Global", "Líder", "Master", "Nova Era", "Cruzeiro", "Planalto",
+         "Litoral", "Sul", "Norte", "Vale", "Serra Azul", "Ouro Verde", "Monte Sião", "Bandeirantes",
+         "Guarani", "Tupi", "Araucária", "Ipê", "Jequitibá", "Aroeira", "Cedro", "Jatobá",
+         "Santa Clara", "São Lucas", "São Bento", "Santa Luzia", "Bom Pastor", "Dom Bosco",
+         "Castelo", "Diamante", "Safira", "Esmeralda"]
+SOBRENOMES = ["Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira",
+              "Lima", "Gomes", "Costa", "Ribeiro", "Martins", "Carvalho", "Almeida", "Lopes",
+              "Soares", "Fernandes", "Vieira", "Barbosa", "Rocha", "Dias", "Nascimento", "Andrade",
+              "Moreira", "Nunes", "Marques", "Machado", "Mendes", "Freitas", "Cardoso", "Ramos",
+              "Gonçalves", "Santana", "Teixeira", "Araújo", "Pinto", "Correia", "Monteiro", "Moura"]
+# Natureza jurídica (código RFB), peso e sufixo da razão social
+NATUREZAS = {"2062": (55, "LTDA"), "2135": (20, "ME"), "2305": (8, "EIRELI"), "2240": (5, "SOCIEDADE SIMPLES"),
+             "2054": (3, "S.A."), "2046": (1, "S.A."), "3999": (4, "ASSOCIAÇÃO"), "2143": (4, "COOPERATIVA")}
+DOMINIOS = ["gmail.com", "hotmail.com", "outlook.com", "uol.com.br", "yahoo.com.br", "terra.com.br"]
+
+# Por arquivo: atividade na razão social e CNAEs (principal mais comum primeiro)
+NICHOS = {
+    "competitors_processed.parquet": ("Corretora de Seguros", ["6622300", "6621501", "6629100", "6512000", "6511101"]),
+    "leads_saude_processed.parquet": ("Clínica Médica", ["8630501", "8630503", "8640202", "8610101", "8630504", "8650004"]),
+    "leads_varejo_processed.parquet": ("Comércio Varejista", ["4711302", "4781400", "4712100", "4744099", "4755502", "4789099"]),
+    "it_market_processed.parquet": ("Tecnologia da Informação", ["6201501", "6202300", "6204000", "6203100", "6209100", "6311900"]),
+    "education_market_processed.parquet": ("Educacional", ["8513900", "8520100", "8512100", "8531700", "8593700", "8599604"]),
+    "construction_market_processed.parquet": ("Construtora", ["4120400", "4399103", "4321500", "4211101", "4330404", "7112000"]),
+    "leads_varejo_SMEI.parquet": ("Comércio", ["4711302", "4781400", "4712100", "4744099", "4755502", "4789099"]),
+    "Leads_Turismo_SMEI.parquet": ("Turismo e Hotelaria", ["5510801", "5611201", "7911200", "5590699", "5611203"]),
+    "Leads_Seguros_Financeiro.parquet": ("Serviços Financeiros", ["6622300", "6619399", "6613400", "6621501", "6463800"]),
+}
+
+ESCALAS = {"k": 1_000, "m": 1_000_000}
+# Linhas por bloco gerado (e por row group do parquet)
+BLOCO = 1_000_000
+
+
+def parse_linhas(texto: str) -> int:
+    """'100k', '1M', '10M' ou um inteiro."""
+    texto = texto.strip().lower().replace("_", "")
+    if texto[-1] in ESCALAS:
+        return int(float(texto[:-1]) * ESCALAS[texto[-1]])
+    return int(texto)
+
+
+def _pesos_zipf(n: int, a: float) -> np.ndarray:
+    pesos = 1.0 / np.arange(1, n + 1) ** a
+    return pesos / pesos.sum()
+
+
+def _texto(dicionario, indices) -> pa.Array:
+    """Materializa strings a partir de códigos (sem loop Python por linha)."""
+    return pc.take(pa.array(dicionario, type=pa.string()), pa.array(indices))
+
+
+def _municipios(uf: str, n_mun: int, deslocamento: int) -> list:
+    """Capital no topo; os demais nomes variam por UF e não se repetem dentro dela."""
+    combinacoes = len(PREFIXOS) * len(SUFIXOS)
+    nomes = [CAPITAIS[uf]]
+    for i in range(deslocamento, deslocamento + n_mun - 1):
+        nome = f"{PREFIXOS[i % len(PREFIXOS)]} {SUFIXOS[(i // len(PREFIXOS)) % len(SUFIXOS)]}"
+        if i >= combinacoes:
+            nome += f" {i // combinacoes + 1}"
+        nomes.append(nome)
+    return nomes
+
+
+def _territorio(rng, n: int) -> dict:
+    siglas = list(UFS)
+    pesos = np.array([UFS[uf][0] for uf in siglas])
+    uf_cod = rng.choice(len(siglas), n, p=pesos / pesos.sum()).astype(np.int8)
+
+    # Município: código global (dicionário de todos os municípios), Zipf dentro da UF
+    mun_cod = np.empty(n, dtype=np.int32)
+    ddd = np.empty(n, dtype=np.float64)
+    dicionario, inicio = [], 0
+    for i, uf in enumerate(siglas):
+        _, n_mun, ddds = UFS[uf]
+        linhas = np.flatnonzero(uf_cod == i)
+        mun_cod[linhas] = inicio + rng.choice(n_mun, linhas.size, p=_pesos_zipf(n_mun, 1.05))
+        ddd[linhas] = rng.choice(ddds, linhas.size, p=_pesos_zipf(len(ddds), 1.2))
+        dicionario += _municipios(uf, n_mun, deslocamento=i * 53)
+        inicio += n_mun
+
+    # Bairro: "Centro" domina; os demais variam por município
+    rank = np.minimum(rng.zipf(1.6, n), len(BAIRROS)) - 1
+    bairro_cod = np.where(rank == 0, 0, 1 + (rank + mun_cod.astype(np.int64) * 7) % (len(BAIRROS) - 1)).astype(np.int16)
+    return {"uf_cod": uf_cod, "mun_cod": mun_cod, "bairro_cod": bairro_cod, "ddd": ddd, "municipios": dicionario}
+
+
+def _digitos_verificadores(base12: np.ndarray) -> np.ndarray:
+    """DV do CNPJ (módulo 11) para bases de 12 dígitos, vetorizado (um dígito por vez)."""
+    pesos1 = [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
+    pesos2 = [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3]
+    soma1 = np.zeros(base12.size, dtype=np.int64)
+    soma2 = np.zeros(base12.size, dtype=np.int64)
+    for posicao in range(12):
+        digito = (base12 // 10 ** (11 - posicao)) % 10
+        soma1 += digito * pesos1[posicao]
+        soma2 += digito * pesos2[posicao]
+    resto = soma1 % 11
+    dv1 = np.where(resto < 2, 0, 11 - resto)
+    resto = (soma2 + dv1 * 2) % 11
+    dv2 = np.where(resto < 2, 0, 11 - resto)
+    return dv1 * 10 + dv2
+
+
+def _cnpjs(rng, n: int):
+    """Raízes (empresas) e CNPJs: ~82% matrizes, filiais concentradas em poucas redes."""
+    n_raizes = max(1, int(n * 0.82))
+    raizes = np.unique(rng.integers(10_000_000, 100_000_000, int(n_raizes * 1.05) + 10))
+    raizes = rng.permutation(raizes)[:n_raizes]
+    n_raizes = raizes.size
+
+    grupo = np.concatenate([
+        np.arange(n_raizes),
+        rng.choice(n_raizes, n - n_raizes, p=_pesos_zipf(n_raizes, 1.1)) if n > n_raizes else np.zeros(0, dtype=np.int64),
+    ])[:n].astype(np.int32)
+    # Ordem do estabelecimento dentro da raiz: 0001 para a matriz, 0002... para filiais
+    ordem = pd.Series(grupo).groupby(grupo).cumcount().to_numpy() + 1
+    base12 = raizes[grupo].astype(np.int64) * 10_000 + ordem
+    cnpj = base12 * 100 + _digitos_verificadores(base12)
+
+    embaralhar = rng.permutation(n)
+    return grupo[embaralhar], cnpj[embaralhar], n_raizes
+
+
+def _plano(n: int, arquivo: str, seed: int) -> dict:
+    """Sorteia tudo como números (códigos, valores, flags) para as `n` linhas.
+
+    Só os números ficam em memória para a base inteira; os textos são
+    montados por bloco em `_bloco`, o que permite gerar 10M de linhas.
+    """
+    rng = np.random.default_rng([seed, n, len(arquivo)])
+    plano = _territorio(rng, n)
+    plano["grupo"], plano["cnpj"], n_grupos = _cnpjs(rng, n)
+
+    # Natureza e nome são da empresa (raiz): todas as filiais herdam
+    pesos_nat = np.array([peso for peso, _ in NATUREZAS.values()], dtype=float)
+    plano["natureza"] = rng.choice(len(NATUREZAS), n_grupos, p=pesos_nat / pesos_nat.sum()).astype(np.int8)[plano["grupo"]]
+    plano["codigo_nome"] = np.random.default_rng(n_grupos).permutation(n_grupos).astype(np.int32)[plano["grupo"]]
+
+    capital = np.round(rng.lognormal(mean=10.8, sigma=2.0, size=n), 2)
+    capital[rng.random(n) < 0.03] = 0.0
+    plano["capital"] = capital
+
+    # Muitas empresas jovens e uma cauda longa de tradicionais
+    plano["idade_dias"] = np.where(
+        rng.random(n) < 0.6,
+        rng.exponential(6 * 365.25, n),
+        rng.uniform(0, 50 * 365.25, n),
+    ).clip(0, 70 * 365.25).astype(np.int32)
+
+    # Contatos incompletos, numéricos (float com NaN) como saem do CSV da RFB
+    tem_tel = rng.random(n) < 0.85
+    telefone = np.where(rng.random(n) < 0.45, rng.integers(900_000_000, 1_000_000_000, n), rng.integers(20_000_000, 60_000_000, n)).astype(np.float64)
+    telefone[~tem_tel] = np.nan
+    plano["ddd"][~tem_tel | (rng.random(n) < 0.03)] = np.nan
+    plano["telefone"] = telefone
+    plano["tem_email"] = rng.random(n) < 0.55
+    plano["dominio"] = rng.choice(len(DOMINIOS), n, p=_pesos_zipf(len(DOMINIOS), 1.0)).astype(np.int8)
+    # Parte dos e-mails vem em caixa alta no cadastro
+    plano["email_maiusculo"] = rng.random(n) < 0.2
+
+    cnaes = NICHOS[arquivo][1]
+    plano["cnae"] = rng.choice(len(cnaes), n, p=_pesos_zipf(len(cnaes), 1.3)).astype(np.int8)
+    plano["sec_quantidade"] = rng.binomial(3, 0.45, n).astype(np.int8)
+    plano["sec_inicio"] = rng.integers(0, len(cnaes), n).astype(np.int8)
+
+    # Como o ETL, o arquivo sai ordenado pelo CNPJ (core.schema.sort_by_cnpj)
+    ordem = np.argsort(plano["cnpj"], kind='stable')
+    return {k: v[ordem] if isinstance(v, np.ndarray) and v.shape == (n,) else v for k, v in plano.items()}
+
+
+def _nomes(codigo: np.ndarray, atividade: str, natureza: np.ndarray):
+    """Razão social, nome fantasia e usuário de e-mail a partir do código da raiz.
+
+    Cada raiz recebe uma combinação distinta (nome, dois sobrenomes, número).
+    """
+    nome = codigo % len(NOMES)
+    sobrenome1 = (codigo // len(NOMES)) % len(SOBRENOMES)
+    sobrenome2 = (codigo // (len(NOMES) * len(SOBRENOMES))) % len(SOBRENOMES)
+    numero = codigo // (len(NOMES) * len(SOBRENOMES) ** 2)
+    numero_txt = pc.if_else(
+        pa.array(numero > 0), pc.cast(pa.array(numero + 1), pa.string()), pa.nulls(len(codigo), pa.string()),
+    )
+    sufixos = [sufixo for _, sufixo in NATUREZAS.values()]
+    fantasia = pc.binary_join_element_wise(_texto(NOMES, nome), _texto(SOBRENOMES, sobrenome1), " ")
+    razao = pc.binary_join_element_wise(
+        fantasia, pa.scalar("&"), _texto(SOBRENOMES, sobrenome2), numero_txt, pa.scalar(atividade),
+        _texto(sufixos, natureza), " ", null_handling="skip",
+    )
+    # E-mail sem acentos: "ipê.rocha" -> "ipe.rocha"
+    usuario = pc.replace_substring_regex(
+        pc.utf8_normalize(pc.utf8_lower(pc.binary_join_element_wise(_texto(NOMES, nome), _texto(SOBRENOMES, sobrenome1), ".")), "NFKD"),
+        r"[^\x00-\x7f]|\s", "",
+    )
+    return pc.utf8_upper(razao), fantasia, usuario
+
+
+def _cnae_secundaria(quantidade: np.ndarray, inicio: np.ndarray, cnaes: list) -> pa.Array:
+    """Lista separada por vírgula, como no arquivo da RFB (0 a 3 códigos distintos)."""
+    quantidade = quantidade.astype(np.int64)
+    offsets = np.concatenate([[0], np.cumsum(quantidade)]).astype(np.int32)
+    # Posições consecutivas a partir de um início sorteado: sem códigos repetidos
+    posicao = np.arange(int(offsets[-1])) - np.repeat(offsets[:-1], quantidade)
+    codigos = _texto(cnaes, (np.repeat(inicio.astype(np.int64), quantidade) + posicao) % len(cnaes))
+    listas = pa.ListArray.from_arrays(pa.array(offsets), codigos)
+    return pc.if_else(pa.array(quantidade > 0), pc.binary_join(listas, ","), pa.nulls(len(quantidade), pa.string()))
+
+
+def _bloco(plano: dict, inicio: int, fim: int, arquivo: str, referencia: pd.Timestamp) -> pd.DataFrame:
+    """Colunas comuns a todos os nichos (estabelecimento + empresa + contato) de um bloco de linhas."""
+    p = {k: v[inicio:fim] for k, v in plano.items() if isinstance(v, np.ndarray)}
+    n = fim - inicio
+    atividade, cnaes = NICHOS[arquivo]
+    naturezas = list(NATUREZAS)
+
+    uf = _texto(list(UFS), p["uf_cod"])
+    municipio = _texto(plano["municipios"], p["mun_cod"])
+    bairro = pc.utf8_upper(_texto(BAIRROS, p["bairro_cod"]))
+    razao, fantasia, usuario = _nomes(p["codigo_nome"], atividade, p["natureza"])
+
+    email = pc.binary_join_element_wise(usuario, _texto(DOMINIOS, p["dominio"]), "@")
+    email = pc.if_else(pa.array(p["email_maiusculo"]), pc.utf8_upper(email), email)
+    email = pc.if_else(pa.array(p["tem_email"]), email, pa.nulls(n, pa.string()))
+
+    data_inicio = (referencia - pd.to_timedelta(p["idade_dias"], unit='D')).as_unit('ms')
+    tabela = pa.table({
+        "cnpj_completo": pa.array(p["cnpj"].astype(np.uint64)),
+        "razao_social": razao,
+        "nome_fantasia_final": fantasia,
+        "natureza_juridica": _texto(naturezas, p["natureza"]),
+        "uf": uf,
+        "uf_norm": uf,
+        "municipio": pc.utf8_upper(municipio),
+        "municipio_norm": municipio,
+        "municipio_visual": municipio,
+        "bairro": bairro,
+        "bairro_norm": pc.utf8_lower(bairro),
+        "capital_social": p["capital"],
+        "data_inicio_atividade": data_inicio.to_numpy(),
+        "ddd_1": p["ddd"],
+        "telefone_1": p["telefone"],
+        "email_contato": email,
+        "cnae_fiscal": _texto(cnaes, p["cnae"]),
+        "cnae_fiscal_secundaria": _cnae_secundaria(p["sec_quantidade"], p["sec_inicio"], cnaes),
+    })
+    # Esquema de serviço do ETL; a idade só serve às classificações e não é gravada
+    # Como o ETL: contato formatado, e-mail principal, qualidade do contato e raiz do CNPJ em todos os nichos
+    return with_ages(with_cnpj_keys(with_contact_fields(compact_schema(tabela.to_pandas()))), referencia.date())
+
+
+def _faixas(valores, limites: list, nomes: list, estrito: bool = False) -> np.ndarray:
+    condicoes = [(valores > c) if estrito else (valores >= c) for c in limites]
+    return np.select(condicoes, nomes[:-1], nomes[-1])
+
+
+def _competitors(df, rng):
+    # Regras do etl_to_parquet.ipynb
+    cap, idade = df['capital_social'], df['idade_empresa_anos']
+    df['tier_concorrente'] = np.select(
+        [cap <= 20000, cap <= 100000, cap <= 1000000],
+        ['Micro Corretor', 'PME (Concorrente Direto)', 'Assessoria/Consolidadora'], 'Big Player/Multinacional')
+    df['perfil_ameaca'] = np.select(
+        [(cap > 1000000) & (idade < 5), cap > 1000000, idade > 15, idade < 3],
+        ['Insurtech', 'Dominante', 'Tradicional', 'Novo Entrante'], 'Padrão')
+
+
+def _saude(df, rng):
+    df['segmento_saude'] = _faixas(df['capital_social'], [1_000_000, 300_000, 80_000],
+                                   ['Hospital/Alta Complexidade', 'Clínica Premium', 'Medicina Diagnóstica', 'Consultório/Pequeno'])
+
+
+def _varejo(df, rng):
+    df['porte_calc'] = _faixas(df['capital_social'], [500_000, 100_000], ['Medio/Grande Porte', 'Pequeno Porte', 'Micro Empresa'])
+
+
+def _varejo_smei(df, rng):
+    _varejo(df, rng)
+    # Base crua: o app7 deriva o município de exibição
+    df.drop(columns=['municipio_visual'], inplace=True)
+
+
+def _ti(df, rng):
+    cap = df['capital_social']
+    df['porte_descricao_norm'] = _faixas(cap, [4_800_000, 360_000], ['demais', 'empresa de pequeno porte', 'micro empresa'])
+    df['tier_ti'] = _faixas(cap, [1_000_000, 100_000], ['Enterprise (Grandes Contas)', 'PME (Empresas Estruturadas)', 'Micro/Pequenas (Volume)'])
+
+
+def _educacao(df, rng):
+    n = len(df)
+    segmentos = ['Ensino Fundamental', 'Ensino Infantil', 'Ensino Médio', 'Ensino Superior', 'Cursos Livres / Idiomas', 'Ensino Técnico']
+    df['segmento_educacional'] = np.array(segmentos)[rng.choice(len(segmentos), n, p=_pesos_zipf(len(segmentos), 0.9))]
+    df['tier_cliente'] = _faixas(df['capital_social'], [5_000_000, 500_000, 50_000],
+                                 ['Key Account (Grupos Educacionais)', 'Corporate (Colégios/Faculdades)', 'PME (Escola Estruturada)', 'Micro (Varejo)'],
+                                 estrito=True)
+    df['is_high_ticket'] = df['tier_cliente'].isin(['Key Account (Grupos Educacionais)', 'Corporate (Colégios/Faculdades)']).astype(int)
+
+
+def _construcao(df, rng):
+    n = len(df)
+    segmentos = ['Construção de Edifícios', 'Instalações Elétricas/Hidráulicas', 'Obras de Infraestrutura', 'Acabamento', 'Engenharia e Projetos', 'Terraplenagem']
+    seg_cod = rng.choice(len(segmentos), n, p=_pesos_zipf(len(segmentos), 0.9))
+    df['segmento_construcao'] = np.array(segmentos)[seg_cod]
+    df['tier_cliente'] = _faixas(df['capital_social'], [10_000_000, 1_000_000, 100_000],
+                                 ['Infraestrutura / Obras Públicas (>10M)', 'Grande Porte (Incorporadora)', 'Construtora PME', 'Pequena Empreiteira (Até 100k)'])
+    df['is_high_ticket'] = df['tier_cliente'].isin(['Infraestrutura / Obras Públicas (>10M)', 'Grande Porte (Incorporadora)']).astype(int)
+    canteiro = np.isin(seg_cod, [0, 2, 5])
+    df['risco_operacional'] = np.where(canteiro, 'Alto Risco (Canteiro)', 'Baixo Risco (Escritório)')
+
+
+def _sem_segmento(df, rng):
+    # Turismo e Seguros chegam sem segmento: o app6 classifica pelo capital social
+    pass
+
+
+COLUNAS_NICHO = {
+    "competitors_processed.parquet": _competitors,
+    "leads_saude_processed.parquet": _saude,
+    "leads_varejo_processed.parquet": _varejo,
+    "it_market_processed.parquet": _ti,
+    "education_market_processed.parquet": _educacao,
+    "construction_market_processed.parquet": _construcao,
+    "leads_varejo_SMEI.parquet": _varejo_smei,
+    "Leads_Turismo_SMEI.parquet": _sem_segmento,
+    "Leads_Seguros_Financeiro.parquet": _sem_segmento,
+}
+
+
+def niche_blocks(arquivo: str, n: int, seed: int = 0, bloco: int = BLOCO):
+    """Base do nicho em DataFrames de até `bloco` linhas (memória limitada ao bloco)."""
+    referencia = pd.Timestamp.now().normalize()
+    plano = _plano(n, arquivo, seed)
+    for i, inicio in enumerate(range(0, n, bloco)):
+        df = _bloco(plano, inicio, min(n, inicio + bloco), arquivo, referencia)
+        COLUNAS_NICHO[arquivo](df, np.random.default_rng([seed, n, len(arquivo), i + 1]))
+        df = compact_schema(df)
+        df.attrs.clear()
+        yield df
+
+
+def niche_dataset(arquivo: str, n: int, seed: int = 0) -> pd.DataFrame:
+    """Base inteira em memória (para bases que cabem folgadas na RAM)."""
+    return pd.concat(list(niche_blocks(arquivo, n, seed)), ignore_index=True)
+
+
+def generate(n: int, saida: str, arquivos: list = None, seed: int = 0) -> dict:
+    """Grava um .parquet de `n` linhas por arquivo de nicho; retorna {arquivo: bytes}."""
+    os.makedirs(saida, exist_ok=True)
+    gerados = {}
+    for arquivo in arquivos or list(COLUNAS_NICHO):
+        inicio = time.perf_counter()
+        destino = os.path.join(saida, arquivo)
+        escritor = None
+        exibicao, atividades = [], []
+        for df in niche_blocks(arquivo, n, seed):
+            if escritor is None:
+                tabela = pa.Table.from_pandas(df, preserve_index=False)
+                escritor = pq.ParquetWriter(destino + ".tmp", tabela.schema)
+            else:
+                tabela = pa.Table.from_pandas(df, schema=escritor.schema, preserve_index=False)
+            escritor.write_table(tabela, row_group_size=LINHAS_POR_GRUPO)
+            exibicao.append(tabela.select([c for c in COLUNAS_RESULTADO if c in tabela.column_names]))
+            atividades.append(tabela.select([c for c in (COLUNA_CNAE, COLUNA_CNAE_SECUNDARIA) if c in tabela.column_names]))
+            del df, tabela
+        escritor.close()
+        os.replace(destino + ".tmp", destino)
+        # Como o ETL: índices de trigramas da razão social e de CNAE ao lado do .parquet
+        build_name_index(pa.concat_tables(exibicao), destino)
+        build_cnae_index(pa.concat_tables(atividades), destino)
+        gerados[arquivo] = os.path.getsize(destino)
+        print(f"{arquivo:<40} {n:>11,} linhas {gerados[arquivo] / 1024 ** 2:>8.1f} MB {time.perf_counter() - inicio:>6.1f}s")
+    return gerados
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--linhas', default="100k", help="linhas por arquivo: 100k, 1M, 10M...")
+    parser.add_argument('--saida', required=True, help="pasta de destino (use como BUSSOLA_DATA_DIR)")
+    parser.add_argument('--arquivos', nargs='*', default=None, help="só estes arquivos (padrão: todos os nichos)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    desconhecidos = set(args.arquivos or []) - set(COLUNAS_NICHO)
+    if desconhecidos:
+        parser.error(f"arquivos sem gerador: {sorted(desconhecidos)}")
+    generate(parse_linhas(args.linhas), args.saida, args.arquivos, args.seed)
+
+
+if __name__ == "__main__":
+    main()